@@ -0,0 +1,74 @@
+"""
+Kernel registry benchmark for BioVerse medical vision
+Reports the per-image cost of building kernels, LUTs and CLAHE objects from
+scratch versus fetching them from the kernel registry, and the effect on the
+stages that use them at small and large image sizes.
+
+Run from python-ai/:  python -m benchmarks.bench_kernels [--repeat 2000]
+"""
+
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from services.medical_vision_ai import ImagePreprocessor
+from services.vision_kernels import KernelRegistry
+
+def fresh_setup():
+    """Everything the pipeline used to rebuild for every image"""
+    cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+    cv2.getStructuringElement(cv2.MORPH_RECT, (17, 17))
+    ImagePreprocessor._build_blend_lut(128, 1.2)
+    ImagePreprocessor._build_blend_lut(0, 1.1)
+    ImagePreprocessor._build_normalize_lut(3, 250)
+    ImagePreprocessor._sharpen_kernel(1.3)
+
+def registry_setup(registry: KernelRegistry):
+    registry.clahe(2.0, (8, 8))
+    registry.structuring_element(cv2.MORPH_RECT, (17, 17))
+    registry.lut("blend", (128, 1.2), ImagePreprocessor._build_blend_lut)
+    registry.lut("blend", (0, 1.1), ImagePreprocessor._build_blend_lut)
+    registry.lut("normalize", (3, 250), ImagePreprocessor._build_normalize_lut)
+    registry.get(("sharpen", 1.3), lambda: ImagePreprocessor._sharpen_kernel(1.3))
+
+def per_call_us(function, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    registry = KernelRegistry()
+    fresh = per_call_us(fresh_setup, args.repeat)
+    cached = per_call_us(lambda: registry_setup(registry), args.repeat)
+    print(f"{'setup, built per image':<40}{fresh:>10.1f} us")
+    print(f"{'setup, kernel registry':<40}{cached:>10.1f} us{fresh / cached:>8.1f}x")
+
+    preprocessor = ImagePreprocessor()
+    rng = np.random.default_rng(0)
+    for size in (128, 512):
+        image = rng.integers(0, 256, (size, size), dtype=np.uint8)
+        repeat = max(10, args.repeat // (size // 64))
+        for name, fresh_step, cached_step in (
+            ("CLAHE",
+             lambda: cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8)).apply(image),
+             lambda: preprocessor._retinal_vessel_enhancement(image.copy())),
+            ("blackhat 17x17",
+             lambda: cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, cv2.getStructuringElement(cv2.MORPH_RECT, (17, 17))),
+             lambda: cv2.morphologyEx(image, cv2.MORPH_BLACKHAT, preprocessor.kernels.structuring_element(cv2.MORPH_RECT, (17, 17)))),
+            ("contrast LUT",
+             lambda: cv2.LUT(image, ImagePreprocessor._build_blend_lut(int(cv2.mean(image)[0] + 0.5), 1.4)),
+             lambda: preprocessor._adjust_contrast(image.copy(), 1.4)),
+        ):
+            before = per_call_us(fresh_step, repeat)
+            after = per_call_us(cached_step, repeat)
+            print(f"{f'{name}, {size}px, per image':<40}{before:>10.1f} us{after:>10.1f} us")
+
+if __name__ == "__main__":
+    main()
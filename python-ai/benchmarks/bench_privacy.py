@@ -0,0 +1,63 @@
+"""
+Differential privacy benchmark for BioVerse federated learning
+Reports the time to clip and noise a batch of per-example gradients one row at
+a time with DifferentialPrivacy versus in one pass with BatchedDPEngine, the
+cost of each bit generator, and RDP versus linear privacy accounting.
+
+Run from python-ai/:  python -m benchmarks.bench_privacy [--rows 10000] [--cols 10000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.federated_health_learning import DifferentialPrivacy
+from services.federated_privacy import BIT_GENERATORS, BatchedDPEngine, RDPAccountant
+
+def report(label: str, rows: int, cols: int, seconds: float):
+    print(f"{label:<42}{seconds * 1000:>10.0f} ms{rows * cols / seconds / 1e6:>12.1f} Mparams/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--cols", type=int, default=10000)
+    parser.add_argument("--dtype", choices=("float32", "float64"), default="float32")
+    args = parser.parse_args()
+
+    dtype = np.dtype(args.dtype)
+    rng = np.random.default_rng(0)
+    batch = rng.standard_normal((args.rows, args.cols), dtype=dtype)
+    batch *= 0.05
+    dp = DifferentialPrivacy()
+
+    start = time.perf_counter()
+    for row in batch:
+        dp.add_noise(dp.clip_gradients(row, dp.clip_norm))
+    report("per-row clip and noise (previous loop)", args.rows, args.cols, time.perf_counter() - start)
+
+    for name in BIT_GENERATORS:
+        engine = BatchedDPEngine(dp.clip_norm, dp.noise_multiplier, seed=0, bit_generator=name)
+        start = time.perf_counter()
+        engine.privatize(batch)
+        report(f"batched privatize, {name}", args.rows, args.cols, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        engine.noise(batch.shape, dtype=dtype)
+        report(f"per-example noise draw, {name}", args.rows, args.cols, time.perf_counter() - start)
+
+    start = time.perf_counter()
+    engine.clip(batch, out=batch)
+    report("batched clip, in place", args.rows, args.cols, time.perf_counter() - start)
+
+    print()
+    print(f"{'steps':>8}{'linear epsilon':>18}{'RDP epsilon':>14}   (sample rate 0.01, noise {dp.noise_multiplier:.2f}, delta {dp.delta})")
+    accountant = RDPAccountant()
+    done = 0
+    for steps in (1, 10, 100, 1000, 10000):
+        accountant.step(dp.noise_multiplier, 0.01, steps - done)
+        done = steps
+        print(f"{steps:>8}{steps * dp.epsilon:>18.2f}{accountant.get_epsilon(dp.delta)[0]:>14.4f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Secure aggregation benchmark for BioVerse federated learning
+Reports participant and server cost of pairwise-masked aggregation against the
+Fernet path (encrypt to the aggregator, decrypt and average) and the
+decrypt-add-reencrypt chain of HomomorphicEncryption.add_encrypted.
+
+Run from python-ai/:  python -m benchmarks.bench_secure_aggregation [--participants 20] [--params 1000000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from services.federated_health_learning import HomomorphicEncryption, SecureAggregation
+from services.federated_masking import MaskedAggregator, MaskingParticipant, MaskingRound
+
+def report(label: str, seconds: float, nbytes: int = 0):
+    size = f"{nbytes / 1e6:>10.1f} MB" if nbytes else ""
+    print(f"{label:<44}{seconds * 1000:>10.1f} ms{size}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--participants", type=int, default=20)
+    parser.add_argument("--params", type=int, default=1_000_000)
+    parser.add_argument("--dropped", type=int, default=2)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    updates = [rng.normal(0, 0.1, args.params) for _ in range(args.participants)]
+    weights = [float(w) for w in rng.integers(100, 5000, args.participants)]
+
+    # Fernet: each participant encrypts to the aggregator, which decrypts every update
+    encryption = HomomorphicEncryption()
+    secure = SecureAggregation(encryption, mode="fernet")
+    start = time.perf_counter()
+    encrypted = [encryption.encrypt(update) for update in updates]
+    report("fernet, encrypt per participant", (time.perf_counter() - start) / args.participants, len(encrypted[0]))
+    start = time.perf_counter()
+    aggregator = secure.new_aggregator()
+    for payload, weight in zip(encrypted, weights):
+        secure.fold(aggregator, payload, weight)
+    secure.finish(aggregator)
+    report("fernet, server decrypt and average", time.perf_counter() - start)
+
+    start = time.perf_counter()
+    total = encrypted[0]
+    for payload in encrypted[1:]:
+        total = encryption.add_encrypted(total, payload)
+    report("fernet, add_encrypted chain", time.perf_counter() - start)
+
+    # Masking: key agreement per pair, PRG masks, server adds uint64 vectors
+    participants = {f"site_{index:03d}": MaskingParticipant(f"site_{index:03d}") for index in range(args.participants)}
+    masking_round = MaskingRound("bench", {pid: p.public_key for pid, p in participants.items()})
+    survivors = list(participants)[:args.participants - args.dropped]
+    start = time.perf_counter()
+    masked = {pid: participant.mask(masking_round, {"data": update}, weight)
+              for (pid, participant), update, weight in zip(participants.items(), updates, weights)}
+    report("masking, mask per participant", (time.perf_counter() - start) / args.participants, len(masked[survivors[0]]))
+
+    aggregator = MaskedAggregator(masking_round)
+    start = time.perf_counter()
+    for pid in survivors:
+        aggregator.add(masked[pid])
+    report("masking, server sum (no decryption)", time.perf_counter() - start)
+    unmaskings = [participants[pid].reveal(masking_round, aggregator.dropped()) for pid in survivors]
+    start = time.perf_counter()
+    result = aggregator.result(unmaskings)["data"]
+    report(f"masking, unmask with {args.dropped} dropped", time.perf_counter() - start)
+
+    expected = np.average(updates[:len(survivors)], axis=0, weights=weights[:len(survivors)])
+    print(f"{'masking, max error vs float64 average':<44}{np.abs(result - expected).max():>13.2e}")
+
+if __name__ == "__main__":
+    main()
@@ -24,10 +24,14 @@ from services.visualization_service import VisualizationService
 from services.database_service import DatabaseService
 from services.generative_quantum_state_service import GenerativeQuantumStateService
 from services.advanced_prediction_service import AdvancedPredictionService
+from services.federated_learning_service import FederatedLearningService
+from services.federated_jobs import FederatedRoundManager
+from services.vision_batch import create_batch_processor
 from routes import health_twins, ml_models, visualizations, analytics, vision, federated
 from middleware.auth import verify_api_key
 from middleware.logging import setup_logging
 from middleware.metrics import setup_metrics
+from middleware.upload_limit import UploadLimitMiddleware
 
 # Setup logging
 logger = setup_logging()
@@ -40,11 +44,15 @@ viz_service = None
 db_service = None
 generative_quantum_state_service = None
 advanced_prediction_service = None
+federated_service = None
+federated_rounds = None
+vision_batch_processor = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Application lifespan manager"""
     global ollama_service, health_twin_service, ml_service, viz_service, db_service, advanced_prediction_service
+    global federated_service, federated_rounds, vision_batch_processor
     
     logger.info("🚀 Starting BioVerse Python AI Service...")
     
@@ -87,6 +95,15 @@ async def lifespan(app: FastAPI):
         await viz_service.initialize()
         logger.info("✅ Visualization service initialized")
         
+        # Initialize the federated learning engine, restoring participants and models from its state backend
+        federated_service = FederatedLearningService()
+        await federated_service.initialize()
+        federated_rounds = FederatedRoundManager(federated_service)
+        logger.info("✅ Federated Learning service initialized")
+        
+        # Batch vision analysis; its worker pool starts with the first batch
+        vision_batch_processor = create_batch_processor()
+        
         # Initialize Generative Quantum State service
         generative_quantum_state_service = GenerativeQuantumStateService()
         # No async initialize method for now, but good to keep consistent pattern
@@ -100,6 +117,9 @@ async def lifespan(app: FastAPI):
         app.state.db = db_service
         app.state.generative_quantum_state = generative_quantum_state_service
         app.state.advanced_prediction = advanced_prediction_service
+        app.state.federated = federated_service
+        app.state.federated_rounds = federated_rounds
+        app.state.vision_batch = vision_batch_processor
         
         logger.info("🎉 All services initialized successfully!")
         
@@ -111,8 +131,14 @@ async def lifespan(app: FastAPI):
     
     # Cleanup
     logger.info("🛑 Shutting down BioVerse Python AI Service...")
+    if ollama_service:
+        await ollama_service.close()
     if db_service:
         await db_service.close()
+    if vision_batch_processor:
+        vision_batch_processor.shutdown()
+    if federated_rounds:
+        federated_rounds.shutdown()
     logger.info("✅ Cleanup completed")
 
 # Create FastAPI app
@@ -134,6 +160,10 @@ app.add_middleware(
     allow_headers=["*"],
 )
 app.add_middleware(GZipMiddleware, minimum_size=1000)
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={f"/api/v1/vision{path}": limit for path, limit in vision.UPLOAD_BODY_LIMITS.items()}
+)
 
 # Setup metrics
 setup_metrics(app)
@@ -152,6 +182,9 @@ async def health_check():
             "ml": ml_service.is_ready if ml_service else False,
             "database": db_service.is_connected if db_service else False,
             "visualization": viz_service.is_ready if viz_service else False
+        },
+        "circuit_breakers": {
+            "ollama": ollama_service.circuit_breaker.snapshot() if ollama_service else None
         }
     }
 
@@ -2,17 +2,41 @@
 Metrics middleware for BioVerse Python AI Service
 """
 
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
 from fastapi import Request, Response
 from fastapi.responses import Response as FastAPIResponse
+import sys
+import threading
 import time
 import os
+from dataclasses import dataclass
+from typing import Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
 
 # Metrics
 REQUEST_COUNT = Counter('bioverse_ai_requests_total', 'Total requests', ['method', 'endpoint', 'status'])
 REQUEST_DURATION = Histogram('bioverse_ai_request_duration_seconds', 'Request duration', ['method', 'endpoint'])
 HEALTH_TWIN_OPERATIONS = Counter('bioverse_ai_health_twin_operations_total', 'Health twin operations', ['operation'])
 ML_PREDICTIONS = Counter('bioverse_ai_ml_predictions_total', 'ML predictions', ['model_type'])
+PROCESS_PEAK_RSS = Gauge('bioverse_ai_process_peak_rss_bytes', 'Lifetime peak RSS of the whole process, not of any one request')
+VISION_RSS_GROWTH = Histogram(
+    'bioverse_ai_vision_peak_rss_growth_bytes',
+    'Peak process RSS during a vision request above the RSS it started with; overlapped requests shared the process with another vision request',
+    ['modality', 'overlapped'],
+    buckets=(0, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9, 2e9)
+)
+
+# Vision requests in flight and started so far, used to flag samples that other requests shared
+_vision_in_flight = 0
+_vision_started = 0
+# Resetting the kernel's RSS high-water mark also lowers ru_maxrss, so the lifetime peak is kept here
+_process_peak = 0
+# Interval of the fallback sampler used where the high-water mark cannot be reset
+RSS_SAMPLE_INTERVAL = 0.01
 
 def setup_metrics(app):
     """Set up metrics collection"""
@@ -56,4 +80,95 @@ def record_health_twin_operation(operation: str):
 
 def record_ml_prediction(model_type: str):
     """Record ML prediction"""
-    ML_PREDICTIONS.labels(model_type=model_type).inc()
\ No newline at end of file
+    ML_PREDICTIONS.labels(model_type=model_type).inc()
+
+def peak_rss_bytes() -> int:
+    """Lifetime peak resident set size of this process in bytes (0 if unsupported)"""
+    if resource is None:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def current_rss_bytes() -> int:
+    """Current resident set size of this process in bytes (0 if unsupported)"""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return 0
+
+def high_water_rss_bytes() -> int:
+    """Peak resident set size since the high-water mark was last reset, in bytes (0 if unsupported)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0
+
+def reset_high_water_rss() -> bool:
+    """Lower the RSS high-water mark to the current RSS; False where the kernel does not allow it"""
+    global _process_peak
+    _process_peak = max(_process_peak, peak_rss_bytes())
+    try:
+        with open("/proc/self/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+        return True
+    except OSError:
+        return False
+
+class _RSSSampler(threading.Thread):
+    """Polls the current RSS and keeps its maximum, for kernels without a resettable high-water mark"""
+
+    def __init__(self, interval: float = RSS_SAMPLE_INTERVAL):
+        super().__init__(name="vision-rss-sampler", daemon=True)
+        self.interval = interval
+        self.peak = current_rss_bytes()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval):
+            self.peak = max(self.peak, current_rss_bytes())
+
+    def stop(self) -> int:
+        self._stopped.set()
+        self.join()
+        return max(self.peak, current_rss_bytes())
+
+@dataclass
+class VisionMemorySample:
+    """Opening state of a vision request's memory sample, to pass to record_vision_memory"""
+    rss_before: int
+    started: int
+    overlapped: bool
+    sampler: Optional[_RSSSampler] = None
+
+def start_vision_memory_sample() -> VisionMemorySample:
+    """Start measuring the peak RSS of a vision request.
+
+    The kernel's RSS high-water mark is reset so that it tracks this request;
+    where that is not possible a thread samples the RSS instead.
+    """
+    global _vision_in_flight, _vision_started
+    sample = VisionMemorySample(current_rss_bytes(), _vision_started, _vision_in_flight > 0)
+    if not reset_high_water_rss():
+        sample.sampler = _RSSSampler()
+        sample.sampler.start()
+    _vision_in_flight += 1
+    _vision_started += 1
+    return sample
+
+def record_vision_memory(modality: str, sample: VisionMemorySample):
+    """Record the peak RSS growth of a vision request over its opening sample"""
+    global _vision_in_flight
+    _vision_in_flight -= 1
+    peak = sample.sampler.stop() if sample.sampler is not None else high_water_rss_bytes()
+    # Another request started while this one ran, or was already running when it started
+    overlapped = sample.overlapped or _vision_started != sample.started + 1
+    VISION_RSS_GROWTH.labels(modality=modality, overlapped=str(overlapped).lower()).observe(
+        max(0, peak - sample.rss_before)
+    )
+    PROCESS_PEAK_RSS.set(max(_process_peak, peak_rss_bytes()))
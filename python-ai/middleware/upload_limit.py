@@ -0,0 +1,69 @@
+"""
+Upload size limits for BioVerse Python AI Service
+"""
+
+from typing import Dict
+from starlette.responses import JSONResponse
+
+class UploadLimitMiddleware:
+    """Reject request bodies over a per-path byte limit before they are spooled.
+
+    A declared Content-Length over the limit is refused without reading the body;
+    otherwise the bytes are counted as they stream in, so chunked uploads are
+    cut off as soon as they pass the limit instead of after the multipart parser
+    has written them all to disk.
+    """
+
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        try:
+            declared = int(headers.get(b"content-length", b""))
+        except ValueError:
+            declared = None
+        if declared is not None and declared > limit:
+            await self._reject(scope, receive, send, limit)
+            return
+
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    rejected = True
+                    await self._reject(scope, receive, send, limit)
+                    # The route sees a client disconnect and stops parsing the body
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not rejected:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    @staticmethod
+    async def _reject(scope, receive, send, limit: int):
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"Request body exceeds the {limit / (1024 * 1024):g} MB upload limit."}
+        )
+        await response(scope, receive, send)
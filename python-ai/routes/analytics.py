@@ -48,6 +48,10 @@ class GenerateRecommendationsRequest(BaseModel):
 class HealthAnalysisRequest(BaseModel):
     patient_data: Dict[str, Any]
 
+class LumaChatRequest(BaseModel):
+    message: str
+    session_id: Optional[str] = None
+
 @router.post("/analyze-symptoms")
 async def analyze_symptoms(
     request: AnalyzeSymptomsRequest,
@@ -109,6 +113,23 @@ async def perform_health_analysis(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/luma-chat")
+async def luma_chat(
+    request: LumaChatRequest,
+    ollama_service: OllamaService = Depends(lambda: router.app.state.ollama)
+):
+    """Chat with the Luma health assistant, reusing model context within a session"""
+    try:
+        reply = await ollama_service.luma_chat(request.message, session_id=request.session_id)
+        
+        return {
+            "success": True,
+            "reply": reply
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/population-health")
 async def get_population_health_analytics():
     """Get population health analytics"""
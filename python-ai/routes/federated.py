@@ -2,20 +2,25 @@
 API Routes for Federated Learning Management
 """
 
-from fastapi import APIRouter, Depends, HTTPException, Body
-from typing import List, Dict, Any
+from fastapi import APIRouter, Depends, HTTPException, Body, Request
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Dict, Any, Optional
 
+from services.federated_jobs import FederatedRoundManager
 from services.federated_learning_service import FederatedLearningService
-
-# In a real app, this service would be a singleton managed by the app's lifespan
-# and injected, but for simplicity, we instantiate it here.
-# This should be improved to use app.state for a shared instance.
-federated_service = FederatedLearningService()
+from services.federated_rounds import RoundPolicy
 
 router = APIRouter()
 
+# The service and round manager are created once in the app's lifespan and shared through app.state
+def get_federated_service(request: Request) -> FederatedLearningService:
+    return request.app.state.federated
+
+def get_round_manager(request: Request) -> FederatedRoundManager:
+    return request.app.state.federated_rounds
+
 @router.post("/participants/register", status_code=201)
-async def register_participant(institution_data: Dict[str, Any] = Body(...)):
+async def register_participant(institution_data: Dict[str, Any] = Body(...), federated_service: FederatedLearningService = Depends(get_federated_service)):
     """Register a new healthcare institution as a participant."""
     try:
         participant = await federated_service.register_participant(institution_data)
@@ -24,12 +29,12 @@ async def register_participant(institution_data: Dict[str, Any] = Body(...)):
         raise HTTPException(status_code=400, detail=str(e))
 
 @router.get("/participants", response_model=List[Dict[str, Any]])
-async def list_participants():
+async def list_participants(federated_service: FederatedLearningService = Depends(get_federated_service)):
     """List all registered participants."""
     return federated_service.list_participants()
 
 @router.post("/models/initialize", status_code=201)
-async def initialize_model(model_config: Dict[str, str] = Body(...)):
+async def initialize_model(model_config: Dict[str, str] = Body(...), federated_service: FederatedLearningService = Depends(get_federated_service)):
     """Initialize a new global model for training."""
     model_type = model_config.get("model_type")
     model_id = model_config.get("model_id")
@@ -37,37 +42,91 @@ async def initialize_model(model_config: Dict[str, str] = Body(...)):
         raise HTTPException(status_code=400, detail="'model_type' and 'model_id' are required.")
     
     try:
-        model = federated_service.initialize_global_model(model_type, model_id)
+        model = await federated_service.create_global_model(model_type, model_id)
         return {"message": "Global model initialized successfully", "model_id": model.model_id}
     except ValueError as e:
         raise HTTPException(status_code=409, detail=str(e))
 
 @router.get("/models", response_model=List[Dict[str, Any]])
-async def list_models():
+async def list_models(federated_service: FederatedLearningService = Depends(get_federated_service)):
     """List all available global models."""
     return federated_service.list_models()
 
 @router.get("/models/{model_id}")
-async def get_model_status(model_id: str):
-    """Get the status of a specific global model."""
+async def get_model_status(model_id: str, federated_service: FederatedLearningService = Depends(get_federated_service)):
+    """Get the status and version history of a specific global model."""
     status = federated_service.get_model_status(model_id)
     if not status:
         raise HTTPException(status_code=404, detail="Model not found.")
     return status
 
-@router.post("/training/start_round")
-async def start_training_round(training_request: Dict[str, Any] = Body(...)):
-    """Start a new federated training round."""
+class RoundPolicyOverrides(BaseModel):
+    deadline: Optional[float] = Field(None, gt=0)
+    quorum: Optional[float] = Field(None, gt=0, le=1)
+    quorum_grace: Optional[float] = Field(None, ge=0)
+
+def _round_policy(training_request: Dict[str, Any], federated_service: FederatedLearningService) -> Optional[RoundPolicy]:
+    """Per-round overrides of the configured deadline and quorum, rejected with 422 when invalid"""
+    try:
+        overrides = RoundPolicyOverrides(**{key: training_request[key] for key in RoundPolicyOverrides.model_fields if key in training_request})
+    except ValidationError as e:
+        detail = "; ".join(f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors())
+        raise HTTPException(status_code=422, detail=f"Invalid round policy: {detail}")
+    overrides = overrides.model_dump(exclude_none=True)
+    if not overrides:
+        return None
+    return RoundPolicy(**{**federated_service.round_policy.__dict__, **overrides})
+
+@router.post("/training/start_round", status_code=202)
+async def start_training_round(
+    training_request: Dict[str, Any] = Body(...),
+    federated_service: FederatedLearningService = Depends(get_federated_service),
+    round_manager: FederatedRoundManager = Depends(get_round_manager)
+):
+    """
+    Queue a new federated training round and return its job immediately.
+
+    - **model_id**: The global model to train.
+    - **participant_ids**: Institutions taking part in the round.
+    - **deadline**, **quorum**, **quorum_grace**: Optional overrides of the round policy.
+
+    Progress is reported by `/training/rounds/{job_id}`.
+    """
     model_id = training_request.get("model_id")
     participant_ids = training_request.get("participant_ids")
 
     if not model_id or not participant_ids:
         raise HTTPException(status_code=400, detail="'model_id' and 'participant_ids' are required.")
+    policy = _round_policy(training_request, federated_service)
 
     try:
-        result = await federated_service.start_training_round(model_id, participant_ids)
-        return result
+        job = round_manager.submit(model_id, participant_ids, policy)
+        return {**job.summary(), "status_url": f"/api/v1/federated/training/rounds/{job.job_id}"}
     except ValueError as e:
         raise HTTPException(status_code=404, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+
+@router.get("/training/rounds", response_model=List[Dict[str, Any]])
+async def list_training_rounds(model_id: Optional[str] = None, round_manager: FederatedRoundManager = Depends(get_round_manager)):
+    """List recent training rounds, oldest first, optionally for one model."""
+    return round_manager.job_summaries(model_id)
+
+@router.get("/training/rounds/{job_id}")
+async def get_training_round(job_id: str, round_manager: FederatedRoundManager = Depends(get_round_manager)):
+    """Get the state, per-participant progress and result of a training round."""
+    details = round_manager.job_details(job_id)
+    if details is None:
+        raise HTTPException(status_code=404, detail="Training round not found.")
+    return details
+
+@router.delete("/training/rounds/{job_id}")
+async def cancel_training_round(job_id: str, round_manager: FederatedRoundManager = Depends(get_round_manager)):
+    """Cancel a queued or running training round; only the worker running it can cancel it."""
+    details = round_manager.job_details(job_id)
+    if details is None:
+        raise HTTPException(status_code=404, detail="Training round not found.")
+    cancelled = round_manager.cancel(job_id)
+    job = round_manager.get_job(job_id)
+    summary = job.summary() if job is not None else {key: value for key, value in details.items() if key not in ("participants", "result")}
+    return {**summary, "cancelled": cancelled}
@@ -2,7 +2,7 @@
 Health Twins API Routes
 """
 
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Query, Request
 from pydantic import BaseModel
 from typing import Dict, List, Any, Optional
 import uuid
@@ -12,6 +12,10 @@ from middleware.auth import verify_api_key
 
 router = APIRouter()
 
+# The service is created once in the app's lifespan and shared through app.state
+def get_health_twin_service(request: Request) -> HealthTwinService:
+    return request.app.state.health_twins
+
 class CreateHealthTwinRequest(BaseModel):
     patient_id: str
     vitals: Dict[str, float]
@@ -33,7 +37,7 @@ class UpdateHealthTwinRequest(BaseModel):
 async def create_health_twin(
     request: CreateHealthTwinRequest,
     background_tasks: BackgroundTasks,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Create a new digital health twin"""
     try:
@@ -64,7 +68,7 @@ async def create_health_twin(
 @router.get("/{twin_id}")
 async def get_health_twin(
     twin_id: str,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Get health twin by ID"""
     try:
@@ -87,7 +91,7 @@ async def get_health_twin(
 async def update_health_twin(
     twin_id: str,
     request: UpdateHealthTwinRequest,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Update existing health twin"""
     try:
@@ -127,7 +131,7 @@ async def update_health_twin(
 @router.get("/patient/{patient_id}")
 async def get_patient_health_twins(
     patient_id: str,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Get all health twins for a patient"""
     try:
@@ -146,7 +150,7 @@ async def get_patient_health_twins(
 @router.post("/{twin_id}/analyze")
 async def analyze_health_twin(
     twin_id: str,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Perform detailed analysis of health twin"""
     try:
@@ -185,10 +189,36 @@ async def analyze_health_twin(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/{twin_id}/similar")
+async def get_similar_health_twins(
+    twin_id: str,
+    k: int = Query(10, ge=1, le=100),
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
+):
+    """Find the health twins most similar to the given twin"""
+    try:
+        health_twin = await health_twin_service.get_health_twin(twin_id)
+        if not health_twin:
+            raise HTTPException(status_code=404, detail="Health twin not found")
+        
+        similar_twins = await health_twin_service.find_similar_twins(twin_id, k)
+        
+        return {
+            "success": True,
+            "twin_id": twin_id,
+            "similar_twins": similar_twins,
+            "count": len(similar_twins)
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.delete("/{twin_id}")
 async def delete_health_twin(
     twin_id: str,
-    health_twin_service: HealthTwinService = Depends(lambda: router.app.state.health_twins)
+    health_twin_service: HealthTwinService = Depends(get_health_twin_service)
 ):
     """Delete health twin"""
     try:
@@ -197,9 +227,7 @@ async def delete_health_twin(
         if not health_twin:
             raise HTTPException(status_code=404, detail="Health twin not found")
         
-        # Remove from cache (in a real implementation, also remove from database)
-        if twin_id in health_twin_service.twins_cache:
-            del health_twin_service.twins_cache[twin_id]
+        await health_twin_service.delete_health_twin(twin_id)
         
         return {
             "success": True,
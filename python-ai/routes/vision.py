@@ -2,14 +2,23 @@
 Vision API Routes for Medical Image Analysis
 """
 
-from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException
-from typing import Optional
+from fastapi import APIRouter, UploadFile, File, Form, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from typing import Optional, Dict, Any, List, Tuple, BinaryIO
+import json
 import logging
+import os
+import tempfile
+import zipfile
+import numpy as np
 
 # It's better to import the class and instantiate it once,
 # but for a quick start, we can instantiate it here.
 # In a production app, this would be managed by a dependency injection system.
 from services.medical_vision_ai import MedicalVisionAI, ImagingModality
+from services.vision_batch import VisionBatchProcessor
+from middleware.metrics import start_vision_memory_sample, record_vision_memory
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -18,14 +27,122 @@ router = APIRouter()
 # be initialized once during the application's lifespan and injected.
 vision_ai = MedicalVisionAI()
 
+# Largest accepted upload, in megabytes
+MAX_UPLOAD_MB = float(os.getenv("VISION_MAX_UPLOAD_MB", 100))
+
+# Largest accepted batch (sum of all images), in megabytes
+MAX_BATCH_MB = float(os.getenv("VISION_BATCH_MAX_MB", 1024))
+
+# Largest request body per endpoint, enforced while the upload streams in;
+# the extra megabyte covers the form fields and multipart headers
+UPLOAD_BODY_LIMITS = {
+    "/analyze": int(MAX_UPLOAD_MB * 1024 * 1024) + 1024 * 1024,
+    "/analyze/batch": int(MAX_BATCH_MB * 1024 * 1024) + 1024 * 1024
+}
+
+# Chunk size used when spooling batch images to disk
+SPOOL_CHUNK_BYTES = 1024 * 1024
+
+def get_batch_processor(request: Request) -> VisionBatchProcessor:
+    return request.app.state.vision_batch
+
 class VisionAnalysisRequest(BaseModel):
     modality: ImagingModality
     clinical_context: Optional[Dict[str, Any]] = None
 
+def _map_upload(image: UploadFile) -> np.ndarray:
+    """Memory-map the spooled upload instead of reading it into a bytes object.
+
+    The multipart parser has already spooled the body to a temporary file, so the
+    encoded image is decoded straight from that file's pages.
+    """
+    image.file.seek(0, os.SEEK_END)
+    size = image.file.tell()
+    image.file.seek(0)
+
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded image is empty.")
+    if size > MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Image exceeds the {MAX_UPLOAD_MB:g} MB upload limit.")
+
+    # fileno() rolls an in-memory spooled file over to disk so it can be mapped
+    return np.memmap(image.file, dtype=np.uint8, mode="r", shape=(size,))
+
+def _parse_clinical_context(clinical_context_json: Optional[str]) -> Dict[str, Any]:
+    try:
+        return json.loads(clinical_context_json or "{}")
+    except json.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON in clinical_context_json.")
+
+def _discard_batch(batch: List[Tuple[str, str]]):
+    for _, path in batch:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+def _read_batch(images: List[UploadFile]) -> List[Tuple[str, str]]:
+    """Spool uploaded images, expanding zip archives, into (name, file path) pairs.
+
+    Each image is copied in chunks to its own temporary file, so neither this
+    worker nor the batch pool holds the encoded images in memory. The files
+    belong to the caller; they are deleted here if the batch is rejected.
+    """
+    batch = []
+    total_bytes = 0
+
+    def add(name: str, source: BinaryIO):
+        nonlocal total_bytes
+        fd, path = tempfile.mkstemp(prefix="vision-batch-")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as spool:
+                while chunk := source.read(SPOOL_CHUNK_BYTES):
+                    size += len(chunk)
+                    total_bytes += len(chunk)
+                    if size > MAX_UPLOAD_MB * 1024 * 1024:
+                        raise HTTPException(status_code=413, detail=f"{name} exceeds the {MAX_UPLOAD_MB:g} MB upload limit.")
+                    if total_bytes > MAX_BATCH_MB * 1024 * 1024:
+                        raise HTTPException(status_code=413, detail=f"Batch exceeds the {MAX_BATCH_MB:g} MB limit.")
+                    spool.write(chunk)
+        except BaseException:
+            os.unlink(path)
+            raise
+        if size == 0:
+            os.unlink(path)
+            return
+        batch.append((name, path))
+
+    try:
+        for upload in images:
+            if zipfile.is_zipfile(upload.file):
+                upload.file.seek(0)
+                try:
+                    with zipfile.ZipFile(upload.file) as archive:
+                        for info in archive.infolist():
+                            if info.is_dir() or os.path.basename(info.filename).startswith("."):
+                                continue
+                            if info.file_size > MAX_UPLOAD_MB * 1024 * 1024:
+                                raise HTTPException(status_code=413, detail=f"{info.filename} exceeds the {MAX_UPLOAD_MB:g} MB upload limit.")
+                            with archive.open(info) as member:
+                                add(info.filename, member)
+                except zipfile.BadZipFile:
+                    raise HTTPException(status_code=400, detail=f"{upload.filename} is not a valid zip archive.")
+            else:
+                upload.file.seek(0)
+                add(upload.filename or f"image_{len(batch)}", upload.file)
+    except BaseException:
+        _discard_batch(batch)
+        raise
+
+    if not batch:
+        raise HTTPException(status_code=400, detail="No images found in the upload.")
+    return batch
+
 @router.post("/analyze")
 async def analyze_medical_image(
     modality: ImagingModality = Form(...),
-    clinical_context_json: Optional[str] = Form("{{}}"), # Receive context as JSON string
+    clinical_context_json: Optional[str] = Form("{}"), # Receive context as JSON string
     image: UploadFile = File(...)
 ):
     """
@@ -36,23 +153,23 @@ async def analyze_medical_image(
     - **image**: The image file to analyze.
     """
     try:
-        image_data = await image.read()
-        
         # Parse the clinical context from the JSON string
-        import json
+        clinical_context = _parse_clinical_context(clinical_context_json)
+
+        memory_sample = start_vision_memory_sample()
         try:
-            clinical_context = json.loads(clinical_context_json)
-        except json.JSONDecodeError:
-            raise HTTPException(status_code=400, detail="Invalid JSON in clinical_context_json.")
-
-        logger.info(f"Received image for analysis. Modality: {modality.value}, Size: {len(image_data)} bytes")
-
-        analysis_result = await vision_ai.analyze_medical_image(
-            image_data=image_data,
-            modality=modality,
-            clinical_context=clinical_context
-        )
-        
+            image_data = _map_upload(image)
+
+            logger.info(f"Received image for analysis. Modality: {modality.value}, Size: {image_data.shape[0]} bytes")
+
+            analysis_result = await vision_ai.analyze_medical_image(
+                image_data=image_data,
+                modality=modality,
+                clinical_context=clinical_context
+            )
+            del image_data
+        finally:
+            record_vision_memory(modality.value, memory_sample)
         logger.info(f"Successfully analyzed image. Urgency: {analysis_result.urgency_level}")
 
         return analysis_result
@@ -64,3 +181,74 @@ async def analyze_medical_image(
         logger.error(f"Error during image analysis: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred during image analysis: {e}")
 
+@router.post("/analyze/batch")
+async def analyze_medical_image_batch(
+    modality: ImagingModality = Form(...),
+    clinical_context_json: Optional[str] = Form("{}"),
+    images: List[UploadFile] = File(...),
+    batch_processor: VisionBatchProcessor = Depends(get_batch_processor)
+):
+    """
+    Queues a batch of images for analysis in the worker pool and returns a job id.
+
+    - **modality**: The imaging modality shared by every image in the batch.
+    - **clinical_context_json**: A JSON string with clinical details applied to every image.
+    - **images**: One or more image files, or zip archives of images.
+
+    Results are streamed as NDJSON from `/analyze/batch/{job_id}/results`.
+    """
+    try:
+        clinical_context = _parse_clinical_context(clinical_context_json)
+        batch = _read_batch(images)
+
+        try:
+            job = batch_processor.submit(batch, modality, clinical_context)
+        except Exception:
+            _discard_batch(batch)
+            raise
+        logger.info(f"Queued vision batch {job.job_id} with {job.total} images. Modality: {modality.value}")
+
+        return {
+            **job.summary(),
+            "status_url": f"/api/v1/vision/analyze/batch/{job.job_id}",
+            "results_url": f"/api/v1/vision/analyze/batch/{job.job_id}/results"
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error queuing image batch: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred while queuing the batch: {e}")
+
+def _get_batch_summary(batch_processor: VisionBatchProcessor, job_id: str) -> Dict[str, Any]:
+    summary = batch_processor.job_summary(job_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return summary
+
+@router.get("/analyze/batch/{job_id}")
+async def get_batch_status(job_id: str, batch_processor: VisionBatchProcessor = Depends(get_batch_processor)):
+    """Returns progress counters for a batch job."""
+    return _get_batch_summary(batch_processor, job_id)
+
+@router.get("/analyze/batch/{job_id}/results")
+async def stream_batch_results(job_id: str, batch_processor: VisionBatchProcessor = Depends(get_batch_processor)):
+    """
+    Streams batch results as newline-delimited JSON, one line per image in
+    completion order. Results already finished are sent first; the stream
+    stays open until the last image completes.
+    """
+    _get_batch_summary(batch_processor, job_id)
+
+    async def ndjson():
+        async for entry in batch_processor.stream_results(job_id):
+            yield json.dumps(entry) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+@router.delete("/analyze/batch/{job_id}")
+async def cancel_batch(job_id: str, batch_processor: VisionBatchProcessor = Depends(get_batch_processor)):
+    """Cancels the images of a batch job that have not started yet; only the worker running it can cancel it."""
+    _get_batch_summary(batch_processor, job_id)
+    cancelled = batch_processor.cancel(job_id)
+    return {**batch_processor.job_summary(job_id), "cancelled": cancelled}
@@ -0,0 +1,86 @@
+"""
+Circuit Breaker for BioVerse
+Fails fast on calls to a dependency that keeps failing, and probes for recovery
+"""
+
+import time
+from typing import Any, Dict, Optional
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+class CircuitBreaker:
+    """Three-state (closed, open, half-open) circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    are rejected immediately. Once `recovery_timeout` seconds have passed it
+    becomes half-open and lets up to `half_open_max_calls` trial calls through;
+    a success closes the circuit again and a failure re-opens it.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 30.0, half_open_max_calls: int = 1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at: Optional[float] = None
+        self._half_open_calls = 0
+        self.total_failures = 0
+        self.total_rejections = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+        return self._state
+
+    def allow_request(self) -> bool:
+        """Return True if a call may proceed, counting it as a trial when half-open"""
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+            self._half_open_calls += 1
+            return True
+
+        self.total_rejections += 1
+        return False
+
+    def record_success(self):
+        """Close the circuit after a successful call"""
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = None
+        self._half_open_calls = 0
+
+    def record_failure(self):
+        """Count a failed call, opening the circuit when the threshold is reached"""
+        self.total_failures += 1
+        self._consecutive_failures += 1
+
+        if self._state == self.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+            self._state = self.OPEN
+            self._opened_at = time.monotonic()
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current breaker state for health and metrics endpoints"""
+        state = self.state
+        return {
+            "name": self.name,
+            "state": state,
+            "consecutive_failures": self._consecutive_failures,
+            "total_failures": self.total_failures,
+            "total_rejections": self.total_rejections,
+            "retry_in_seconds": (
+                max(0.0, self.recovery_timeout - (time.monotonic() - self._opened_at))
+                if state == self.OPEN else 0.0
+            )
+        }
@@ -0,0 +1,344 @@
+"""
+DICOM Ingestion for BioVerse Medical Vision
+Header-only parsing, lazy per-frame pixel access and metadata-driven windowing
+"""
+
+import io
+import logging
+import os
+from dataclasses import dataclass
+from typing import Iterator, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pydicom
+from pydicom.multival import MultiValue
+from pydicom.tag import Tag
+
+logger = logging.getLogger(__name__)
+
+PIXEL_DATA_TAG = Tag(0x7FE0, 0x0010)
+
+# Elements larger than this are not read while parsing the header
+DEFER_SIZE = 4096
+
+# Soft-tissue window used when a CT header carries no window values
+DEFAULT_CT_WINDOW = (40.0, 400.0)
+
+# A file path, or a buffer holding a whole DICOM file (e.g. a memory-mapped upload)
+DicomSource = Union[str, bytes, bytearray, memoryview, np.ndarray]
+
+def is_dicom(data: Union[bytes, bytearray, memoryview, np.ndarray]) -> bool:
+    """True if a buffer starts with the DICOM Part 10 preamble and magic"""
+    prefix = bytes(memoryview(data)[128:132]) if len(data) >= 132 else b""
+    return prefix == b"DICM"
+
+class _BufferReader(io.RawIOBase):
+    """Read-only file object over a buffer, so pydicom can parse it without a copy"""
+
+    def __init__(self, buffer: Union[bytes, bytearray, memoryview, np.ndarray]):
+        self._view = memoryview(buffer).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        count = min(len(target), len(self._view) - self._pos)
+        target[:count] = self._view[self._pos:self._pos + count]
+        self._pos += count
+        return count
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = base + offset
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+def _first_value(value, default: Optional[float] = None) -> Optional[float]:
+    """Header values such as WindowCenter may be multi-valued; use the first"""
+    if value is None or value == "":
+        return default
+    if isinstance(value, (list, tuple, MultiValue)):
+        return float(value[0]) if len(value) else default
+    return float(value)
+
+@dataclass
+class DicomHeader:
+    """Image-relevant DICOM attributes, read without touching pixel data"""
+    rows: int
+    columns: int
+    number_of_frames: int
+    samples_per_pixel: int
+    bits_allocated: int
+    bits_stored: int
+    pixel_representation: int
+    planar_configuration: int
+    photometric_interpretation: str
+    rescale_slope: float
+    rescale_intercept: float
+    window_center: Optional[float]
+    window_width: Optional[float]
+    modality: Optional[str]
+    transfer_syntax_uid: str
+    is_compressed: bool
+    is_little_endian: bool
+    series_instance_uid: Optional[str]
+    instance_number: Optional[int]
+    slice_position: Optional[float]
+
+    @property
+    def frame_shape(self) -> Tuple[int, ...]:
+        if self.samples_per_pixel > 1:
+            return (self.rows, self.columns, self.samples_per_pixel)
+        return (self.rows, self.columns)
+
+    @property
+    def storage_dtype(self) -> np.dtype:
+        kind = "i" if self.pixel_representation == 1 else "u"
+        byteorder = "<" if self.is_little_endian else ">"
+        return np.dtype(f"{byteorder}{kind}{self.bits_allocated // 8}")
+
+    @property
+    def frame_bytes(self) -> int:
+        return self.rows * self.columns * self.samples_per_pixel * self.bits_allocated // 8
+
+    @classmethod
+    def from_dataset(cls, ds: pydicom.Dataset) -> "DicomHeader":
+        transfer_syntax = ds.file_meta.TransferSyntaxUID
+        position = ds.get("ImagePositionPatient")
+        instance_number = ds.get("InstanceNumber")
+        return cls(
+            rows=int(ds.Rows),
+            columns=int(ds.Columns),
+            number_of_frames=int(ds.get("NumberOfFrames", 1) or 1),
+            samples_per_pixel=int(ds.get("SamplesPerPixel", 1)),
+            bits_allocated=int(ds.BitsAllocated),
+            bits_stored=int(ds.get("BitsStored", ds.BitsAllocated)),
+            pixel_representation=int(ds.get("PixelRepresentation", 0)),
+            planar_configuration=int(ds.get("PlanarConfiguration", 0)),
+            photometric_interpretation=str(ds.get("PhotometricInterpretation", "MONOCHROME2")),
+            rescale_slope=_first_value(ds.get("RescaleSlope"), 1.0),
+            rescale_intercept=_first_value(ds.get("RescaleIntercept"), 0.0),
+            window_center=_first_value(ds.get("WindowCenter")),
+            window_width=_first_value(ds.get("WindowWidth")),
+            modality=ds.get("Modality"),
+            transfer_syntax_uid=str(transfer_syntax),
+            is_compressed=transfer_syntax.is_compressed,
+            is_little_endian=transfer_syntax.is_little_endian,
+            series_instance_uid=ds.get("SeriesInstanceUID"),
+            instance_number=int(instance_number) if instance_number not in (None, "") else None,
+            slice_position=float(position[2]) if position else _first_value(ds.get("SliceLocation"))
+        )
+
+def rescale_to_float32(frame: np.ndarray, slope: float, intercept: float) -> np.ndarray:
+    """Apply the modality LUT (RescaleSlope/Intercept), e.g. stored values to Hounsfield units"""
+    values = frame.astype(np.float32)
+    if slope != 1.0:
+        values *= np.float32(slope)
+    if intercept != 0.0:
+        values += np.float32(intercept)
+    return values
+
+def window_to_uint8(values: np.ndarray, center: float, width: float, invert: bool = False) -> np.ndarray:
+    """Linear VOI windowing (DICOM PS3.3 C.11.2.1.2) of float32 values to 8 bits, in place"""
+    width = max(float(width), 1.0)
+    low = center - 0.5 - (width - 1) / 2
+    values -= np.float32(low)
+    values *= np.float32(255.0 / max(width - 1, 1.0))
+    np.clip(values, 0, 255, out=values)
+    image = values.astype(np.uint8)
+    if invert:
+        np.subtract(255, image, out=image)
+    return image
+
+class DicomImage:
+    """A DICOM file whose header is parsed eagerly and whose frames are decoded on demand.
+
+    For uncompressed transfer syntaxes a frame is a view straight into the file
+    (memory-mapped) or the upload buffer, so reading frame i of a multi-frame
+    study touches only that frame's bytes. Compressed frames are decoded one at
+    a time with pydicom's frame-level decoder when it is available (pydicom 3);
+    older versions decode the whole pixel array once on first access.
+    """
+
+    def __init__(self, source: DicomSource):
+        self._path: Optional[str] = None
+        self._buffer: Optional[memoryview] = None
+
+        if isinstance(source, str):
+            self._path = source
+            with open(source, "rb") as f:
+                self.dataset = pydicom.dcmread(f, defer_size=DEFER_SIZE)
+        else:
+            self._buffer = memoryview(source).cast("B")
+            self.dataset = pydicom.dcmread(self._reader(), defer_size=DEFER_SIZE)
+
+        self.header = DicomHeader.from_dataset(self.dataset)
+        self._pixel_offset = self._find_pixel_offset()
+        self._decoded: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return self.header.number_of_frames
+
+    def _reader(self) -> _BufferReader:
+        return _BufferReader(self._buffer)
+
+    def _find_pixel_offset(self) -> Optional[int]:
+        """File offset of the native pixel data, or None if it must be decoded"""
+        if self.header.is_compressed or PIXEL_DATA_TAG not in self.dataset:
+            return None
+        try:
+            element = self.dataset.get_item(PIXEL_DATA_TAG, keep_deferred=True)
+        except TypeError:  # pydicom < 3 keeps deferred elements raw by default
+            element = self.dataset.get_item(PIXEL_DATA_TAG)
+        return getattr(element, "value_tell", None)
+
+    def frame(self, index: int = 0) -> np.ndarray:
+        """Stored pixel values of one frame, without rescaling"""
+        if not 0 <= index < len(self):
+            raise IndexError(f"Frame {index} out of range for {len(self)} frames")
+
+        if self._pixel_offset is not None:
+            frame = self._native_frame(index)
+        else:
+            frame = self._decoded_frame(index)
+
+        return self._mask_unused_bits(frame)
+
+    def _native_frame(self, index: int) -> np.ndarray:
+        header = self.header
+        offset = self._pixel_offset + index * header.frame_bytes
+        count = header.frame_bytes // header.storage_dtype.itemsize
+
+        if self._path is not None:
+            flat = np.memmap(self._path, dtype=header.storage_dtype, mode="r", offset=offset, shape=(count,))
+        else:
+            flat = np.frombuffer(self._buffer, dtype=header.storage_dtype, count=count, offset=offset)
+
+        if header.samples_per_pixel > 1 and header.planar_configuration == 1:
+            # Colour planes stored one after another
+            return flat.reshape(header.samples_per_pixel, header.rows, header.columns).transpose(1, 2, 0)
+        return flat.reshape(header.frame_shape)
+
+    def _decoded_frame(self, index: int) -> np.ndarray:
+        try:
+            from pydicom.pixels import pixel_array
+        except ImportError:
+            pixel_array = None
+
+        if pixel_array is not None:
+            source = self._path if self._path is not None else self._reader()
+            return pixel_array(source, index=index)
+
+        if self._decoded is None:
+            self._decoded = self.dataset.pixel_array
+        return self._decoded[index] if len(self) > 1 else self._decoded
+
+    def _mask_unused_bits(self, frame: np.ndarray) -> np.ndarray:
+        """Drop bits above BitsStored, sign-extending signed data"""
+        header = self.header
+        unused = header.bits_allocated - header.bits_stored
+        if unused <= 0 or header.bits_allocated == 8 or self._pixel_offset is None:
+            return frame
+        if header.pixel_representation == 1:
+            return (frame << unused) >> unused
+        return frame & ((1 << header.bits_stored) - 1)
+
+    def iter_frames(self) -> Iterator[np.ndarray]:
+        for index in range(len(self)):
+            yield self.frame(index)
+
+    def modality_values(self, index: int = 0) -> np.ndarray:
+        """Frame in float32 modality units (Hounsfield units for CT)"""
+        return rescale_to_float32(self.frame(index), self.header.rescale_slope, self.header.rescale_intercept)
+
+    def windowed_frame(
+        self,
+        index: int = 0,
+        window_center: Optional[float] = None,
+        window_width: Optional[float] = None
+    ) -> np.ndarray:
+        """Frame as uint8, windowed with explicit values, the header's, or a modality default"""
+        header = self.header
+        frame = self.frame(index)
+
+        if header.samples_per_pixel > 1:
+            # Colour images (ultrasound, dermatology, endoscopy) carry no VOI window
+            if frame.dtype == np.uint8:
+                return np.array(frame)
+            values = frame.astype(np.float32)
+            return window_to_uint8(values, (values.max() + values.min()) / 2, values.max() - values.min() + 1)
+
+        values = rescale_to_float32(frame, header.rescale_slope, header.rescale_intercept)
+        center = window_center if window_center is not None else header.window_center
+        width = window_width if window_width is not None else header.window_width
+
+        if center is None or width is None:
+            if header.modality == "CT":
+                center, width = DEFAULT_CT_WINDOW
+            else:
+                # Full range of the frame
+                low, high = float(values.min()), float(values.max())
+                center, width = (low + high) / 2, high - low + 1
+
+        return window_to_uint8(values, center, width, invert=header.photometric_interpretation == "MONOCHROME1")
+
+class DicomSeries:
+    """A set of single- or multi-frame DICOM files ordered as slices.
+
+    Only headers are read up front. `iter_windowed` yields one 8-bit slice at
+    a time, so memory stays bounded by a single slice however long the series is.
+    """
+
+    def __init__(self, sources: Sequence[DicomSource]):
+        images = [DicomImage(source) for source in sources]
+        images.sort(key=self._sort_key)
+        self.images: List[DicomImage] = images
+        self._slices: List[Tuple[int, int]] = [
+            (image_index, frame_index)
+            for image_index, image in enumerate(images)
+            for frame_index in range(len(image))
+        ]
+
+    @classmethod
+    def from_directory(cls, path: str) -> "DicomSeries":
+        files = sorted(
+            os.path.join(path, name) for name in os.listdir(path)
+            if os.path.isfile(os.path.join(path, name)) and not name.startswith(".")
+        )
+        return cls(files)
+
+    @staticmethod
+    def _sort_key(image: DicomImage):
+        header = image.header
+        if header.slice_position is not None:
+            return (0, header.slice_position)
+        if header.instance_number is not None:
+            return (1, header.instance_number)
+        return (2, 0)
+
+    def __len__(self) -> int:
+        return len(self._slices)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        first = self.images[0].header
+        return (len(self),) + first.frame_shape
+
+    def slice_values(self, index: int) -> np.ndarray:
+        """Slice in float32 modality units"""
+        image_index, frame_index = self._slices[index]
+        return self.images[image_index].modality_values(frame_index)
+
+    def windowed_slice(self, index: int, window_center: Optional[float] = None, window_width: Optional[float] = None) -> np.ndarray:
+        image_index, frame_index = self._slices[index]
+        return self.images[image_index].windowed_frame(frame_index, window_center, window_width)
+
+    def iter_windowed(self, window_center: Optional[float] = None, window_width: Optional[float] = None) -> Iterator[np.ndarray]:
+        for index in range(len(self)):
+            yield self.windowed_slice(index, window_center, window_width)
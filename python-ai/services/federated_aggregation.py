@@ -0,0 +1,197 @@
+"""
+Federated Aggregation for BioVerse
+Streaming weighted FedAvg that folds each update into preallocated float64 accumulators
+"""
+
+import logging
+import math
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class SummationMethod(Enum):
+    """How accumulated sums are protected against floating point error"""
+    NAIVE = "naive"
+    KAHAN = "kahan"        # compensated summation: one extra accumulator per tensor
+    PAIRWISE = "pairwise"  # binary tree of partial sums: log2(updates) accumulators per tensor
+
+@dataclass
+class AggregationStats:
+    """Throughput of one aggregation"""
+    updates: int = 0
+    parameters: int = 0
+    bytes_received: int = 0
+    total_weight: float = 0.0
+    seconds: float = 0.0
+    summation: str = SummationMethod.KAHAN.value
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = self.seconds or float("inf")
+        return {
+            "updates": self.updates,
+            "parameters": self.parameters,
+            "bytes_received": self.bytes_received,
+            "total_weight": self.total_weight,
+            "seconds": round(self.seconds, 6),
+            "summation": self.summation,
+            "updates_per_second": round(self.updates / seconds, 2),
+            "parameters_per_second": round(self.updates * self.parameters / seconds, 2),
+            "megabytes_per_second": round(self.bytes_received / seconds / 1e6, 2)
+        }
+
+@dataclass
+class _Accumulator:
+    total: np.ndarray
+    compensation: Optional[np.ndarray] = None
+    scratch: Optional[np.ndarray] = None
+    partials: List[Optional[np.ndarray]] = field(default_factory=list)
+
+class StreamingAggregator:
+    """Weighted average of model updates, computed one update at a time.
+
+    Each update is multiplied by its weight (typically the participant's data
+    size) and folded into one float64 accumulator per tensor as soon as it
+    arrives, so memory stays at a small multiple of the model size however many
+    participants report. The accumulators are allocated from the first update,
+    or from `template` when the model layout is known up front.
+    """
+
+    def __init__(
+        self,
+        summation: SummationMethod = SummationMethod.KAHAN,
+        template: Optional[Dict[str, np.ndarray]] = None
+    ):
+        self.summation = summation
+        self._accumulators: Dict[str, _Accumulator] = {}
+        self._weights: List[float] = []
+        self.stats = AggregationStats(summation=summation.value)
+        if template is not None:
+            self._allocate(template)
+
+    def _allocate(self, tensors: Dict[str, np.ndarray]):
+        for name, array in tensors.items():
+            accumulator = _Accumulator(total=np.zeros(np.shape(array), dtype=np.float64))
+            if self.summation == SummationMethod.KAHAN:
+                accumulator.compensation = np.zeros_like(accumulator.total)
+                accumulator.scratch = np.empty_like(accumulator.total)
+            self._accumulators[name] = accumulator
+        self.stats.parameters = sum(accumulator.total.size for accumulator in self._accumulators.values())
+
+    @property
+    def updates(self) -> int:
+        return len(self._weights)
+
+    def add(self, tensors: Dict[str, np.ndarray], weight: float = 1.0, nbytes: int = 0):
+        """Fold one update into the running weighted sum"""
+        started = time.perf_counter()
+        if not self._accumulators:
+            self._allocate(tensors)
+        if tensors.keys() != self._accumulators.keys():
+            raise ValueError(f"Update tensors {sorted(tensors)} do not match the model {sorted(self._accumulators)}")
+
+        weight = float(weight)
+        for name, accumulator in self._accumulators.items():
+            values = tensors[name]
+            if np.shape(values) != accumulator.total.shape:
+                raise ValueError(f"Tensor {name} has shape {np.shape(values)}, expected {accumulator.total.shape}")
+            self._fold(accumulator, values, weight)
+
+        self._weights.append(weight)
+        self.stats.updates += 1
+        self.stats.bytes_received += nbytes
+        self.stats.seconds += time.perf_counter() - started
+
+    def add_sparse(self, sparse: Dict[str, Tuple[Tuple[int, ...], np.ndarray, np.ndarray]], weight: float = 1.0, nbytes: int = 0):
+        """Fold one sparse update, given as name -> (shape, flat indices, values).
+
+        Only the listed entries of each accumulator are touched, so the cost
+        follows the number of values sent rather than the model size. Indices
+        are expected to be unique within a tensor, as the compressor produces.
+        """
+        started = time.perf_counter()
+        if not self._accumulators:
+            self._allocate({name: np.empty(shape, dtype=np.float64) for name, (shape, _, _) in sparse.items()})
+        if sparse.keys() != self._accumulators.keys():
+            raise ValueError(f"Update tensors {sorted(sparse)} do not match the model {sorted(self._accumulators)}")
+
+        weight = float(weight)
+        for name, accumulator in self._accumulators.items():
+            shape, indices, values = sparse[name]
+            if tuple(shape) != accumulator.total.shape:
+                raise ValueError(f"Tensor {name} has shape {tuple(shape)}, expected {accumulator.total.shape}")
+            self._fold_sparse(accumulator, indices, values, weight)
+
+        self._weights.append(weight)
+        self.stats.updates += 1
+        self.stats.bytes_received += nbytes
+        self.stats.seconds += time.perf_counter() - started
+
+    def _fold_sparse(self, accumulator: _Accumulator, indices: np.ndarray, values: np.ndarray, weight: float):
+        weighted = np.multiply(values, weight, dtype=np.float64)
+        total = accumulator.total.reshape(-1)
+        if self.summation == SummationMethod.NAIVE:
+            total[indices] += weighted
+        elif self.summation == SummationMethod.KAHAN:
+            # Same recurrence as _fold, restricted to the indexed entries
+            compensation = accumulator.compensation.reshape(-1)
+            y = weighted - compensation[indices]
+            t = total[indices] + y
+            compensation[indices] = (t - total[indices]) - y
+            total[indices] = t
+        else:
+            # Partial sums are dense, so the update joins the counter as a dense carry
+            dense = np.zeros_like(accumulator.total)
+            dense.reshape(-1)[indices] = weighted
+            self._fold(accumulator, dense, 1.0)
+
+    def _fold(self, accumulator: _Accumulator, values: np.ndarray, weight: float):
+        if self.summation == SummationMethod.NAIVE:
+            accumulator.total += np.multiply(values, weight, dtype=np.float64)
+        elif self.summation == SummationMethod.KAHAN:
+            # y = x*w - c;  t = s + y;  c = (t - s) - y;  s = t
+            y = np.multiply(values, weight, dtype=np.float64)
+            y -= accumulator.compensation
+            np.add(accumulator.total, y, out=accumulator.scratch)
+            np.subtract(accumulator.scratch, accumulator.total, out=accumulator.compensation)
+            accumulator.compensation -= y
+            accumulator.total, accumulator.scratch = accumulator.scratch, accumulator.total
+        else:
+            # Binary counter: merge equal-sized partial sums like carries
+            carry = np.multiply(values, weight, dtype=np.float64)
+            level = 0
+            while level < len(accumulator.partials) and accumulator.partials[level] is not None:
+                carry += accumulator.partials[level]
+                accumulator.partials[level] = None
+                level += 1
+            if level == len(accumulator.partials):
+                accumulator.partials.append(None)
+            accumulator.partials[level] = carry
+
+    def _sum(self, accumulator: _Accumulator) -> np.ndarray:
+        if self.summation != SummationMethod.PAIRWISE:
+            return accumulator.total
+        total = accumulator.total.copy()
+        for partial in accumulator.partials:
+            if partial is not None:
+                total += partial
+        return total
+
+    def result(self, dtype=np.float64) -> Dict[str, np.ndarray]:
+        """Weighted average of everything added so far"""
+        if not self._weights:
+            raise ValueError("No updates to aggregate")
+        total_weight = math.fsum(self._weights)
+        if total_weight <= 0:
+            raise ValueError("Update weights must sum to a positive value")
+
+        started = time.perf_counter()
+        averaged = {name: (self._sum(accumulator) / total_weight).astype(dtype, copy=False)
+                    for name, accumulator in self._accumulators.items()}
+        self.stats.total_weight = total_weight
+        self.stats.seconds += time.perf_counter() - started
+        return averaged
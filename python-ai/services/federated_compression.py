@@ -0,0 +1,225 @@
+"""
+Federated Update Compression for BioVerse
+Top-k sparsification and stochastic 8-bit quantization of weight deltas with error feedback
+"""
+
+import hashlib
+import logging
+import math
+import os
+import threading
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from services.federated_wire import decode_payload, encode_tensors
+
+logger = logging.getLogger(__name__)
+
+# Metadata key marking a payload as a compressed delta
+COMPRESSION_KEY = "compression"
+
+# name -> (shape, flat indices, dequantized values)
+SparseDelta = Dict[str, Tuple[Tuple[int, ...], np.ndarray, np.ndarray]]
+
+@dataclass
+class CompressionConfig:
+    """How weight deltas are compressed before they leave a participant"""
+    enabled: bool = False
+    top_k_ratio: float = 0.1        # fraction of each tensor's entries sent
+    quantize_bits: int = 8          # 8 for stochastic uint8 values, 0 for float32
+    error_feedback: bool = True     # carry what was not sent into the next round
+
+    @classmethod
+    def from_env(cls) -> "CompressionConfig":
+        return cls(
+            enabled=os.getenv("FEDERATED_COMPRESSION", "false").lower() == "true",
+            top_k_ratio=float(os.getenv("FEDERATED_TOPK_RATIO", 0.1)),
+            quantize_bits=int(os.getenv("FEDERATED_QUANTIZE_BITS", 8)),
+            error_feedback=os.getenv("FEDERATED_ERROR_FEEDBACK", "true").lower() == "true"
+        )
+
+@dataclass
+class CompressionReport:
+    """Bandwidth saved and error introduced across the updates of one round"""
+    updates: int = 0
+    dense_bytes: int = 0
+    compressed_bytes: int = 0
+    squared_error: float = 0.0
+    squared_norm: float = 0.0
+
+    def record(self, dense_bytes: int, compressed_bytes: int, squared_error: float, squared_norm: float):
+        self.updates += 1
+        self.dense_bytes += dense_bytes
+        self.compressed_bytes += compressed_bytes
+        self.squared_error += squared_error
+        self.squared_norm += squared_norm
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "updates": self.updates,
+            "dense_bytes": self.dense_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "compression_ratio": round(self.dense_bytes / self.compressed_bytes, 2) if self.compressed_bytes else None,
+            # ||sent delta - true delta|| / ||true delta||, over every update of the round
+            "relative_error": round(math.sqrt(self.squared_error / self.squared_norm), 6) if self.squared_norm else 0.0
+        }
+
+class UpdateCompressor:
+    """Compresses weight deltas into sparse, quantized wire payloads.
+
+    For every tensor only the `top_k_ratio` largest-magnitude entries of the
+    delta are sent, as uint32 flat indices plus values. With 8-bit
+    quantization the values are mapped onto 256 levels between their minimum
+    and maximum with stochastic rounding, which keeps them unbiased.
+
+    With error feedback, whatever a participant did not send (the entries
+    outside the top k plus quantization error) is kept as its residual and
+    added to its next delta, so small but consistent updates still reach the
+    global model over a few rounds. Residuals are kept per model, participant
+    and tensor. compress() only stages the new residual; commit() adopts it
+    once the update has been received, and discard() keeps the previous one
+    when the update was late or dropped, so its signal is sent again next
+    round. compress() is safe to call from concurrent training threads for
+    different participants.
+    """
+
+    def __init__(self, config: Optional[CompressionConfig] = None, seed: Optional[int] = None):
+        self.config = config or CompressionConfig(enabled=True)
+        # (model id, participant id) -> tensor name -> residual
+        self._residuals: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        self._staged: Dict[Tuple[str, str], Dict[str, np.ndarray]] = {}
+        self._calls: Dict[str, int] = {}
+        self._seed_sequence = np.random.SeedSequence(seed)
+        self._lock = threading.Lock()
+
+    def _rng(self, participant_id: str) -> np.random.Generator:
+        """A stream per participant and call, so seeded results do not depend on which thread compresses first"""
+        with self._lock:
+            calls = self._calls.get(participant_id, 0)
+            self._calls[participant_id] = calls + 1
+        key = int.from_bytes(hashlib.sha256(participant_id.encode()).digest()[:8], "little")
+        return np.random.default_rng(np.random.SeedSequence(self._seed_sequence.entropy, spawn_key=(key, calls)))
+
+    def compress(self, participant_id: str, delta: Dict[str, np.ndarray], report: Optional[CompressionReport] = None,
+                 model_id: str = "") -> bytes:
+        """Encode a participant's weight delta for `model_id` as a compressed payload, staging its new residual"""
+        rng = self._rng(participant_id)
+        key = (model_id, participant_id)
+        with self._lock:
+            residuals = self._residuals.get(key, {})
+        staged: Dict[str, np.ndarray] = {}
+
+        tensors: Dict[str, np.ndarray] = {}
+        layout: Dict[str, Dict[str, Any]] = {}
+        dense_bytes = 0
+        squared_error = 0.0
+        squared_norm = 0.0
+        for name, values in delta.items():
+            values = np.asarray(values, dtype=np.float64)
+            dense_bytes += values.nbytes
+            flat = values.ravel()
+            squared_norm += float(flat @ flat)
+
+            corrected = flat + residuals[name] if self.config.error_feedback and name in residuals else flat.copy()
+            k = min(corrected.size, max(1, math.ceil(corrected.size * self.config.top_k_ratio)))
+            indices = np.argpartition(np.abs(corrected), corrected.size - k)[corrected.size - k:]
+            indices.sort()
+            selected = corrected[indices]
+
+            entry: Dict[str, Any] = {"shape": list(values.shape)}
+            if self.config.quantize_bits:
+                levels = (1 << self.config.quantize_bits) - 1
+                low, high = float(selected.min()), float(selected.max())
+                scale = (high - low) / levels if high > low else 1.0
+                quantized = np.floor((selected - low) / scale + rng.random(selected.size))
+                np.clip(quantized, 0, levels, out=quantized)
+                quantized = quantized.astype(np.uint8 if levels <= 255 else np.uint16)
+                sent = low + quantized * scale
+                entry.update(low=low, scale=scale)
+                tensors[f"{name}/values"] = quantized
+            else:
+                stored = selected.astype(np.float32)
+                sent = stored.astype(np.float64)
+                tensors[f"{name}/values"] = stored
+            tensors[f"{name}/indices"] = indices.astype(np.uint32)
+            layout[name] = entry
+
+            # Whatever was not delivered is carried into the participant's next delta
+            if self.config.error_feedback:
+                corrected[indices] -= sent
+                staged[name] = corrected
+
+            # Deviation of what the server receives from this round's true delta
+            error = -flat
+            error[indices] += sent
+            squared_error += float(error @ error)
+
+        payload = encode_tensors(tensors, metadata={COMPRESSION_KEY: {"tensors": layout}})
+        with self._lock:
+            if self.config.error_feedback:
+                self._staged[key] = staged
+            if report is not None:
+                report.record(dense_bytes, len(payload), squared_error, squared_norm)
+        return payload
+
+    def commit(self, participant_id: str, model_id: str = ""):
+        """Adopt the residual staged by the participant's last compress(), once its update was received"""
+        with self._lock:
+            staged = self._staged.pop((model_id, participant_id), None)
+            if staged is not None:
+                self._residuals[(model_id, participant_id)] = staged
+
+    def discard(self, participant_id: str, model_id: str = ""):
+        """Drop a staged residual whose update never counted, keeping the previous one"""
+        with self._lock:
+            self._staged.pop((model_id, participant_id), None)
+
+    def residuals(self, model_id: str = "") -> Dict[str, Dict[str, np.ndarray]]:
+        """Committed residuals of a model's participants, by participant id"""
+        with self._lock:
+            return {pid: dict(tensors) for (mid, pid), tensors in self._residuals.items() if mid == model_id}
+
+    def restore_residuals(self, residuals: Dict[str, Dict[str, np.ndarray]], model_id: str = ""):
+        """Replace a model's committed residuals, e.g. with those stored by another worker"""
+        with self._lock:
+            for key in [key for key in self._residuals if key[0] == model_id]:
+                del self._residuals[key]
+            for pid, tensors in residuals.items():
+                self._residuals[(model_id, pid)] = {name: np.array(values, dtype=np.float64) for name, values in tensors.items()}
+
+    def reset(self, participant_id: Optional[str] = None, model_id: Optional[str] = None):
+        """Forget residuals of a participant, a model or everything, e.g. when the global model is replaced"""
+        with self._lock:
+            for store in (self._residuals, self._staged):
+                for key in [key for key in store if (model_id is None or key[0] == model_id)
+                            and (participant_id is None or key[1] == participant_id)]:
+                    del store[key]
+
+def is_compressed(metadata: Dict[str, Any]) -> bool:
+    return COMPRESSION_KEY in metadata
+
+def decompress_sparse(payload: bytes) -> SparseDelta:
+    """Decode a compressed payload into sparse (shape, indices, values) triples without densifying"""
+    decoded = decode_payload(payload)
+    layout = decoded.metadata[COMPRESSION_KEY]["tensors"]
+    sparse: SparseDelta = {}
+    for name, entry in layout.items():
+        indices = decoded.tensors[f"{name}/indices"]
+        values = decoded.tensors[f"{name}/values"]
+        if "scale" in entry:
+            values = entry["low"] + values.astype(np.float64) * entry["scale"]
+        else:
+            values = values.astype(np.float64)
+        sparse[name] = (tuple(entry["shape"]), indices, values)
+    return sparse
+
+def densify(sparse: SparseDelta) -> Dict[str, np.ndarray]:
+    """Dense tensors from a sparse delta"""
+    dense = {}
+    for name, (shape, indices, values) in sparse.items():
+        tensor = np.zeros(int(np.prod(shape)), dtype=np.float64)
+        tensor[indices] = values
+        dense[name] = tensor.reshape(shape)
+    return dense
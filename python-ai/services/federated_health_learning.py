@@ -7,8 +7,9 @@ Most advanced federated learning implementation for healthcare
 import numpy as np
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional, Tuple
-from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Any, Optional, Tuple, Union
+from dataclasses import dataclass, field
+from functools import partial
 from datetime import datetime
 import json
 import hashlib
@@ -18,6 +19,15 @@ from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
 import base64
 import os
+import threading
+import uuid
+
+from services.federated_aggregation import StreamingAggregator, SummationMethod
+from services.federated_masking import MaskedAggregator, MaskingParticipant, MaskingRound
+from services.federated_privacy import BatchedDPEngine, RDPAccountant
+from services.federated_compression import CompressionConfig, CompressionReport, UpdateCompressor, decompress_sparse, is_compressed
+from services.federated_rounds import RoundCollector, RoundPolicy
+from services.federated_wire import Quantization, decode_tensors, encode_tensors, read_metadata
 
 logger = logging.getLogger(__name__)
 
@@ -27,12 +37,13 @@ class FederatedModel:
     model_id: str
     model_type: str
     global_weights: Dict[str, np.ndarray]
-    version: int
-    participants: List[str]
-    performance_metrics: Dict[str, float]
-    privacy_budget: float
-    created_at: datetime
-    last_updated: datetime
+    version: int = 1
+    participants: List[str] = field(default_factory=list)
+    performance_metrics: Dict[str, float] = field(default_factory=dict)
+    privacy_budget: float = 10.0
+    created_at: datetime = field(default_factory=datetime.now)
+    last_updated: datetime = field(default_factory=datetime.now)
+    history: List[Dict[str, Any]] = field(default_factory=list)   # one entry per stored version
 
 @dataclass
 class LocalUpdate:
@@ -42,9 +53,9 @@ class LocalUpdate:
     encrypted_weights: bytes
     weight_hash: str
     data_size: int
-    local_performance: Dict[str, float]
-    privacy_cost: float
-    timestamp: datetime
+    local_performance: Dict[str, float] = field(default_factory=dict)
+    privacy_cost: float = 0.0
+    timestamp: datetime = field(default_factory=datetime.now)
 
 @dataclass
 class HealthInstitution:
@@ -61,28 +72,36 @@ class HealthInstitution:
 class HomomorphicEncryption:
     """Simplified homomorphic encryption for federated learning"""
     
-    def __init__(self):
+    def __init__(self, quantization: Optional[Quantization] = None):
         self.key = Fernet.generate_key()
         self.cipher = Fernet(self.key)
         self.noise_scale = 0.1
+        self.quantization = quantization or Quantization(os.getenv("FEDERATED_WIRE_QUANTIZATION", "none"))
     
-    def encrypt(self, data: np.ndarray) -> bytes:
-        """Encrypt numpy array"""
+    def encrypt(self, data: np.ndarray, rng: Optional[np.random.Generator] = None) -> bytes:
+        """Encrypt numpy array; `rng` draws the noise, e.g. a participant's seeded generator"""
         # Add differential privacy noise
-        noisy_data = data + np.random.normal(0, self.noise_scale, data.shape)
-        
-        # Serialize and encrypt
-        serialized = json.dumps(noisy_data.tolist()).encode()
-        encrypted = self.cipher.encrypt(serialized)
+        normal = rng.normal if rng is not None else np.random.normal
+        noisy_data = data + normal(0, self.noise_scale, data.shape)
         
-        return encrypted
+        # Serialize to the binary tensor wire format and encrypt
+        serialized = encode_tensors({"data": noisy_data}, self.quantization)
+        return self.encrypt_payload(serialized)
+    
+    def encrypt_payload(self, payload: bytes) -> bytes:
+        """Encrypt an already serialized payload, e.g. a compressed update"""
+        return self.cipher.encrypt(payload)
+    
+    def decrypt_payload(self, encrypted_data: bytes) -> bytes:
+        """Decrypt to the serialized payload"""
+        return self.cipher.decrypt(encrypted_data)
     
     def decrypt(self, encrypted_data: bytes) -> np.ndarray:
         """Decrypt to numpy array"""
-        decrypted = self.cipher.decrypt(encrypted_data)
-        data_list = json.loads(decrypted.decode())
+        decrypted = self.decrypt_payload(encrypted_data)
         
-        return np.array(data_list)
+        # A read-only view into the decrypted bytes unless the payload was quantized
+        return decode_tensors(decrypted)["data"]
     
     def add_encrypted(self, encrypted_a: bytes, encrypted_b: bytes) -> bytes:
         """Homomorphic addition (simplified)"""
@@ -96,9 +115,10 @@ class HomomorphicEncryption:
 class DifferentialPrivacy:
     """Differential privacy implementation for healthcare data"""
     
-    def __init__(self, epsilon: float = 1.0, delta: float = 1e-5):
+    def __init__(self, epsilon: float = 1.0, delta: float = 1e-5, clip_norm: float = 1.0):
         self.epsilon = epsilon  # Privacy budget
         self.delta = delta      # Failure probability
+        self.clip_norm = clip_norm  # Per-example gradient L2 bound
         self.noise_multiplier = self.calculate_noise_multiplier()
     
     def calculate_noise_multiplier(self) -> float:
@@ -122,16 +142,41 @@ class DifferentialPrivacy:
         
         return gradients
     
-    def calculate_privacy_cost(self, num_queries: int) -> float:
-        """Calculate cumulative privacy cost"""
-        return num_queries * self.epsilon
+    def engine(self, seed=None) -> BatchedDPEngine:
+        """A batched clipping and noise engine with its own Generator, for one participant"""
+        return BatchedDPEngine(self.clip_norm, self.noise_multiplier, seed)
+    
+    def calculate_privacy_cost(self, num_queries: int, sample_rate: float = 1.0) -> float:
+        """Calculate cumulative privacy cost of `num_queries` noisy batches, via RDP composition"""
+        accountant = RDPAccountant()
+        accountant.step(self.noise_multiplier, sample_rate, num_queries)
+        return accountant.get_epsilon(self.delta)[0]
 
 class SecureAggregation:
-    """Secure aggregation for federated learning"""
+    """Secure aggregation for federated learning.
+
+    In "masking" mode participants send pairwise-masked fixed-point updates
+    that the server sums without decrypting anything; in "fernet" mode each
+    update is encrypted to the aggregator, which decrypts and averages it.
+    """
+    
+    MODES = ("masking", "fernet")
     
-    def __init__(self):
+    def __init__(self, encryption: Optional[HomomorphicEncryption] = None, summation: Optional[SummationMethod] = None,
+                 mode: Optional[str] = None):
         self.aggregation_key = os.urandom(32)
         self.participant_keys = {}
+        # Updates can only be opened with the key they were encrypted under
+        self.encryption = encryption or HomomorphicEncryption()
+        self.summation = summation or SummationMethod(os.getenv("FEDERATED_SUMMATION", "kahan"))
+        self.mode = mode or os.getenv("FEDERATED_SECURE_AGGREGATION", "masking")
+        if self.mode not in self.MODES:
+            raise ValueError(f"Unknown secure aggregation mode {self.mode}; expected one of {self.MODES}")
+        self.last_stats = None
+    
+    @property
+    def masking(self) -> bool:
+        return self.mode == "masking"
     
     def generate_participant_key(self, participant_id: str) -> bytes:
         """Generate unique key for participant"""
@@ -139,28 +184,65 @@ class SecureAggregation:
         self.participant_keys[participant_id] = key
         return key
     
-    async def aggregate(self, encrypted_updates: List[bytes]) -> np.ndarray:
-        """Securely aggregate encrypted model updates"""
+    async def aggregate(self, encrypted_updates: List[bytes], weights: Optional[List[float]] = None) -> np.ndarray:
+        """Securely aggregate encrypted model updates, weighted by `weights` (e.g. data sizes)"""
         if not encrypted_updates:
             raise ValueError("No updates to aggregate")
+        if weights is None:
+            weights = [1.0] * len(encrypted_updates)
         
-        # Decrypt all updates (in real implementation, this would be done securely)
-        decrypted_updates = []
-        encryption = HomomorphicEncryption()
-        
-        for update in encrypted_updates:
+        aggregator = self.new_aggregator()
+        for update, weight in zip(encrypted_updates, weights):
             try:
-                decrypted = encryption.decrypt(update)
-                decrypted_updates.append(decrypted)
+                self.fold(aggregator, update, weight)
             except Exception as e:
                 logger.warning(f"Failed to decrypt update: {e}")
                 continue
         
-        if not decrypted_updates:
+        return self.finish(aggregator)
+    
+    def new_aggregator(self, masking_round: Optional[MaskingRound] = None) -> Union[StreamingAggregator, MaskedAggregator]:
+        if masking_round is not None:
+            return MaskedAggregator(masking_round)
+        return StreamingAggregator(self.summation)
+    
+    def fold(self, aggregator: Union[StreamingAggregator, MaskedAggregator], encrypted_update: bytes, weight: float):
+        """Add one update to the running weighted sum.
+
+        Masked updates are summed as they are; their weight travels inside the
+        masked payload. Other updates are decrypted first. Compressed updates
+        are folded as sparse deltas, so the aggregate of a compressed round is
+        the average delta rather than the average weights.
+        """
+        if isinstance(aggregator, MaskedAggregator):
+            aggregator.add(encrypted_update)
+            return
+        # (in real implementation, this would be done securely)
+        payload = self.encryption.decrypt_payload(encrypted_update)
+        if is_compressed(read_metadata(payload)):
+            aggregator.add_sparse(decompress_sparse(payload), weight, len(encrypted_update))
+        else:
+            aggregator.add({'data': decode_tensors(payload)['data']}, weight, len(encrypted_update))
+    
+    def finish(self, aggregator: Union[StreamingAggregator, MaskedAggregator],
+               maskers: Optional[Dict[str, MaskingParticipant]] = None) -> np.ndarray:
+        """Weighted average of every folded update.
+
+        A masked sum is unmasked with the seeds revealed by the participants
+        whose updates arrived (`maskers`, by participant id), once the
+        participants that dropped out are known.
+        """
+        if not aggregator.updates:
             raise ValueError("No valid updates to aggregate")
         
-        # Compute weighted average
-        aggregated = np.mean(decrypted_updates, axis=0)
+        if isinstance(aggregator, MaskedAggregator):
+            dropped = aggregator.dropped()
+            unmaskings = [maskers[pid].reveal(aggregator.masking_round, dropped) for pid in aggregator.participants]
+            aggregated = aggregator.result(unmaskings)['data']
+        else:
+            aggregated = aggregator.result()['data']
+        self.last_stats = aggregator.stats
+        logger.info(f"Aggregated {aggregator.updates} updates: {aggregator.stats.to_dict()}")
         
         return aggregated
     
@@ -173,17 +255,48 @@ class HealthInstitutionParticipant:
     """Healthcare institution participating in federated learning"""
     
     def __init__(self, institution: HealthInstitution, encryption: HomomorphicEncryption, 
-                 differential_privacy: DifferentialPrivacy):
+                 differential_privacy: DifferentialPrivacy, compressor: Optional[UpdateCompressor] = None,
+                 seed: Optional[int] = None):
         self.institution = institution
         self.encryption = encryption
         self.differential_privacy = differential_privacy
+        # When set, updates are sent as compressed deltas from the global weights
+        self.compressor = compressor
+        # Key pair for pairwise-masked secure aggregation
+        self.masking = MaskingParticipant(institution.institution_id)
         self.local_data = None
         self.local_model = None
-        self.training_history = []
+        # Per-round metadata only; the update payloads are not kept after they are sent
+        self.training_history: List[Dict[str, Any]] = []
         self.privacy_budget_used = 0.0
+        # Private generators, so participants training on concurrent threads do not share random state
+        rng_seed, dp_seed = np.random.SeedSequence(seed).spawn(2)
+        self.rng = np.random.default_rng(rng_seed)
+        self.dp_engine = differential_privacy.engine(dp_seed)
+        # Privacy spent so far is composed in RDP and converted to epsilon at the DP delta
+        self.accountant = RDPAccountant()
+        # RDP spent since the state backend last recorded it, by rounds on any model
+        self._unsaved_rdp = np.zeros(len(self.accountant.orders))
+        self._unsaved_steps = 0
+        self._privacy_lock = threading.Lock()
+        self.batch_size = int(os.getenv("FEDERATED_DP_BATCH_SIZE", 64))
+        self.learning_rate = 0.01
+    
+    async def train_local_model(self, global_weights: np.ndarray, local_epochs: int = 5,
+                                compression_report: Optional[CompressionReport] = None,
+                                masking_round: Optional[MaskingRound] = None,
+                                model_id: str = "federated_health_model") -> LocalUpdate:
+        """Train model on local data, on an executor thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.train_local_update, global_weights, local_epochs, compression_report, masking_round, model_id
+        )
     
-    async def train_local_model(self, global_weights: np.ndarray, local_epochs: int = 5) -> LocalUpdate:
-        """Train model on local data"""
+    def train_local_update(self, global_weights: np.ndarray, local_epochs: int = 5,
+                           compression_report: Optional[CompressionReport] = None,
+                           masking_round: Optional[MaskingRound] = None,
+                           model_id: str = "federated_health_model") -> LocalUpdate:
+        """Blocking local training, safe to run on a worker thread"""
         try:
             # Simulate local training
             logger.info(f"Training local model for {self.institution.institution_id}")
@@ -191,33 +304,47 @@ class HealthInstitutionParticipant:
             # Initialize local model with global weights
             local_weights = global_weights.copy()
             
-            # Simulate training iterations
+            # Simulate training iterations, one batch of per-example gradients each
             for epoch in range(local_epochs):
                 # Simulate gradient computation
-                gradients = self.compute_gradients(local_weights)
+                per_example_gradients = self.compute_per_example_gradients(local_weights, self.batch_size)
                 
-                # Apply differential privacy
-                clipped_gradients = self.differential_privacy.clip_gradients(gradients)
-                private_gradients = self.differential_privacy.add_noise(clipped_gradients)
+                # Apply differential privacy: clip every example, noise the batch sum once
+                private_gradients = self.dp_engine.privatize(per_example_gradients)
                 
                 # Update local weights
-                learning_rate = 0.01
-                local_weights -= learning_rate * private_gradients
+                local_weights -= self.learning_rate * private_gradients
             
             # Calculate privacy cost
-            privacy_cost = self.differential_privacy.calculate_privacy_cost(local_epochs)
-            self.privacy_budget_used += privacy_cost
+            sample_rate = min(1.0, self.batch_size / max(1, self.get_local_data_size()))
+            with self._privacy_lock:
+                before = self.accountant.rdp
+                self.accountant.step(self.differential_privacy.noise_multiplier, sample_rate, local_epochs)
+                self._unsaved_rdp = self._unsaved_rdp + (self.accountant.rdp - before)
+                self._unsaved_steps += local_epochs
+                spent = self.accountant.get_epsilon(self.differential_privacy.delta)[0]
+                privacy_cost = spent - self.privacy_budget_used
+                self.privacy_budget_used = spent
             
-            # Encrypt weights
-            encrypted_weights = self.encryption.encrypt(local_weights)
+            # Mask or encrypt weights, or the compressed noisy delta when compressing
+            if masking_round is not None:
+                noisy_weights = local_weights + self.rng.normal(0, self.encryption.noise_scale, local_weights.shape)
+                encrypted_weights = self.masking.mask(masking_round, {'data': noisy_weights}, self.get_local_data_size())
+            elif self.compressor is not None:
+                delta = local_weights - global_weights
+                delta += self.rng.normal(0, self.encryption.noise_scale, delta.shape)
+                payload = self.compressor.compress(self.institution.institution_id, {'data': delta}, compression_report, model_id)
+                encrypted_weights = self.encryption.encrypt_payload(payload)
+            else:
+                encrypted_weights = self.encryption.encrypt(local_weights, self.rng)
             weight_hash = hashlib.sha256(encrypted_weights).hexdigest()
             
             # Evaluate local performance
-            local_performance = await self.evaluate_local_model(local_weights)
+            local_performance = self._evaluate(local_weights)
             
             update = LocalUpdate(
                 participant_id=self.institution.institution_id,
-                model_id="federated_health_model",
+                model_id=model_id,
                 encrypted_weights=encrypted_weights,
                 weight_hash=weight_hash,
                 data_size=self.get_local_data_size(),
@@ -226,7 +353,13 @@ class HealthInstitutionParticipant:
                 timestamp=datetime.now()
             )
             
-            self.training_history.append(update)
+            self.training_history.append({
+                'model_id': model_id,
+                'weight_hash': weight_hash,
+                'data_size': update.data_size,
+                'privacy_cost': privacy_cost,
+                'timestamp': update.timestamp
+            })
             
             logger.info(f"Local training completed for {self.institution.institution_id}")
             return update
@@ -235,25 +368,35 @@ class HealthInstitutionParticipant:
             logger.error(f"Error in local training: {e}")
             raise
     
-    def compute_gradients(self, weights: np.ndarray) -> np.ndarray:
-        """Simulate gradient computation on local data"""
+    def _gradient_scale(self) -> float:
         # Simulate realistic gradients based on institution type
-        gradient_scale = {
+        return {
             'hospital': 0.1,
             'clinic': 0.05,
             'research_center': 0.15
         }.get(self.institution.institution_type, 0.1)
-        
+    
+    def compute_gradients(self, weights: np.ndarray) -> np.ndarray:
+        """Simulate gradient computation on local data"""
         # Add some realistic variation
-        gradients = np.random.normal(0, gradient_scale, weights.shape)
+        gradients = self.rng.normal(0, self._gradient_scale(), weights.shape)
         
         # Simulate convergence
         gradients *= (1.0 / (len(self.training_history) + 1))
         
         return gradients
     
+    def compute_per_example_gradients(self, weights: np.ndarray, batch_size: int) -> np.ndarray:
+        """Simulate the gradients of one batch, one flattened row per example"""
+        gradients = self.rng.normal(0, self._gradient_scale(), (batch_size, weights.size))
+        gradients *= (1.0 / (len(self.training_history) + 1))
+        return gradients
+    
     async def evaluate_local_model(self, weights: np.ndarray) -> Dict[str, float]:
         """Evaluate model performance on local test data"""
+        return self._evaluate(weights)
+    
+    def _evaluate(self, weights: np.ndarray) -> Dict[str, float]:
         # Simulate evaluation metrics
         base_accuracy = 0.85
         institution_factor = {
@@ -263,49 +406,103 @@ class HealthInstitutionParticipant:
         }.get(self.institution.institution_type, 0.0)
         
         # Add some noise to simulate realistic variation
-        noise = np.random.normal(0, 0.02)
+        noise = self.rng.normal(0, 0.02)
         
         accuracy = base_accuracy + institution_factor + noise
         accuracy = max(0.0, min(1.0, accuracy))  # Clamp to [0, 1]
         
         return {
             'accuracy': accuracy,
-            'precision': accuracy + np.random.normal(0, 0.01),
-            'recall': accuracy + np.random.normal(0, 0.01),
-            'f1_score': accuracy + np.random.normal(0, 0.01),
-            'auc_roc': accuracy + np.random.normal(0, 0.02)
+            'precision': accuracy + self.rng.normal(0, 0.01),
+            'recall': accuracy + self.rng.normal(0, 0.01),
+            'f1_score': accuracy + self.rng.normal(0, 0.01),
+            'auc_roc': accuracy + self.rng.normal(0, 0.02)
         }
     
     def get_local_data_size(self) -> int:
         """Get size of local training data"""
         return self.institution.patient_count
     
+    def take_privacy_spend(self) -> Optional[Dict[str, Any]]:
+        """RDP spent since the last call, for the state backend to add to its total; None if nothing was"""
+        with self._privacy_lock:
+            if not self._unsaved_steps:
+                return None
+            spend = {"orders": list(self.accountant.orders), "rdp": self._unsaved_rdp.tolist(), "steps": self._unsaved_steps}
+            self._unsaved_rdp = np.zeros(len(self.accountant.orders))
+            self._unsaved_steps = 0
+            return spend
+    
+    def restore_privacy_state(self, state: Dict[str, Any]):
+        """Adopt the privacy total stored by the state backend, plus anything spent here and not yet recorded"""
+        with self._privacy_lock:
+            if list(state["orders"]) != list(self.accountant.orders):
+                logger.warning(f"Ignoring stored privacy state of {self.institution.institution_id} with different RDP orders")
+                return
+            self.accountant = RDPAccountant(
+                orders=self.accountant.orders,
+                rdp=np.asarray(state["rdp"], dtype=np.float64) + self._unsaved_rdp,
+                steps=int(state["steps"]) + self._unsaved_steps
+            )
+            self.privacy_budget_used = self.accountant.get_epsilon(self.differential_privacy.delta)[0]
+    
     def get_privacy_budget_remaining(self) -> float:
         """Get remaining privacy budget"""
         total_budget = 10.0  # Total privacy budget
         return max(0.0, total_budget - self.privacy_budget_used)
 
 class FederatedHealthLearning:
-    """Main federated learning system for healthcare"""
-    
-    def __init__(self):
+    """Main federated learning system for healthcare.
+
+    This is the one federated engine: the API service drives its rounds
+    through run_round(), and so does train_federated_health_model(). Every
+    round uses the configured secure aggregation (pairwise masking or
+    encrypted updates), per-participant differential privacy and, when
+    enabled, compressed deltas.
+    """
+    
+    # Subclasses may train with their own participant type, e.g. on synthetic data
+    participant_class = HealthInstitutionParticipant
+    
+    def __init__(self, compression: Optional[CompressionConfig] = None, secure_aggregation: Optional[str] = None,
+                 differential_privacy: Optional[DifferentialPrivacy] = None, seed: Optional[int] = None):
         self.participants = []
+        self._participants_by_id: Dict[str, HealthInstitutionParticipant] = {}
         self.global_models = {}
         self.encryption = HomomorphicEncryption()
-        self.differential_privacy = DifferentialPrivacy()
-        self.secure_aggregation = SecureAggregation()
+        self.differential_privacy = differential_privacy or DifferentialPrivacy()
+        self.secure_aggregation = SecureAggregation(self.encryption, mode=secure_aggregation)
         self.training_rounds = []
         self.performance_history = []
+        self.round_collector = RoundCollector(max_workers=int(os.getenv("FEDERATED_TRAINING_WORKERS", 0)) or None)
+        self.compression = compression or CompressionConfig.from_env()
+        self.compressor = UpdateCompressor(self.compression, seed) if self.compression.enabled else None
+        if self.compressor is not None and self.secure_aggregation.masking:
+            # Masks are dense, so sparse deltas would lose their size advantage
+            logger.warning("Compressed updates cannot be pairwise masked; using encrypted updates instead")
+            self.secure_aggregation.mode = "fernet"
+    
+    def _round_policy(self, training_config: Dict[str, Any]) -> RoundPolicy:
+        """Round deadline and quorum, from the training config or the environment"""
+        policy = RoundPolicy.from_env()
+        return RoundPolicy(
+            deadline=training_config.get('round_deadline', policy.deadline),
+            quorum=training_config.get('quorum', policy.quorum),
+            quorum_grace=training_config.get('quorum_grace', policy.quorum_grace)
+        )
     
-    def add_participant(self, institution: HealthInstitution) -> HealthInstitutionParticipant:
-        """Add healthcare institution as participant"""
-        participant = HealthInstitutionParticipant(
+    def add_participant(self, institution: HealthInstitution, seed: Optional[int] = None) -> HealthInstitutionParticipant:
+        """Add healthcare institution as participant; `seed` makes its training reproducible"""
+        participant = self.participant_class(
             institution, 
             self.encryption,
-            self.differential_privacy
+            self.differential_privacy,
+            self.compressor,
+            seed=seed
         )
         
         self.participants.append(participant)
+        self._participants_by_id[institution.institution_id] = participant
         
         # Generate secure aggregation key
         participant_key = self.secure_aggregation.generate_participant_key(
@@ -315,7 +512,10 @@ class FederatedHealthLearning:
         logger.info(f"Added participant: {institution.institution_id}")
         return participant
     
-    def initialize_global_model(self, model_type: str) -> FederatedModel:
+    def get_participant(self, institution_id: str) -> Optional[HealthInstitutionParticipant]:
+        return self._participants_by_id.get(institution_id)
+    
+    def initialize_global_model(self, model_type: str, model_id: Optional[str] = None) -> FederatedModel:
         """Initialize global federated model"""
         # Initialize with random weights (simplified)
         if model_type == 'disease_prediction':
@@ -330,15 +530,9 @@ class FederatedHealthLearning:
             global_weights = {'weights': np.random.normal(0, 0.1, (100, 10))}
         
         model = FederatedModel(
-            model_id=f"federated_{model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            model_id=model_id or f"federated_{model_type}_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             model_type=model_type,
-            global_weights=global_weights,
-            version=1,
-            participants=[],
-            performance_metrics={},
-            privacy_budget=10.0,
-            created_at=datetime.now(),
-            last_updated=datetime.now()
+            global_weights=global_weights
         )
         
         self.global_models[model.model_id] = model
@@ -346,6 +540,107 @@ class FederatedHealthLearning:
         logger.info(f"Initialized global model: {model.model_id}")
         return model
     
+    async def run_round(
+        self,
+        model: FederatedModel,
+        participants: List[HealthInstitutionParticipant],
+        policy: RoundPolicy,
+        local_epochs: int = 5,
+        round_id: Optional[str] = None,
+        on_status: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, Any]:
+        """Train `participants` on the model concurrently and apply their aggregated update.
+
+        Participants without privacy budget are skipped. Each verified update
+        is folded into the secure aggregator as it arrives; updates that miss
+        the policy's deadline are dropped. Without a quorum the model is left
+        unchanged and the round is reported as failed. `on_status(participant_id,
+        status)` reports each participant's progress through the round.
+        """
+        round_id = round_id or str(model.version + 1)
+        notify = on_status or (lambda participant_id, status: None)
+        
+        # Distribute global model (flattened for simplicity) to participants with privacy budget left
+        current_weights = self.flatten_weights(model.global_weights)
+        compression_report = CompressionReport() if self.compressor is not None else None
+        round_participants = {}
+        for participant in participants:
+            participant_id = participant.institution.institution_id
+            if participant.get_privacy_budget_remaining() <= 0:
+                logger.warning(f"Participant {participant_id} has exhausted privacy budget")
+                notify(participant_id, "skipped")
+                continue
+            round_participants[participant_id] = participant
+        
+        # With masking, every participant learns the others' public keys before training;
+        # the masking round id is fresh for every attempt so that masks are never reused
+        masking_round = None
+        if self.secure_aggregation.masking:
+            masking_round = MaskingRound(
+                round_id=f"{model.model_id}:{round_id}:{uuid.uuid4().hex[:8]}",
+                public_keys={pid: participant.masking.public_key for pid, participant in round_participants.items()}
+            )
+        jobs = {
+            pid: partial(participant.train_local_update, current_weights, local_epochs, compression_report, masking_round, model.model_id)
+            for pid, participant in round_participants.items()
+        }
+        
+        # Verify and aggregate each update as it arrives; late updates are dropped
+        aggregator = self.secure_aggregation.new_aggregator(masking_round)
+        
+        def fold(participant_id: str, local_update: LocalUpdate):
+            if not self.secure_aggregation.verify_update_integrity(
+                local_update.encrypted_weights, 
+                local_update.weight_hash
+            ):
+                raise ValueError(f"Invalid update from {participant_id}")
+            self.secure_aggregation.fold(aggregator, local_update.encrypted_weights, local_update.data_size)
+        
+        collection = await self.round_collector.collect(jobs, fold, policy, on_status)
+        
+        if not collection.received or not collection.quorum_met:
+            self._settle_residuals(model.model_id, round_participants, applied=())
+            logger.warning(f"Round {round_id} of {model.model_id} received {len(collection.received)} of {collection.required} required updates")
+            return {"status": "failed", "message": "Quorum not reached.", "round_id": round_id, "collection": collection.to_dict()}
+        
+        # Securely aggregate updates; compressed updates are deltas from the weights the round started with
+        aggregated_weights = self.secure_aggregation.finish(
+            aggregator, {pid: participant.masking for pid, participant in round_participants.items()}
+        )
+        if compression_report is not None:
+            aggregated_weights = current_weights + aggregated_weights
+        
+        # Update global model
+        model.global_weights = self.unflatten_weights(aggregated_weights, model.global_weights)
+        model.version += 1
+        model.last_updated = datetime.now()
+        model.participants = sorted(set(model.participants) | set(collection.received))
+        self._settle_residuals(model.model_id, round_participants, applied=collection.received)
+        
+        result = {
+            "status": "completed",
+            "round_id": round_id,
+            "model_id": model.model_id,
+            "new_version": model.version,
+            "participants_in_round": len(collection.received),
+            "collection": collection.to_dict(),
+            "aggregation": self.secure_aggregation.last_stats.to_dict()
+        }
+        if compression_report is not None:
+            result["compression"] = compression_report.to_dict()
+        return result
+    
+    def _settle_residuals(self, model_id: str, participant_ids: Iterable[str], applied: Iterable[str]):
+        """Keep compression residuals of updates that reached the model; the rest are sent again next round"""
+        if self.compressor is None:
+            return
+        applied = set(applied)
+        for participant_id in participant_ids:
+            if participant_id in applied:
+                self.compressor.commit(participant_id, model_id)
+            else:
+                self.compressor.discard(participant_id, model_id)
+    
     async def train_federated_health_model(self, model_type: str, training_config: Dict[str, Any]) -> FederatedModel:
         """Train federated model across healthcare institutions"""
         try:
@@ -358,6 +653,8 @@ class FederatedHealthLearning:
             max_rounds = training_config.get('max_rounds', 10)
             participants_per_round = training_config.get('participants_per_round', len(self.participants))
             convergence_threshold = training_config.get('convergence_threshold', 0.001)
+            local_epochs = training_config.get('local_epochs', 5)
+            policy = self._round_policy(training_config)
             
             previous_performance = 0.0
             
@@ -371,57 +668,15 @@ class FederatedHealthLearning:
                     logger.warning("No participants available for training")
                     break
                 
-                # Distribute global model to participants
-                local_updates = []
-                
-                for participant in selected_participants:
-                    try:
-                        # Check privacy budget
-                        if participant.get_privacy_budget_remaining() <= 0:
-                            logger.warning(f"Participant {participant.institution.institution_id} has exhausted privacy budget")
-                            continue
-                        
-                        # Get current global weights (flattened for simplicity)
-                        current_weights = self.flatten_weights(global_model.global_weights)
-                        
-                        # Train local model
-                        local_update = await participant.train_local_model(
-                            current_weights,
-                            training_config.get('local_epochs', 5)
-                        )
-                        
-                        # Verify update integrity
-                        if self.secure_aggregation.verify_update_integrity(
-                            local_update.encrypted_weights, 
-                            local_update.weight_hash
-                        ):
-                            local_updates.append(local_update.encrypted_weights)
-                        else:
-                            logger.warning(f"Invalid update from {participant.institution.institution_id}")
-                        
-                    except Exception as e:
-                        logger.error(f"Error training with participant {participant.institution.institution_id}: {e}")
-                        continue
-                
-                if not local_updates:
-                    logger.warning("No valid updates received")
-                    continue
-                
-                # Securely aggregate updates
                 try:
-                    aggregated_weights = await self.secure_aggregation.aggregate(local_updates)
-                    
-                    # Update global model
-                    global_model.global_weights = self.unflatten_weights(
-                        aggregated_weights, 
-                        global_model.global_weights
+                    result = await self.run_round(
+                        global_model, selected_participants, policy, local_epochs, round_id=str(training_round + 1)
                     )
-                    global_model.version += 1
-                    global_model.last_updated = datetime.now()
-                    
                 except Exception as e:
                     logger.error(f"Error in secure aggregation: {e}")
                     continue
+                if result["status"] != "completed":
+                    continue
                 
                 # Evaluate global model
                 performance = await self.evaluate_global_model(global_model, selected_participants)
@@ -430,10 +685,15 @@ class FederatedHealthLearning:
                 # Record training round
                 round_info = {
                     'round': training_round + 1,
+                    'model_id': global_model.model_id,
                     'participants': len(selected_participants),
                     'performance': performance,
+                    'collection': result['collection'],
+                    'aggregation': result['aggregation'],
                     'timestamp': datetime.now().isoformat()
                 }
+                if 'compression' in result:
+                    round_info['compression'] = result['compression']
                 self.training_rounds.append(round_info)
                 
                 logger.info(f"Round {training_round + 1} completed. Performance: {performance}")
@@ -560,11 +820,13 @@ class FederatedHealthLearning:
             ]) if self.participants else 0.0,
             'privacy_mechanisms': [
                 'differential_privacy',
-                'homomorphic_encryption',
+                'pairwise_masking' if self.secure_aggregation.masking else 'homomorphic_encryption',
                 'secure_aggregation'
             ],
             'epsilon': self.differential_privacy.epsilon,
-            'delta': self.differential_privacy.delta
+            'delta': self.differential_privacy.delta,
+            'noise_multiplier': self.differential_privacy.noise_multiplier,
+            'accountant': 'rdp'
         }
         
         return privacy_report
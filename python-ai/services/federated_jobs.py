@@ -0,0 +1,237 @@
+"""
+Federated Training Round Jobs for BioVerse
+Runs training rounds as background tasks with per-participant progress and a bounded history
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from services.federated_learning_service import FederatedLearningService
+from services.federated_rounds import RoundPolicy
+
+logger = logging.getLogger(__name__)
+
+# Participant states that end its part in a round
+FINAL_PARTICIPANT_STATES = {"received", "late", "failed", "cancelled", "unknown", "skipped"}
+
+@dataclass
+class ParticipantProgress:
+    """Where one participant is in a round"""
+    status: str = "pending"
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        seconds = None
+        if self.started_at and self.finished_at:
+            seconds = round((self.finished_at - self.started_at).total_seconds(), 4)
+        return {
+            "status": self.status,
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "seconds": seconds
+        }
+
+@dataclass
+class FederatedRoundJob:
+    """State of one training round submitted through the API"""
+    job_id: str
+    model_id: str
+    participant_ids: List[str]
+    created_at: datetime = field(default_factory=datetime.now)
+    status: str = "queued"
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    participants: Dict[str, ParticipantProgress] = field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+    def __post_init__(self):
+        self._task: Optional[asyncio.Task] = None
+        if not self.participants:
+            self.participants = {pid: ParticipantProgress() for pid in self.participant_ids}
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    @property
+    def progress(self) -> float:
+        """Fraction of participants that have finished their part of the round"""
+        if self.done:
+            return 1.0
+        if not self.participants:
+            return 0.0
+        finished = sum(1 for p in self.participants.values() if p.status in FINAL_PARTICIPANT_STATES)
+        return round(finished / len(self.participants), 4)
+
+    def update_participant(self, participant_id: str, status: str):
+        progress = self.participants.setdefault(participant_id, ParticipantProgress())
+        now = datetime.now()
+        if status == "training":
+            progress.started_at = now
+        elif status in FINAL_PARTICIPANT_STATES:
+            progress.finished_at = now
+        progress.status = status
+
+    def summary(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for progress in self.participants.values():
+            counts[progress.status] = counts.get(progress.status, 0) + 1
+        return {
+            "job_id": self.job_id,
+            "model_id": self.model_id,
+            "status": self.status,
+            "progress": self.progress,
+            "participant_counts": counts,
+            "created_at": self.created_at.isoformat(),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error
+        }
+
+    def details(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "participants": {pid: progress.to_dict() for pid, progress in self.participants.items()},
+            "result": self.result
+        }
+
+class FederatedRoundManager:
+    """Background execution of training rounds with a bounded registry of recent jobs.
+
+    Rounds for the same model run one after another, since each round starts
+    from the weights the previous one produced; rounds for different models
+    run concurrently. Finished jobs beyond `max_history` are forgotten oldest
+    first.
+
+    Each job's details are also written to the service's state backend, on
+    every job state change and at most every `persist_interval` seconds while
+    participants report, so that with a shared backend any API worker can
+    report a round that another worker runs. Only the worker running a round
+    can cancel it.
+    """
+
+    def __init__(self, service: FederatedLearningService, max_history: int = 100, persist_interval: float = 1.0):
+        self.service = service
+        self.state = service.state
+        self.max_history = max_history
+        self.persist_interval = persist_interval
+        self.jobs: "OrderedDict[str, FederatedRoundJob]" = OrderedDict()
+        self._model_locks: Dict[str, asyncio.Lock] = {}
+        self._persisted_at: Dict[str, float] = {}
+
+    def submit(self, model_id: str, participant_ids: List[str], policy: Optional[RoundPolicy] = None) -> FederatedRoundJob:
+        """Queue a round and return its job immediately"""
+        if self.service.get_model(model_id) is None:
+            raise ValueError(f"Global model {model_id} not found.")
+
+        job = FederatedRoundJob(job_id=str(uuid.uuid4()), model_id=model_id, participant_ids=list(participant_ids))
+        self.jobs[job.job_id] = job
+        self._persist(job)
+        self._evict_finished_jobs()
+
+        job._task = asyncio.create_task(self._run(job, policy))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[FederatedRoundJob]:
+        """A job submitted to this worker"""
+        return self.jobs.get(job_id)
+
+    def list_jobs(self, model_id: Optional[str] = None) -> List[FederatedRoundJob]:
+        """Jobs submitted to this worker in submission order, newest last"""
+        return [job for job in self.jobs.values() if model_id is None or job.model_id == model_id]
+
+    def job_details(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Details of a job run by this or, with a shared state backend, any other worker"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.details()
+        return self.state.load_job(job_id)
+
+    def job_summaries(self, model_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Summaries of recent jobs on every worker sharing the state backend, oldest first"""
+        summaries = {job.job_id: job.summary() for job in self.list_jobs(model_id)}
+        for details in self.state.list_jobs(model_id):
+            if details["job_id"] not in summaries:
+                summaries[details["job_id"]] = {key: value for key, value in details.items()
+                                                if key not in ("participants", "result")}
+        return sorted(summaries.values(), key=lambda summary: summary["created_at"])
+
+    def _persist(self, job: FederatedRoundJob):
+        try:
+            self.state.save_job(job.details())
+            self._persisted_at[job.job_id] = time.monotonic()
+        except Exception as e:
+            logger.warning(f"Could not store federated round {job.job_id}: {e}")
+
+    def _on_status(self, job: FederatedRoundJob, participant_id: str, status: str):
+        job.update_participant(participant_id, status)
+        if time.monotonic() - self._persisted_at.get(job.job_id, 0.0) >= self.persist_interval:
+            self._persist(job)
+
+    def _evict_finished_jobs(self):
+        """Drop the oldest finished jobs once the registry is over capacity"""
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_history:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+                self._persisted_at.pop(job_id, None)
+                self.state.delete_job(job_id)
+
+    async def _run(self, job: FederatedRoundJob, policy: Optional[RoundPolicy]):
+        lock = self._model_locks.setdefault(job.model_id, asyncio.Lock())
+        try:
+            async with lock:
+                job.status = "running"
+                job.started_at = datetime.now()
+                self._persist(job)
+                result = await self.service.start_training_round(
+                    job.model_id, job.participant_ids, policy,
+                    on_status=lambda participant_id, status: self._on_status(job, participant_id, status)
+                )
+            job.result = result
+            job.status = "completed" if result.get("status") == "completed" else "failed"
+            if job.status == "failed":
+                job.error = result.get("message")
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            for progress in job.participants.values():
+                if progress.status not in FINAL_PARTICIPANT_STATES:
+                    progress.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Federated round {job.job_id} failed: {e}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now()
+            self._persist(job)
+            self._evict_finished_jobs()
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running round.
+
+        The global model is left unchanged unless the round's update has
+        already been applied, in which case the round is stored and reported
+        as completed.
+        """
+        job = self.jobs.get(job_id)
+        if job is None or job.done or job._task is None:
+            return False
+        job._task.cancel()
+        return True
+
+    def shutdown(self):
+        """Cancel unfinished rounds and stop the training threads"""
+        for job in self.jobs.values():
+            if not job.done and job._task is not None:
+                job._task.cancel()
+        self.service.round_collector.shutdown()
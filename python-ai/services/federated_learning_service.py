@@ -6,75 +6,175 @@ Manages privacy-preserving AI training across healthcare institutions.
 import numpy as np
 import asyncio
 import logging
-from typing import Dict, List, Any, Optional
-from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Any, Optional
 from datetime import datetime
 import hashlib
-import hmac
-import os
+import time
+from dataclasses import asdict
+from functools import partial
 
 from .base_service import BaseService
-# Note: The following classes are internal to this service but could be moved
-# to a shared models directory if needed elsewhere.
-
-#<editor-fold desc="Data Models">
-@dataclass
-class FederatedModel:
-    """Represents the global model being trained."""
-    model_id: str
-    model_type: str
-    global_weights: Dict[str, np.ndarray]
-    version: int = 1
-    participants: List[str] = field(default_factory=list)
-    performance_metrics: Dict[str, float] = field(default_factory=dict)
-    created_at: datetime = field(default_factory=datetime.now)
-    last_updated: datetime = field(default_factory=datetime.now)
-
-@dataclass
-class HealthInstitution:
-    """Represents a participant in the federated learning network."""
-    institution_id: str
-    institution_type: str  # e.g., hospital, clinic, research_center
-    location: str
-    patient_count: int
-    # In a real system, we would manage keys and security tokens here
-    
-@dataclass
-class LocalUpdate:
-    """Represents a model update from a single participant."""
-    participant_id: str
-    model_id: str
-    encrypted_weights: bytes
-    weight_hash: str
-    data_size: int
-#</editor-fold>
+from .federated_aggregation import AggregationStats
+from .federated_health_learning import FederatedHealthLearning, FederatedModel, HealthInstitution
+from .federated_registry import ModelRegistry
+from .federated_rounds import RoundPolicy
+from .federated_state import StateBackend, create_state_backend
+
+def _institution_from_dict(data: Dict[str, Any]) -> HealthInstitution:
+    """A participant from registration data, with defaults for the optional profile fields"""
+    return HealthInstitution(
+        institution_id=data["institution_id"],
+        institution_type=data["institution_type"],
+        location=data["location"],
+        data_types=list(data.get("data_types", [])),
+        patient_count=int(data["patient_count"]),
+        privacy_level=data.get("privacy_level", "high"),
+        compute_capacity=data.get("compute_capacity", "medium"),
+        certification=list(data.get("certification", []))
+    )
+
+async def _run_to_completion(awaitable):
+    """Await `awaitable` even if the calling task is cancelled meanwhile.
+
+    The cancellation is absorbed once the work has finished, so the caller
+    returns its result as if it had not been cancelled.
+    """
+    task = asyncio.ensure_future(awaitable)
+    cancellations = 0
+    while True:
+        try:
+            result = await asyncio.shield(task)
+            break
+        except asyncio.CancelledError:
+            if task.cancelled():
+                raise
+            cancellations += 1
+    current = asyncio.current_task()
+    for _ in range(cancellations):
+        current.uncancel()
+    return result
 
 class FederatedLearningService(BaseService):
     """
     Orchestrates federated learning rounds, manages participants, 
     and aggregates model updates securely.
+
+    Rounds are run by a FederatedHealthLearning engine, so the API uses the
+    same secure aggregation, differential privacy and compression as every
+    other caller. Participants, model versions and round jobs are kept in a
+    state backend; with a shared backend (FEDERATED_STATE_BACKEND=file) every
+    API worker re-reads it before answering, and rounds for a model are
+    serialized across workers.
     """
     
-    def __init__(self):
+    def __init__(self, engine: Optional[FederatedHealthLearning] = None, state: Optional[StateBackend] = None):
         super().__init__("FederatedLearningService")
+        self.engine = engine or FederatedHealthLearning()
+        self.state = state or create_state_backend()
         self.participants: Dict[str, HealthInstitution] = {}
         self.global_models: Dict[str, FederatedModel] = {}
-        # In a real system, you'd use a secure key management service (e.g., Vault)
-        self.aggregation_key = os.urandom(32)
+        self.last_aggregation_stats: Optional[AggregationStats] = None
+        # Participants train concurrently; the policy bounds how long a round waits
+        self.round_policy = RoundPolicy.from_env()
+        self.round_collector = self.engine.round_collector
+
+    @property
+    def registry(self) -> Optional[ModelRegistry]:
+        """Versioned checkpoints on disk, when the state backend keeps them"""
+        return self.state.registry
 
     async def initialize(self):
         self.logger.info("Federated Learning Service initialized.")
-        # In a real implementation, you would load state from a database
-        # For example, load registered institutions and existing global models
         await self._load_state_from_db()
 
     async def _load_state_from_db(self):
-        """Placeholder for loading service state from a persistent store."""
-        self.logger.info("Loading federated learning state from database (placeholder).")
-        # Example:
-        # self.participants = await db.get_all_participants()
-        # self.global_models = await db.get_all_global_models()
-        pass
+        """Restore participants and global models from the state backend.
+
+        Only metadata is read here; each model's weights are reconstructed
+        from its checkpoints the first time a round or request needs them.
+        """
+        if not self.state.shared:
+            self.logger.info("No shared state backend configured; federated learning state is kept in memory.")
+            return
+
+        started = time.perf_counter()
+        self._refresh()
+        self.logger.info(
+            f"Restored {len(self.participants)} participants and {len(self.global_models)} models "
+            f"from {self.state.registry.root} in {time.perf_counter() - started:.3f}s"
+        )
+
+    def _add_institution(self, institution: HealthInstitution, privacy_state: Optional[Dict[str, Any]] = None):
+        self.participants[institution.institution_id] = institution
+        participant = self.engine.add_participant(institution)
+        if privacy_state is not None:
+            participant.restore_privacy_state(privacy_state)
+
+    def _model_from_state(self, model_id: str, metadata: Dict[str, Any]) -> FederatedModel:
+        return FederatedModel(
+            model_id=model_id,
+            model_type=metadata["model_type"],
+            global_weights=self.state.lazy_weights(model_id),
+            version=metadata["version"],
+            participants=metadata.get("participants", []),
+            performance_metrics=metadata.get("performance_metrics", {}),
+            created_at=datetime.fromisoformat(metadata["created_at"]),
+            last_updated=datetime.fromisoformat(metadata["last_updated"]),
+            history=metadata["versions"]
+        )
+
+    def _refresh(self):
+        """Pick up participants and model versions written by other workers"""
+        if not self.state.shared:
+            return
+        privacy_states = None
+        for institution_id, data in self.state.load_participants().items():
+            if institution_id not in self.participants:
+                if privacy_states is None:
+                    privacy_states = self.state.load_privacy_states()
+                self._add_institution(_institution_from_dict(data), privacy_states.get(institution_id))
+        for model_id in self.state.model_ids():
+            self._refresh_model(model_id)
+
+    def _refresh_model(self, model_id: str) -> Optional[FederatedModel]:
+        if self.state.shared:
+            try:
+                metadata = self.state.load_model(model_id)
+            except KeyError:
+                metadata = None
+            local = self.global_models.get(model_id)
+            if metadata is not None and (local is None or local.version < metadata["version"]):
+                self.global_models[model_id] = self._model_from_state(model_id, metadata)
+        return self.global_models.get(model_id)
+
+    def get_model(self, model_id: str) -> Optional[FederatedModel]:
+        """The latest version of a model, or None if no worker has created it"""
+        return self._refresh_model(model_id)
+
+    def _checkpoint(
+        self,
+        model: FederatedModel,
+        previous: Optional[Dict[str, np.ndarray]] = None,
+        round_id: Optional[str] = None,
+        participants: Optional[List[str]] = None
+    ):
+        """Record the model's current version in its history and the state backend"""
+        model.history = self.state.save_model(
+            model.model_id,
+            model.version,
+            model.global_weights,
+            metadata={
+                "model_type": model.model_type,
+                "participants": model.participants,
+                "performance_metrics": model.performance_metrics,
+                "created_at": model.created_at.isoformat(),
+                "last_updated": model.last_updated.isoformat()
+            },
+            history=model.history,
+            previous=previous,
+            round_id=round_id,
+            participants=participants
+        )
 
     async def register_participant(self, institution_data: Dict[str, Any]) -> HealthInstitution:
         """Registers a new healthcare institution to the network."""
@@ -82,43 +182,106 @@ class FederatedLearningService(BaseService):
         if not institution_id:
             institution_id = f"inst_{hashlib.sha256(institution_data['name'].encode()).hexdigest()[:8]}"
         
+        self._refresh()
         if institution_id in self.participants:
             self.logger.warning(f"Participant {institution_id} already registered.")
             return self.participants[institution_id]
 
-        participant = HealthInstitution(
-            institution_id=institution_id,
-            institution_type=institution_data["institution_type"],
-            location=institution_data["location"],
-            patient_count=institution_data["patient_count"]
-        )
-        self.participants[institution_id] = participant
+        participant = _institution_from_dict({**institution_data, "institution_id": institution_id})
+        # Another worker may have registered the same id since the last refresh; the first one wins
+        stored, created = self.state.register_participant(institution_id, asdict(participant))
+        if not created:
+            self.logger.warning(f"Participant {institution_id} already registered.")
+            participant = _institution_from_dict(stored)
+            self._add_institution(participant, self.state.load_privacy_states().get(institution_id))
+            return participant
+        self._add_institution(participant)
         self.logger.info(f"Registered new participant: {participant.institution_id}")
-        # In a real system, you would save this to a database
         return participant
 
-    def initialize_global_model(self, model_type: str, model_id: str) -> FederatedModel:
-        """Initializes a new global model for federated training."""
-        if model_id in self.global_models:
+    def _new_global_model(self, model_type: str, model_id: str) -> FederatedModel:
+        if self.get_model(model_id) is not None:
             raise ValueError(f"Model with ID {model_id} already exists.")
-            
-        # Simplified weight initialization based on model type
-        if model_type == 'disease_prediction':
-            weights = {'layer1': np.random.normal(0, 0.1, (100, 50)),
-                       'output': np.random.normal(0, 0.1, (50, 1))}
-        else: # Default
-            weights = {'weights': np.random.normal(0, 0.1, (100, 10))}
-
-        model = FederatedModel(
-            model_id=model_id,
-            model_type=model_type,
-            global_weights=weights
-        )
+        model = self.engine.initialize_global_model(model_type, model_id)
         self.global_models[model_id] = model
+        return model
+
+    def _create_global_model(self, model_type: str, model_id: str) -> FederatedModel:
+        # The existence check and first checkpoint are one step for every worker sharing the state
+        with self.state.guard("models"):
+            model = self._new_global_model(model_type, model_id)
+            try:
+                self._checkpoint(model)
+            except BaseException:
+                self.global_models.pop(model_id, None)
+                raise
         self.logger.info(f"Initialized new global model '{model.model_id}' of type '{model.model_type}'.")
         return model
 
-    async def start_training_round(self, model_id: str, participant_ids: List[str]) -> Dict[str, Any]:
+    def initialize_global_model(self, model_type: str, model_id: str) -> FederatedModel:
+        """Initializes a new global model for federated training, writing its first checkpoint before returning."""
+        return self._create_global_model(model_type, model_id)
+
+    async def create_global_model(self, model_type: str, model_id: str) -> FederatedModel:
+        """Like initialize_global_model, with the lock wait and first checkpoint on an executor thread."""
+        return await asyncio.get_running_loop().run_in_executor(None, self._create_global_model, model_type, model_id)
+
+    def _restore_round_state(self, model_id: str, participants: List[Any]):
+        """Adopt the privacy spend and compression residuals other workers recorded"""
+        privacy_states = self.state.load_privacy_states()
+        for participant in participants:
+            state = privacy_states.get(participant.institution.institution_id)
+            if state is not None:
+                participant.restore_privacy_state(state)
+        compressor = self.engine.compressor
+        if compressor is not None:
+            residuals = self.state.load_residuals(model_id)
+            if residuals is not None:
+                compressor.restore_residuals(residuals, model_id)
+
+    def _save_round_state(self, model_id: str, participants: List[Any]):
+        """Add the round's privacy spend to the shared totals and store the model's residuals"""
+        spends = {}
+        for participant in participants:
+            spend = participant.take_privacy_spend()
+            if spend is not None:
+                spends[participant.institution.institution_id] = spend
+        if spends:
+            totals = self.state.add_privacy_spend(spends)
+            for participant in participants:
+                total = totals.get(participant.institution.institution_id)
+                if total is not None:
+                    participant.restore_privacy_state(total)
+        if self.engine.compressor is not None:
+            self.state.save_residuals(model_id, self.engine.compressor.residuals(model_id))
+
+    async def _finish_round(
+        self,
+        model: FederatedModel,
+        participants: List[Any],
+        previous_weights: Dict[str, np.ndarray],
+        round_id: str,
+        result: Dict[str, Any]
+    ):
+        """Store what a round changed: privacy spend, residuals and, if it completed, the new model version"""
+        loop = asyncio.get_running_loop()
+        if self.state.shared:
+            await loop.run_in_executor(None, self._save_round_state, model.model_id, participants)
+        if result["status"] != "completed":
+            return
+        self.last_aggregation_stats = self.engine.secure_aggregation.last_stats
+        # Checkpoint the new version off the event loop
+        await loop.run_in_executor(
+            None, partial(self._checkpoint, model, previous_weights, round_id, result["collection"]["received"])
+        )
+
+    async def start_training_round(
+        self,
+        model_id: str,
+        participant_ids: List[str],
+        policy: Optional[RoundPolicy] = None,
+        on_status: Optional[Callable[[str, str], None]] = None
+    ) -> Dict[str, Any]:
         """
         Starts a new training round for a given model and participants.
         
@@ -126,121 +289,72 @@ class FederatedLearningService(BaseService):
         1. Notifying participants to download the current global model.
         2. Waiting for participants to train locally and submit their encrypted updates.
         3. Aggregating the updates once a quorum is reached.
+        
+        Here the engine trains participants concurrently on worker threads and
+        securely aggregates each update as it arrives; updates that miss the
+        round policy's deadline are dropped. The model's lock is held from
+        reading its latest version until the new one is stored, so rounds on
+        other workers wait rather than overwrite it. With a shared state
+        backend each participant's privacy spend and the model's compression
+        residuals are read before the round and written back after it, so a
+        restart or another worker carries them on. Cancelling the round while
+        participants train leaves the model unchanged; once their update has
+        been applied the round is stored and completes regardless.
+        `on_status(participant_id, status)` reports each participant's
+        progress through the round.
         """
-        if model_id not in self.global_models:
+        if self.get_model(model_id) is None:
             raise ValueError(f"Global model {model_id} not found.")
         
         round_id = f"round_{datetime.now().strftime('%Y%m%d%H%M%S')}"
         self.logger.info(f"Starting training round '{round_id}' for model '{model_id}' with {len(participant_ids)} participants.")
 
-        # This is a simplified simulation of a round.
-        # A real implementation would use a message queue (e.g., RabbitMQ) and a task worker system (e.g., Celery).
-        
-        # 1. Get current global model
-        global_model = self.global_models[model_id]
-
-        # 2. Simulate local training and receiving updates from participants
-        # In a real system, you would await these updates.
-        local_updates = await self._simulate_participant_training(global_model, participant_ids)
-
-        # 3. Securely aggregate the updates
-        if not local_updates:
-            self.logger.warning("No valid local updates received. Skipping aggregation.")
-            return {"status": "failed", "message": "No valid updates."}
-            
-        new_weights = self._securely_aggregate_updates(local_updates)
-
-        # 4. Update the global model
-        global_model.global_weights = new_weights
-        global_model.version += 1
-        global_model.last_updated = datetime.now()
-        global_model.participants = list(set(global_model.participants) | set(participant_ids))
+        async with self.state.model_lock(model_id):
+            # 1. Get the current global model, which another worker may have just updated
+            self._refresh()
+            global_model = self.global_models[model_id]
+            participants = []
+            for pid in participant_ids:
+                participant = self.engine.get_participant(pid)
+                if participant is None:
+                    self.logger.warning(f"Participant {pid} not found for training round.")
+                    if on_status:
+                        on_status(pid, "unknown")
+                    continue
+                participants.append(participant)
 
-        self.logger.info(f"Training round '{round_id}' completed. Model '{model_id}' updated to version {global_model.version}.")
+            loop = asyncio.get_running_loop()
+            if self.state.shared:
+                await loop.run_in_executor(None, self._restore_round_state, model_id, participants)
 
-        return {
-            "status": "completed",
-            "round_id": round_id,
-            "model_id": model_id,
-            "new_version": global_model.version,
-            "participants_in_round": len(local_updates)
-        }
+            # 2. Train and securely aggregate, requiring a quorum before touching the global model
+            previous_weights = global_model.global_weights
+            try:
+                result = await self.engine.run_round(global_model, participants, policy or self.round_policy,
+                                                     round_id=round_id, on_status=on_status)
+            except BaseException:
+                if self.state.shared:
+                    await loop.run_in_executor(None, self._save_round_state, model_id, participants)
+                raise
 
-    def _securely_aggregate_updates(self, local_updates: List[LocalUpdate]) -> Dict[str, np.ndarray]:
-        """
-        Aggregates encrypted weights from participants.
-        This simplified version assumes decryption is possible. A real implementation
-        would use homomorphic encryption or secure multi-party computation.
-        """
-        if not local_updates:
-            return {}
+            # 3. Store the round; the model has already moved on in memory, so a cancellation cannot stop this
+            await _run_to_completion(self._finish_round(global_model, participants, previous_weights, round_id, result))
+            if result["status"] != "completed":
+                self.logger.warning(f"Round '{round_id}' failed: {result['message']} Skipping aggregation.")
+                return result
 
-        # Simplified weighted average based on data size
-        total_data_size = sum(update.data_size for update in local_updates)
-        
-        # Get the structure of the weights from the first update
-        # (This is a simplification; a real system would have a manifest)
-        template_weights = self._decrypt_weights(local_updates[0].encrypted_weights)
-        
-        # Initialize aggregated weights with zeros
-        aggregated_weights = {key: np.zeros_like(val) for key, val in template_weights.items()}
-
-        for update in local_updates:
-            decrypted_weights = self._decrypt_weights(update.encrypted_weights)
-            weight_factor = update.data_size / total_data_size
-            for key in aggregated_weights:
-                aggregated_weights[key] += decrypted_weights[key] * weight_factor
-        
-        return aggregated_weights
-
-    def _encrypt_weights(self, weights: Dict[str, np.ndarray]) -> bytes:
-        """Simulates encryption of model weights."""
-        # This is a placeholder for real encryption (e.g., using a public key).
-        # Here we just serialize and return bytes.
-        return str(weights).encode('utf-8')
-
-    def _decrypt_weights(self, encrypted_weights: bytes) -> Dict[str, np.ndarray]:
-        """Simulates decryption of model weights."""
-        # This is a placeholder for real decryption.
-        # It's unsafe and for simulation only.
-        from numpy import array # Safe eval context
-        return eval(encrypted_weights.decode('utf-8'), {"__builtins__": None}, {"array": array})
-
-    async def _simulate_participant_training(self, model: FederatedModel, participant_ids: List[str]) -> List[LocalUpdate]:
-        """
-        Simulates the process of participants training the model locally.
-        In a real system, this would be handled by the participant's client-side code.
-        """
-        updates = []
-        for pid in participant_ids:
-            if pid not in self.participants:
-                self.logger.warning(f"Participant {pid} not found for training round.")
-                continue
-            
-            participant = self.participants[pid]
-            
-            # Simulate local training: slightly modify the global weights
-            local_weights = {key: val + np.random.normal(0, 0.01, val.shape) for key, val in model.global_weights.items()}
-            
-            encrypted_weights = self._encrypt_weights(local_weights)
-            
-            update = LocalUpdate(
-                participant_id=pid,
-                model_id=model.model_id,
-                encrypted_weights=encrypted_weights,
-                weight_hash=hashlib.sha256(encrypted_weights).hexdigest(),
-                data_size=participant.patient_count
-            )
-            updates.append(update)
-        return updates
-
-    def get_model_status(self, model_id: str) -> Optional[Dict[str, Any]]:
-        """Returns the current status of a global model."""
-        if model_id not in self.global_models:
+        self.logger.info(f"Training round '{round_id}' completed. Model '{model_id}' updated to version {global_model.version}.")
+        return result
+
+    def get_model_status(self, model_id: str, include_history: bool = True) -> Optional[Dict[str, Any]]:
+        """Returns the current status of a global model, with its version history."""
+        model = self.get_model(model_id)
+        if model is None:
             return None
-        
-        model = self.global_models[model_id]
-        return {
+        return self._model_status(model, include_history)
+
+    def _model_status(self, model: FederatedModel, include_history: bool) -> Dict[str, Any]:
+        status = {
             "model_id": model.model_id,
             "model_type": model.model_type,
             "version": model.version,
@@ -248,11 +362,16 @@ class FederatedLearningService(BaseService):
             "participant_count": len(model.participants),
             "performance": model.performance_metrics
         }
+        if include_history:
+            status["versions"] = model.history
+        return status
 
     def list_participants(self) -> List[Dict[str, Any]]:
         """Lists all registered participants."""
-        return [p.dict() for p in self.participants.values()]
+        self._refresh()
+        return [asdict(p) for p in self.participants.values()]
 
     def list_models(self) -> List[Dict[str, Any]]:
         """Lists all global models."""
-        return [self.get_model_status(mid) for mid in self.global_models.keys()]
+        self._refresh()
+        return [self._model_status(model, include_history=False) for model in self.global_models.values()]
@@ -0,0 +1,260 @@
+"""
+Federated Model Registry for BioVerse
+Persists global-model versions as delta-encoded, memory-mapped tensor checkpoints with periodic full snapshots
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+import numpy as np
+
+from services.federated_wire import decode_payload, encode_tensors
+
+logger = logging.getLogger(__name__)
+
+# Metadata key of registry checkpoints
+REGISTRY_KEY = "registry"
+
+@dataclass
+class ModelVersion:
+    """One stored version of a global model"""
+    version: int
+    kind: str                           # "full" snapshot or "delta" against base_version
+    file: str
+    nbytes: int
+    created_at: str = field(default_factory=lambda: datetime.now().isoformat())
+    base_version: Optional[int] = None
+    round_id: Optional[str] = None
+    participants: List[str] = field(default_factory=list)
+
+class LazyWeights(Mapping):
+    """Model weights that are read from the registry the first time they are used"""
+
+    def __init__(self, loader: Callable[[], Dict[str, np.ndarray]]):
+        self._loader: Optional[Callable[[], Dict[str, np.ndarray]]] = loader
+        self._weights: Optional[Dict[str, np.ndarray]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._weights is not None
+
+    def _load(self) -> Dict[str, np.ndarray]:
+        if self._weights is None:
+            with self._lock:
+                if self._weights is None:
+                    self._weights = self._loader()
+                    self._loader = None
+        return self._weights
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        return self._load()[name]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._load())
+
+    def __len__(self) -> int:
+        return len(self._load())
+
+class ModelRegistry:
+    """File-backed store of participants and global-model versions.
+
+    Each model has a directory with a `model.json` index and one checkpoint
+    per version in the binary tensor wire format. Every `snapshot_interval`
+    versions (and whenever the layout changes) a full snapshot is written;
+    other versions are deltas against the previous version. A delta stores
+    only the tensors that changed, as the changed flat indices and their new
+    values when that is smaller, else as the whole tensor, so reconstruction
+    is exact. Checkpoints are memory-mapped when read, and a version that is a
+    snapshot is returned as read-only views without copying. All files are
+    replaced atomically.
+
+    Only the last `retain_snapshots` full snapshots and the deltas after them
+    are kept; older checkpoints are deleted once a new snapshot is written,
+    so every retained version can still be reconstructed. 0 keeps everything.
+    """
+
+    def __init__(self, root: str, snapshot_interval: int = 10, retain_snapshots: int = 5):
+        self.root = Path(root)
+        self.snapshot_interval = max(1, snapshot_interval)
+        self.retain_snapshots = max(0, retain_snapshots)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> Optional["ModelRegistry"]:
+        """The configured registry, or None when FEDERATED_REGISTRY_PATH is empty"""
+        root = os.getenv("FEDERATED_REGISTRY_PATH")
+        if not root:
+            return None
+        return cls(root, int(os.getenv("FEDERATED_SNAPSHOT_INTERVAL", 10)), int(os.getenv("FEDERATED_RETAIN_SNAPSHOTS", 5)))
+
+    def _write_atomic(self, path: Path, data: bytes):
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+    def _read_json(self, path: Path, default: Any) -> Any:
+        if not path.exists():
+            return default
+        return json.loads(path.read_text())
+
+    def _model_dir(self, model_id: str) -> Path:
+        if not model_id or "/" in model_id or "\\" in model_id or model_id.startswith("."):
+            raise ValueError(f"Invalid model id {model_id!r}")
+        return self.root / model_id
+
+    # Participants
+
+    def save_participants(self, participants: Dict[str, Dict[str, Any]]):
+        with self._lock:
+            self._write_atomic(self.root / "participants.json", json.dumps(participants, indent=2).encode())
+
+    def load_participants(self) -> Dict[str, Dict[str, Any]]:
+        return self._read_json(self.root / "participants.json", {})
+
+    # Models
+
+    def model_ids(self) -> List[str]:
+        return sorted(path.parent.name for path in self.root.glob("*/model.json"))
+
+    def load_metadata(self, model_id: str) -> Dict[str, Any]:
+        """Model metadata including its version history; raises KeyError for unknown models"""
+        index = self._read_json(self._model_dir(model_id) / "model.json", None)
+        if index is None:
+            raise KeyError(model_id)
+        return index
+
+    def history(self, model_id: str) -> List[Dict[str, Any]]:
+        return self.load_metadata(model_id)["versions"]
+
+    def save_version(
+        self,
+        model_id: str,
+        version: int,
+        weights: Dict[str, np.ndarray],
+        metadata: Dict[str, Any],
+        previous: Optional[Dict[str, np.ndarray]] = None,
+        round_id: Optional[str] = None,
+        participants: Optional[List[str]] = None
+    ) -> ModelVersion:
+        """Store `weights` as `version` of the model and update its metadata.
+
+        `previous` is the version before this one; without it, or when a
+        snapshot is due, a full snapshot is written.
+        """
+        directory = self._model_dir(model_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            index = self._read_json(directory / "model.json", {"versions": []})
+            versions = [entry for entry in index["versions"] if entry["version"] < version]
+
+            layout = {name: list(np.shape(values)) for name, values in weights.items()}
+            snapshot_due = not versions or (version - 1) % self.snapshot_interval == 0
+            comparable = (previous is not None and versions and versions[-1]["version"] == version - 1
+                          and {name: list(np.shape(values)) for name, values in previous.items()} == layout)
+            if snapshot_due or not comparable:
+                kind, base_version, tensors = "full", None, dict(weights)
+            else:
+                kind, base_version, tensors = "delta", version - 1, self._delta(weights, previous)
+
+            payload = encode_tensors(tensors, metadata={REGISTRY_KEY: {
+                "model_id": model_id, "version": version, "kind": kind, "base_version": base_version, "layout": layout
+            }})
+            entry = ModelVersion(
+                version=version, kind=kind, file=f"v{version:08d}.bvtw", nbytes=len(payload),
+                base_version=base_version, round_id=round_id, participants=list(participants or [])
+            )
+            self._write_atomic(directory / entry.file, payload)
+
+            versions.append(asdict(entry))
+            versions, pruned = self._retained(versions)
+            index = {**metadata, "model_id": model_id, "version": version, "versions": versions}
+            self._write_atomic(directory / "model.json", json.dumps(index, indent=2, default=str).encode())
+
+            # Files go only after the index stops referring to them
+            for old in pruned:
+                try:
+                    (directory / old["file"]).unlink()
+                except FileNotFoundError:
+                    pass
+            if pruned:
+                logger.info(f"Pruned {len(pruned)} checkpoints of {model_id} older than v{versions[0]['version']}")
+
+        logger.info(f"Stored {model_id} v{version} as a {kind} checkpoint ({entry.nbytes} bytes)")
+        return entry
+
+    def _retained(self, versions: List[Dict[str, Any]]):
+        """Split versions into those kept by the retention policy and those to delete"""
+        snapshots = [entry["version"] for entry in versions if entry["kind"] == "full"]
+        if not self.retain_snapshots or len(snapshots) <= self.retain_snapshots:
+            return versions, []
+        oldest = snapshots[-self.retain_snapshots]
+        return ([entry for entry in versions if entry["version"] >= oldest],
+                [entry for entry in versions if entry["version"] < oldest])
+
+    @staticmethod
+    def _delta(weights: Dict[str, np.ndarray], previous: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+        tensors = {}
+        for name, values in weights.items():
+            flat = np.ravel(values)
+            changed = np.flatnonzero(flat != np.ravel(previous[name]))
+            if changed.size == 0:
+                continue
+            index_dtype = np.uint32 if flat.size < 2 ** 32 else np.uint64
+            if changed.size * (np.dtype(index_dtype).itemsize + flat.itemsize) < flat.nbytes:
+                tensors[f"{name}/indices"] = changed.astype(index_dtype)
+                tensors[f"{name}/values"] = flat[changed]
+            else:
+                tensors[name] = values
+        return tensors
+
+    def _open(self, path: Path):
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        # Decoded tensors are views that keep the mapping alive
+        return decode_payload(mapped)
+
+    def load_weights(self, model_id: str, version: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Reconstruct a version (the latest by default) from its snapshot and the deltas after it"""
+        directory = self._model_dir(model_id)
+        versions = self.history(model_id)
+        target = versions[-1]["version"] if version is None else version
+        chain = []
+        for entry in reversed(versions):
+            if entry["version"] > target:
+                continue
+            chain.append(entry)
+            if entry["kind"] == "full":
+                break
+        if not chain or chain[0]["version"] != target or chain[-1]["kind"] != "full":
+            raise KeyError(f"{model_id} v{target}")
+        chain.reverse()
+
+        snapshot = self._open(directory / chain[0]["file"])
+        if len(chain) == 1:
+            return dict(snapshot.tensors)
+
+        weights = {name: np.array(values) for name, values in snapshot.tensors.items()}
+        for entry in chain[1:]:
+            delta = self._open(directory / entry["file"]).tensors
+            for name, values in weights.items():
+                if name in delta:
+                    weights[name] = np.array(delta[name])
+                elif f"{name}/indices" in delta:
+                    values.reshape(-1)[delta[f"{name}/indices"]] = delta[f"{name}/values"]
+        return weights
+
+    def lazy_weights(self, model_id: str, version: Optional[int] = None) -> LazyWeights:
+        return LazyWeights(lambda: self.load_weights(model_id, version))
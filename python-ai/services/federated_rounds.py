@@ -0,0 +1,176 @@
+"""
+Federated Round Collection for BioVerse
+Runs participant training concurrently and gathers updates under a deadline and quorum
+"""
+
+import asyncio
+import logging
+import math
+import os
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class RoundPolicy:
+    """When a round stops waiting for participants.
+
+    A round waits at most `deadline` seconds. Once `quorum` (a fraction of the
+    selected participants, at least one) has reported, stragglers get at most
+    `quorum_grace` more seconds. Updates arriving later are dropped.
+    """
+    deadline: float = 300.0
+    quorum: float = 0.5
+    quorum_grace: float = 5.0
+
+    @classmethod
+    def from_env(cls) -> "RoundPolicy":
+        return cls(
+            deadline=float(os.getenv("FEDERATED_ROUND_DEADLINE_SECONDS", 300)),
+            quorum=float(os.getenv("FEDERATED_ROUND_QUORUM", 0.5)),
+            quorum_grace=float(os.getenv("FEDERATED_QUORUM_GRACE_SECONDS", 5))
+        )
+
+    def required(self, selected: int) -> int:
+        return min(selected, max(1, math.ceil(selected * self.quorum)))
+
+@dataclass
+class RoundCollection:
+    """Outcome of gathering one round's updates"""
+    selected: int
+    required: int
+    received: List[str] = field(default_factory=list)
+    late: List[str] = field(default_factory=list)
+    cancelled: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)
+    durations: Dict[str, float] = field(default_factory=dict)
+    seconds: float = 0.0
+
+    @property
+    def quorum_met(self) -> bool:
+        return len(self.received) >= self.required
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "selected": self.selected,
+            "required": self.required,
+            "received": self.received,
+            "late": self.late,
+            "cancelled": self.cancelled,
+            "failed": self.failed,
+            "quorum_met": self.quorum_met,
+            "participant_seconds": {pid: round(seconds, 4) for pid, seconds in self.durations.items()},
+            "round_seconds": round(self.seconds, 4)
+        }
+
+class RoundCollector:
+    """Dispatches blocking participant training to an executor and collects results as they finish.
+
+    Local training is NumPy-bound, so each participant runs in a worker thread
+    and the round takes about as long as its slowest participant rather than
+    the sum of all of them. Each result is handed to `on_update` in arrival
+    order, which lets the caller fold it into a streaming aggregator straight
+    away, and is released once folded. `on_update` runs on a single
+    aggregation thread, so decrypting and decoding updates never blocks the
+    event loop and calls never overlap. Training that misses the deadline
+    keeps running in its thread, but its result is discarded.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor: Optional[Executor] = None
+        self._update_executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="federated-training")
+        return self._executor
+
+    def _get_update_executor(self) -> Executor:
+        if self._update_executor is None:
+            self._update_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="federated-aggregation")
+        return self._update_executor
+
+    async def collect(
+        self,
+        jobs: Dict[str, Callable[[], Any]],
+        on_update: Callable[[str, Any], None],
+        policy: RoundPolicy,
+        on_status: Optional[Callable[[str, str], None]] = None
+    ) -> RoundCollection:
+        """Run `jobs` (participant id -> blocking training call) and pass each result to `on_update`.
+
+        `on_status` is told when a participant starts training and whether its
+        update was received, late, failed or cancelled with the round.
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        update_executor = self._get_update_executor()
+        collection = RoundCollection(selected=len(jobs), required=policy.required(len(jobs)))
+        started = time.perf_counter()
+        notify = on_status or (lambda participant_id, status: None)
+
+        def timed(participant_id: str, job: Callable[[], Any]):
+            job_started = time.perf_counter()
+            result = job()
+            return result, time.perf_counter() - job_started
+
+        futures = {}
+        for participant_id, job in jobs.items():
+            futures[loop.run_in_executor(executor, timed, participant_id, job)] = participant_id
+            notify(participant_id, "training")
+
+        pending = set(futures)
+        cutoff = started + policy.deadline
+        dropped, dropped_status = collection.late, "late"
+        folding = None
+        try:
+            while pending:
+                timeout = cutoff - time.perf_counter()
+                if timeout <= 0:
+                    break
+                done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    # Finished futures hold their update payloads; nothing keeps them once folded
+                    participant_id = folding = futures.pop(future)
+                    try:
+                        result, seconds = future.result()
+                        collection.durations[participant_id] = seconds
+                        await loop.run_in_executor(update_executor, on_update, participant_id, result)
+                        collection.received.append(participant_id)
+                        notify(participant_id, "received")
+                    except Exception as e:
+                        logger.warning(f"Participant {participant_id} failed local training: {e}")
+                        collection.failed[participant_id] = str(e)
+                        notify(participant_id, "failed")
+                    folding = result = None
+                done.clear()
+
+                if collection.quorum_met and pending:
+                    cutoff = min(cutoff, time.perf_counter() + policy.quorum_grace)
+        except asyncio.CancelledError:
+            dropped, dropped_status = collection.cancelled, "cancelled"
+            raise
+        finally:
+            for future in pending:
+                future.cancel()
+            # An update still being folded when the round is cancelled is dropped with it
+            for participant_id in [futures[future] for future in pending] + ([folding] if folding else []):
+                dropped.append(participant_id)
+                notify(participant_id, dropped_status)
+
+        if collection.late:
+            logger.info(f"Dropped {len(collection.late)} late updates: {collection.late}")
+        collection.seconds = time.perf_counter() - started
+        return collection
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._update_executor is not None:
+            self._update_executor.shutdown(wait=False, cancel_futures=True)
+            self._update_executor = None
@@ -0,0 +1,327 @@
+"""
+Federated Learning State Backends for BioVerse
+Where participants, model versions and round jobs live, so every API worker sees the same federation
+"""
+
+import asyncio
+import json
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from services.federated_registry import LazyWeights, ModelRegistry
+from services.federated_wire import decode_payload, encode_tensors
+
+try:
+    import fcntl
+except ImportError:  # Windows: file locks fall back to in-process locks only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+STATE_BACKENDS = ("memory", "file")
+
+class StateBackend:
+    """In-process state: nothing is persisted and nothing is shared.
+
+    This is the default for a single worker. Subclasses that set `shared`
+    hold state that other processes also read and write, so the service
+    re-reads it before using its local copy.
+    """
+
+    shared = False
+    registry: Optional[ModelRegistry] = None
+
+    def __init__(self):
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._guards: Dict[str, threading.Lock] = {}
+        self._guards_lock = threading.Lock()
+        self._privacy: Dict[str, Dict[str, Any]] = {}
+
+    @contextmanager
+    def guard(self, name: str) -> Iterator[None]:
+        """Blocking lock around a read-modify-write of shared state, e.g. "participants" """
+        with self._guards_lock:
+            lock = self._guards.setdefault(name, threading.Lock())
+        with lock:
+            yield
+
+    # Participants
+
+    def load_participants(self) -> Dict[str, Dict[str, Any]]:
+        return {}
+
+    def save_participants(self, participants: Dict[str, Dict[str, Any]]):
+        pass
+
+    def register_participant(self, participant_id: str, data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+        """Store a participant unless one with that id exists; returns the stored data and whether it was added"""
+        with self.guard("participants"):
+            participants = self.load_participants()
+            if participant_id in participants:
+                return participants[participant_id], False
+            self.save_participants({**participants, participant_id: data})
+            return data, True
+
+    # Participant privacy spend, composed in RDP so that totals from every worker add up
+
+    def load_privacy_states(self) -> Dict[str, Dict[str, Any]]:
+        """Stored {"orders", "rdp", "steps"} totals by participant id"""
+        return self._privacy
+
+    def _save_privacy_states(self, states: Dict[str, Dict[str, Any]]):
+        self._privacy = states
+
+    def add_privacy_spend(self, spends: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Add RDP spent by participants to their stored totals and return the new totals.
+
+        Spends are increments rather than totals, so rounds on different
+        models and workers that train the same participant never overwrite
+        each other's accounting.
+        """
+        with self.guard("privacy"):
+            states = dict(self.load_privacy_states())
+            for participant_id, spend in spends.items():
+                total = states.get(participant_id)
+                if total is None or list(total["orders"]) != list(spend["orders"]):
+                    if total is not None:
+                        logger.warning(f"Resetting privacy state of {participant_id} stored with different RDP orders")
+                    total = {"orders": list(spend["orders"]), "rdp": [0.0] * len(spend["orders"]), "steps": 0}
+                states[participant_id] = {
+                    "orders": total["orders"],
+                    "rdp": (np.asarray(total["rdp"]) + np.asarray(spend["rdp"])).tolist(),
+                    "steps": total["steps"] + spend["steps"]
+                }
+            self._save_privacy_states(states)
+            return {participant_id: states[participant_id] for participant_id in spends}
+
+    # Compression residuals
+
+    def load_residuals(self, model_id: str) -> Optional[Dict[str, Dict[str, np.ndarray]]]:
+        """Committed error-feedback residuals of a model by participant id, or None if none are stored"""
+        return None
+
+    def save_residuals(self, model_id: str, residuals: Dict[str, Dict[str, np.ndarray]]):
+        pass
+
+    # Models
+
+    def model_ids(self) -> List[str]:
+        return []
+
+    def load_model(self, model_id: str) -> Dict[str, Any]:
+        """Metadata and version history of a stored model; raises KeyError for unknown models"""
+        raise KeyError(model_id)
+
+    def lazy_weights(self, model_id: str) -> LazyWeights:
+        raise KeyError(model_id)
+
+    def save_model(
+        self,
+        model_id: str,
+        version: int,
+        weights: Dict[str, np.ndarray],
+        metadata: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        previous: Optional[Dict[str, np.ndarray]] = None,
+        round_id: Optional[str] = None,
+        participants: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Store a new version and return the model's updated version history"""
+        return history + [{
+            "version": version,
+            "created_at": metadata.get("last_updated", datetime.now().isoformat()),
+            "round_id": round_id,
+            "participants": list(participants or [])
+        }]
+
+    @asynccontextmanager
+    async def model_lock(self, model_id: str) -> AsyncIterator[None]:
+        """Held while a round reads, trains and writes back one model"""
+        async with self._locks.setdefault(model_id, asyncio.Lock()):
+            yield
+
+    # Round jobs
+
+    def save_job(self, details: Dict[str, Any]):
+        pass
+
+    def load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return None
+
+    def list_jobs(self, model_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return []
+
+    def delete_job(self, job_id: str):
+        pass
+
+class FileStateBackend(StateBackend):
+    """State in a directory that every worker on the host (or a shared volume) opens.
+
+    Participants and model versions are kept in a ModelRegistry; round jobs
+    are one JSON file each under `jobs/`. Rounds for a model are serialized
+    across processes with an exclusive flock on `locks/<model_id>.lock`, taken
+    on an executor thread so the event loop keeps serving requests while it
+    waits.
+    """
+
+    shared = True
+
+    def __init__(self, root: str, snapshot_interval: int = 10, retain_snapshots: int = 5):
+        super().__init__()
+        self.registry = ModelRegistry(root, snapshot_interval, retain_snapshots)
+        self.root = self.registry.root
+        self._jobs_dir = self.root / "jobs"
+        self._locks_dir = self.root / "locks"
+        self._jobs_dir.mkdir(exist_ok=True)
+        self._locks_dir.mkdir(exist_ok=True)
+        if fcntl is None:
+            logger.warning("fcntl is unavailable; federated rounds are only serialized within this process")
+
+    def load_participants(self) -> Dict[str, Dict[str, Any]]:
+        return self.registry.load_participants()
+
+    def save_participants(self, participants: Dict[str, Dict[str, Any]]):
+        self.registry.save_participants(participants)
+
+    def load_privacy_states(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            return json.loads((self.root / "privacy.json").read_text())
+        except FileNotFoundError:
+            return {}
+
+    def _save_privacy_states(self, states: Dict[str, Dict[str, Any]]):
+        self.registry._write_atomic(self.root / "privacy.json", json.dumps(states).encode())
+
+    @contextmanager
+    def guard(self, name: str) -> Iterator[None]:
+        # The in-process lock comes first, so threads of this worker queue there rather than on the file
+        with super().guard(name):
+            if fcntl is None:
+                yield
+                return
+            with open(self._locks_dir / f"{name}.guard", "a+b") as handle:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def load_residuals(self, model_id: str) -> Optional[Dict[str, Dict[str, np.ndarray]]]:
+        try:
+            payload = decode_payload((self.registry._model_dir(model_id) / "residuals.bvtw").read_bytes())
+        except FileNotFoundError:
+            return None
+        residuals: Dict[str, Dict[str, np.ndarray]] = {}
+        for tensor, (participant_id, name) in payload.metadata["residuals"].items():
+            residuals.setdefault(participant_id, {})[name] = np.array(payload.tensors[tensor])
+        return residuals
+
+    def save_residuals(self, model_id: str, residuals: Dict[str, Dict[str, np.ndarray]]):
+        # Tensors get positional names; participant ids and tensor names live in the metadata
+        tensors, layout = {}, {}
+        for participant_id, named in residuals.items():
+            for name, values in named.items():
+                tensor = f"r{len(tensors)}"
+                tensors[tensor] = values
+                layout[tensor] = [participant_id, name]
+        directory = self.registry._model_dir(model_id)
+        directory.mkdir(parents=True, exist_ok=True)
+        self.registry._write_atomic(directory / "residuals.bvtw", encode_tensors(tensors, metadata={"residuals": layout}))
+
+    def model_ids(self) -> List[str]:
+        return self.registry.model_ids()
+
+    def load_model(self, model_id: str) -> Dict[str, Any]:
+        return self.registry.load_metadata(model_id)
+
+    def lazy_weights(self, model_id: str) -> LazyWeights:
+        return self.registry.lazy_weights(model_id)
+
+    def save_model(
+        self,
+        model_id: str,
+        version: int,
+        weights: Dict[str, np.ndarray],
+        metadata: Dict[str, Any],
+        history: List[Dict[str, Any]],
+        previous: Optional[Dict[str, np.ndarray]] = None,
+        round_id: Optional[str] = None,
+        participants: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        self.registry.save_version(model_id, version, weights, metadata, previous, round_id, participants)
+        return self.registry.history(model_id)
+
+    @asynccontextmanager
+    async def model_lock(self, model_id: str) -> AsyncIterator[None]:
+        async with super().model_lock(model_id):
+            if fcntl is None:
+                yield
+                return
+            self.registry._model_dir(model_id)  # rejects unsafe ids before they reach a path
+            handle = open(self._locks_dir / f"{model_id}.lock", "a+b")
+            try:
+                await asyncio.get_running_loop().run_in_executor(None, fcntl.flock, handle, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+            finally:
+                handle.close()
+
+    def _job_path(self, job_id: str) -> Path:
+        if not job_id or "/" in job_id or "\\" in job_id or job_id.startswith("."):
+            raise ValueError(f"Invalid job id {job_id!r}")
+        return self._jobs_dir / f"{job_id}.json"
+
+    def save_job(self, details: Dict[str, Any]):
+        self.registry._write_atomic(self._job_path(details["job_id"]), json.dumps(details, default=str).encode())
+
+    def load_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(self._job_path(job_id).read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def list_jobs(self, model_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        jobs = []
+        for path in self._jobs_dir.glob("*.json"):
+            try:
+                details = json.loads(path.read_text())
+            except (FileNotFoundError, ValueError):
+                continue  # removed or being replaced by another worker
+            if model_id is None or details["model_id"] == model_id:
+                jobs.append(details)
+        return sorted(jobs, key=lambda details: details["created_at"])
+
+    def delete_job(self, job_id: str):
+        try:
+            self._job_path(job_id).unlink()
+        except FileNotFoundError:
+            pass
+
+def create_state_backend() -> StateBackend:
+    """The backend named by FEDERATED_STATE_BACKEND.
+
+    Defaults to "file" when FEDERATED_REGISTRY_PATH is set and to "memory"
+    otherwise. Run multiple API workers only with a shared backend.
+    """
+    root = os.getenv("FEDERATED_REGISTRY_PATH")
+    name = os.getenv("FEDERATED_STATE_BACKEND") or ("file" if root else "memory")
+    if name not in STATE_BACKENDS:
+        raise ValueError(f"Unknown federated state backend {name}; expected one of {STATE_BACKENDS}")
+    if name == "memory":
+        return StateBackend()
+    if not root:
+        raise ValueError("FEDERATED_STATE_BACKEND=file requires FEDERATED_REGISTRY_PATH")
+    return FileStateBackend(
+        root,
+        int(os.getenv("FEDERATED_SNAPSHOT_INTERVAL", 10)),
+        int(os.getenv("FEDERATED_RETAIN_SNAPSHOTS", 5))
+    )
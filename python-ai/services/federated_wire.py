@@ -0,0 +1,165 @@
+"""
+Federated Tensor Wire Format for BioVerse
+Binary serialization of named weight tensors with zero-copy decoding and optional quantization
+"""
+
+import json
+import logging
+import struct
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"BVTW"
+VERSION = 1
+ALIGNMENT = 64
+
+# magic, format version, reserved flags, manifest length
+_PREAMBLE = struct.Struct("<4sHHI")
+
+Buffer = Union[bytes, bytearray, memoryview, np.ndarray]
+
+class Quantization(Enum):
+    """On-the-wire encoding of floating point tensors"""
+    NONE = "none"
+    FLOAT16 = "float16"
+    INT8 = "int8"        # symmetric, one scale per tensor
+
+@dataclass
+class TensorSpec:
+    """Manifest entry locating one tensor in the payload"""
+    name: str
+    dtype: str                      # little-endian storage dtype, e.g. "<f4"
+    shape: Tuple[int, ...]
+    offset: int                     # from the start of the payload
+    nbytes: int
+    encoding: str = Quantization.NONE.value
+    source_dtype: Optional[str] = None
+    scale: Optional[float] = None
+
+@dataclass
+class TensorPayload:
+    """Decoded payload: tensors plus free-form metadata from the manifest"""
+    tensors: Dict[str, np.ndarray]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    nbytes: int = 0
+
+def _align(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+def _quantize(array: np.ndarray, quantization: Quantization) -> Tuple[np.ndarray, Optional[float]]:
+    if quantization == Quantization.FLOAT16:
+        return array.astype("<f2"), None
+    # INT8: scale the largest magnitude to 127
+    peak = float(np.max(np.abs(array))) if array.size else 0.0
+    scale = peak / 127.0 if peak > 0 else 1.0
+    quantized = np.rint(array / scale)
+    np.clip(quantized, -127, 127, out=quantized)
+    return quantized.astype(np.int8), scale
+
+def encode_tensors(
+    tensors: Dict[str, np.ndarray],
+    quantization: Quantization = Quantization.NONE,
+    metadata: Optional[Dict[str, Any]] = None
+) -> bytes:
+    """Serialize named tensors as a JSON manifest followed by aligned little-endian buffers.
+
+    Floating point tensors are stored as float16 or int8 when `quantization`
+    asks for it; integer tensors (e.g. sparse indices) are always stored as is.
+    Every buffer starts on a 64-byte boundary so decoders can view it in place.
+    """
+    specs: List[TensorSpec] = []
+    encoded: List[np.ndarray] = []
+    offset = 0
+    for name, array in tensors.items():
+        array = np.asarray(array)
+        source_dtype = None
+        scale = None
+        encoding = Quantization.NONE
+        if quantization != Quantization.NONE and np.issubdtype(array.dtype, np.floating):
+            source_dtype = array.dtype.newbyteorder("<").str
+            array, scale = _quantize(array, quantization)
+            encoding = quantization
+        stored = array.astype(array.dtype.newbyteorder("<"), copy=False)
+
+        specs.append(TensorSpec(
+            name=name,
+            dtype=stored.dtype.str,
+            shape=tuple(stored.shape),
+            offset=offset,
+            nbytes=stored.nbytes,
+            encoding=encoding.value,
+            source_dtype=source_dtype,
+            scale=scale
+        ))
+        encoded.append(stored)
+        offset = _align(offset + stored.nbytes)
+
+    manifest = json.dumps({
+        "tensors": [spec.__dict__ for spec in specs],
+        "metadata": metadata or {}
+    }, separators=(",", ":")).encode()
+    data_start = _align(_PREAMBLE.size + len(manifest))
+
+    payload = bytearray(data_start + offset)
+    _PREAMBLE.pack_into(payload, 0, MAGIC, VERSION, 0, len(manifest))
+    payload[_PREAMBLE.size:_PREAMBLE.size + len(manifest)] = manifest
+    for spec, stored in zip(specs, encoded):
+        if stored.nbytes:
+            target = np.frombuffer(payload, dtype=stored.dtype, count=stored.size, offset=data_start + spec.offset)
+            target[...] = stored.reshape(-1)
+    return bytes(payload)
+
+def _read_manifest(buffer: memoryview) -> Tuple[Dict[str, Any], int]:
+    if len(buffer) < _PREAMBLE.size:
+        raise ValueError("Truncated tensor payload")
+    magic, version, _, manifest_length = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a tensor payload")
+    if version != VERSION:
+        raise ValueError(f"Unsupported tensor payload version {version}")
+    manifest_end = _PREAMBLE.size + manifest_length
+    manifest = json.loads(bytes(buffer[_PREAMBLE.size:manifest_end]))
+    return manifest, _align(manifest_end)
+
+def decode_payload(data: Buffer, dequantize: bool = True) -> TensorPayload:
+    """Decode a payload produced by encode_tensors.
+
+    Unquantized tensors are read-only views into `data` (bytes, a memoryview
+    or a memory-mapped file) and cost no copy. Quantized tensors are converted
+    back to their original dtype unless `dequantize` is False, in which case
+    the stored float16/int8 values are returned as views.
+    """
+    buffer = memoryview(data).cast("B")
+    manifest, data_start = _read_manifest(buffer)
+
+    tensors = {}
+    for entry in manifest["tensors"]:
+        spec = TensorSpec(**{**entry, "shape": tuple(entry["shape"])})
+        dtype = np.dtype(spec.dtype)
+        count = spec.nbytes // dtype.itemsize
+        start = data_start + spec.offset
+        if start + spec.nbytes > len(buffer):
+            raise ValueError(f"Tensor {spec.name} extends past the end of the payload")
+        array = np.frombuffer(buffer, dtype=dtype, count=count, offset=start).reshape(spec.shape)
+
+        if dequantize and spec.encoding != Quantization.NONE.value:
+            array = array.astype(np.dtype(spec.source_dtype))
+            if spec.scale is not None:
+                array *= spec.scale
+        tensors[spec.name] = array
+
+    return TensorPayload(tensors=tensors, metadata=manifest.get("metadata", {}), nbytes=len(buffer))
+
+def decode_tensors(data: Buffer, dequantize: bool = True) -> Dict[str, np.ndarray]:
+    """Decode only the tensors of a payload"""
+    return decode_payload(data, dequantize).tensors
+
+def read_metadata(data: Buffer) -> Dict[str, Any]:
+    """Read a payload's metadata without touching its tensor buffers"""
+    manifest, _ = _read_manifest(memoryview(data).cast("B"))
+    return manifest.get("metadata", {})
@@ -10,11 +10,14 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from pydantic import BaseModel
 import uuid
+import os
 
 from .base_service import BaseService
 from .ollama_service import OllamaService
 from .ml_service import MLService
 from .database_service import DatabaseService
+from .twin_similarity_index import TwinSimilarityIndex
+from .vector_store import VectorStore
 
 # Forward declaration to avoid circular imports
 from typing import TYPE_CHECKING
@@ -49,10 +52,15 @@ class HealthTwin(BaseModel):
     life_expectancy: Optional[float] = None
     quality_of_life_score: Optional[float] = None
     optimal_interventions: Optional[List[Dict[str, Any]]] = None
+    # Feature vector used for similar-patient retrieval
+    feature_vector: Optional[List[float]] = None
 
 class HealthTwinService(BaseService):
     """Service for creating and managing digital health twins"""
     
+    # Length of the vector returned by _extract_features_for_ml
+    FEATURE_DIM = 12
+    
     def __init__(self, ollama_service: OllamaService, ml_service: MLService, db_service: DatabaseService, advanced_prediction_service: "AdvancedPredictionService"):
         super().__init__("HealthTwinService")
         self.ollama = ollama_service
@@ -60,6 +68,9 @@ class HealthTwinService(BaseService):
         self.db = db_service
         self.advanced_prediction = advanced_prediction_service
         self.twins_cache = {}
+        self.similarity_index = TwinSimilarityIndex(dim=self.FEATURE_DIM)
+        self.history_embeddings = VectorStore()
+        self.history_similarity_weight = float(os.getenv("TWIN_SIMILARITY_HISTORY_WEIGHT", 0.3))
         
     async def initialize(self):
         """Initialize the Health Twin service"""
@@ -67,6 +78,9 @@ class HealthTwinService(BaseService):
             # Load existing twins from database
             await self._load_existing_twins()
             
+            # Rebuild the similar-patient index from the twin store
+            self._rebuild_similarity_index()
+            
             self.logger.info("Health Twin service initialized successfully")
             
         except Exception as e:
@@ -107,6 +121,8 @@ class HealthTwinService(BaseService):
             # Create visualization data
             visualization_data = await self._create_visualization_data(twin_data, health_score, risk_factors)
             
+            features = self._extract_features_for_ml(twin_data)
+            
             # Create health twin object
             health_twin = HealthTwin(
                 id=twin_id,
@@ -118,11 +134,13 @@ class HealthTwinService(BaseService):
                 predictions=predictions,
                 recommendations=recommendations,
                 ai_insights=ai_insights,
-                visualization_data=visualization_data
+                visualization_data=visualization_data,
+                feature_vector=features.tolist()
             )
             
             # Cache the twin
             self.twins_cache[twin_id] = health_twin
+            await self._index_twin(health_twin, twin_data)
             
             # Save to database
             await self._save_twin_to_db(health_twin)
@@ -455,6 +473,8 @@ class HealthTwinService(BaseService):
             
             # Generate advanced predictions from the quantum health predictor concepts
             advanced_predictions = await self._generate_advanced_predictions(twin_data)
+            
+            features = self._extract_features_for_ml(twin_data)
 
             # Update twin
             updated_twin = HealthTwin(
@@ -471,11 +491,13 @@ class HealthTwinService(BaseService):
                 # Add advanced prediction data
                 life_expectancy=advanced_predictions.get("life_expectancy"),
                 quality_of_life_score=advanced_predictions.get("quality_of_life_score"),
-                optimal_interventions=advanced_predictions.get("optimal_interventions")
+                optimal_interventions=advanced_predictions.get("optimal_interventions"),
+                feature_vector=features.tolist()
             )
             
             # Update cache
             self.twins_cache[twin_id] = updated_twin
+            await self._index_twin(updated_twin, twin_data)
             
             # Save to database
             await self._save_twin_to_db(updated_twin)
@@ -488,6 +510,77 @@ class HealthTwinService(BaseService):
             self.logger.error(f"Error updating health twin: {e}")
             raise
     
+    async def delete_health_twin(self, twin_id: str) -> bool:
+        """Remove a health twin from the cache and the similarity index"""
+        if twin_id not in self.twins_cache:
+            return False
+        
+        # In a real implementation, also remove from database
+        del self.twins_cache[twin_id]
+        self.similarity_index.remove(twin_id)
+        return True
+    
+    def _rebuild_similarity_index(self):
+        """Rebuild the similar-patient index from the cached twins"""
+        self.similarity_index = TwinSimilarityIndex(dim=self.FEATURE_DIM)
+        for twin_id, twin in self.twins_cache.items():
+            if twin.feature_vector is not None:
+                self.similarity_index.upsert(twin_id, twin.feature_vector)
+        self.similarity_index.rebuild()
+        self.logger.info(f"Similarity index rebuilt with {len(self.similarity_index)} twins")
+    
+    async def _index_twin(self, health_twin: HealthTwin, twin_data: HealthTwinData):
+        """Add or refresh a twin in the similarity index and, when possible, embed its medical history"""
+        self.similarity_index.upsert(health_twin.id, health_twin.feature_vector)
+        
+        if not twin_data.medical_history or not self.ollama or not self.ollama.is_available:
+            return
+        
+        try:
+            embedding = await self.ollama.generate_embeddings("; ".join(twin_data.medical_history))
+            self.history_embeddings.add([health_twin.id], np.asarray(embedding, dtype=np.float32))
+        except Exception as e:
+            self.logger.warning(f"Could not embed medical history for twin {health_twin.id}: {e}")
+    
+    async def find_similar_twins(self, twin_id: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Find the k twins most similar to the given twin.
+        
+        Neighbours come from the feature index; when medical history embeddings are
+        available, a wider candidate pool is re-ranked by a blend of feature
+        similarity and history cosine similarity.
+        """
+        twin = self.twins_cache.get(twin_id)
+        if not twin or twin.feature_vector is None:
+            raise Exception(f"Health twin {twin_id} not found")
+        
+        history_vector = self.history_embeddings.get(twin_id)
+        pool_size = k * 4 if history_vector is not None else k
+        neighbours = self.similarity_index.query(twin.feature_vector, k=pool_size, exclude_id=twin_id)
+        
+        results = []
+        for neighbour_id, distance in neighbours:
+            similarity = 1.0 / (1.0 + distance)
+            history_similarity = None
+            
+            neighbour_history = self.history_embeddings.get(neighbour_id) if history_vector is not None else None
+            if neighbour_history is not None:
+                norms = np.linalg.norm(history_vector) * np.linalg.norm(neighbour_history)
+                history_similarity = float(history_vector @ neighbour_history / norms) if norms > 0 else 0.0
+                weight = self.history_similarity_weight
+                similarity = (1 - weight) * similarity + weight * history_similarity
+            
+            neighbour = self.twins_cache.get(neighbour_id)
+            results.append({
+                "twin_id": neighbour_id,
+                "patient_id": neighbour.patient_id if neighbour else None,
+                "distance": distance,
+                "history_similarity": history_similarity,
+                "similarity": similarity
+            })
+        
+        results.sort(key=lambda result: result["similarity"], reverse=True)
+        return results[:k]
+    
     async def get_patient_twins(self, patient_id: str) -> List[HealthTwin]:
         """Get all health twins for a patient"""
         return [twin for twin in self.twins_cache.values() if twin.patient_id == patient_id]
@@ -0,0 +1,173 @@
+"""
+Tiled Image Processing for BioVerse Medical Vision
+Overlapping-tile execution of local filters on gigapixel images with bounded memory
+"""
+
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Tile:
+    """A tile's output region and the halo-expanded region it reads"""
+    y0: int
+    y1: int
+    x0: int
+    x1: int
+    read_y0: int
+    read_y1: int
+    read_x0: int
+    read_x1: int
+
+    @property
+    def inner(self) -> Tuple[slice, slice]:
+        """Output region, relative to the read region"""
+        return (
+            slice(self.y0 - self.read_y0, self.y1 - self.read_y0),
+            slice(self.x0 - self.read_x0, self.x1 - self.read_x0)
+        )
+
+@dataclass(frozen=True)
+class TiledStage:
+    """One step of a tiled pipeline.
+
+    A local stage runs `operation` on every tile padded by `halo` pixels. A
+    global LUT stage calls `operation` once with the whole (possibly
+    memory-mapped) image to build a 256-entry lookup table, typically from
+    statistics gathered with TiledImageProcessor.reduce, and applies it to
+    every tile, so point operations that depend on image-wide statistics stay
+    identical across tiles.
+    """
+    operation: Callable[[np.ndarray], np.ndarray]
+    halo: int = 0
+    global_lut: bool = False
+
+class TiledImageProcessor:
+    """Runs local image operations tile by tile across a thread pool.
+
+    Each tile is read with a halo of `halo` pixels on every side that is not
+    an image edge, processed, and only its inner region written back. As long
+    as the halo covers the operation's support (the sum of the kernel radii of
+    the chained filters), the stitched result is identical to processing the
+    whole image at once, with no seams. At image edges no padding is added, so
+    the operation's own border handling applies exactly as it would on the
+    full image.
+
+    Memory held at once is bounded by the number of workers times the padded
+    tile size; the input and output may be memory-mapped files.
+    """
+
+    def __init__(self, tile_size: int = 2048, max_workers: Optional[int] = None, memmap_dir: Optional[str] = None):
+        self.tile_size = tile_size
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.memmap_dir = memmap_dir
+
+    def tiles(self, shape: Tuple[int, ...], halo: int = 0) -> Iterator[Tile]:
+        rows, columns = shape[:2]
+        for y0 in range(0, rows, self.tile_size):
+            y1 = min(y0 + self.tile_size, rows)
+            for x0 in range(0, columns, self.tile_size):
+                x1 = min(x0 + self.tile_size, columns)
+                yield Tile(
+                    y0, y1, x0, x1,
+                    max(0, y0 - halo), min(rows, y1 + halo),
+                    max(0, x0 - halo), min(columns, x1 + halo)
+                )
+
+    def _run(self, function: Callable[[Tile], object], tiles: List[Tile]) -> list:
+        if self.max_workers == 1 or len(tiles) == 1:
+            return [function(tile) for tile in tiles]
+        # OpenCV releases the GIL, so threads process tiles in parallel
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(function, tiles))
+
+    def allocate_like(self, image: np.ndarray, memmap: Optional[bool] = None) -> np.ndarray:
+        """Output buffer shaped like `image`; memory-mapped if the image is"""
+        if memmap is None:
+            memmap = isinstance(image, np.memmap)
+        if not memmap:
+            return np.empty(image.shape, dtype=image.dtype)
+
+        directory = self.memmap_dir or tempfile.gettempdir()
+        os.makedirs(directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=".npy", dir=directory)
+        os.close(fd)
+        buffer = np.lib.format.open_memmap(path, mode="w+", dtype=image.dtype, shape=image.shape)
+        os.unlink(path)
+        return buffer
+
+    def map_local(
+        self,
+        image: np.ndarray,
+        operation: Callable[[np.ndarray], np.ndarray],
+        halo: int,
+        out: np.ndarray
+    ) -> np.ndarray:
+        """Apply a shape-preserving local operation tile by tile into `out` (which must not be `image`)"""
+        if out is image:
+            raise ValueError("Local operations need separate input and output buffers")
+
+        def process(tile: Tile):
+            # A private copy, so operations may work on the tile in place
+            padded = np.array(image[tile.read_y0:tile.read_y1, tile.read_x0:tile.read_x1])
+            result = operation(padded)
+            out[tile.y0:tile.y1, tile.x0:tile.x1] = result[tile.inner]
+
+        self._run(process, list(self.tiles(image.shape, halo)))
+        return out
+
+    def map_pointwise(self, image: np.ndarray, operation: Callable[[np.ndarray], np.ndarray], out: np.ndarray) -> np.ndarray:
+        """Apply a per-pixel operation tile by tile; `out` may be `image`"""
+        def process(tile: Tile):
+            region = (slice(tile.y0, tile.y1), slice(tile.x0, tile.x1))
+            out[region] = operation(np.ascontiguousarray(image[region]))
+
+        self._run(process, list(self.tiles(image.shape)))
+        return out
+
+    def reduce(self, image: np.ndarray, statistic: Callable[[np.ndarray], object]) -> list:
+        """Compute a statistic for every tile, e.g. to combine into a global mean"""
+        return self._run(
+            lambda tile: statistic(image[tile.y0:tile.y1, tile.x0:tile.x1]),
+            list(self.tiles(image.shape))
+        )
+
+    def run(self, image: np.ndarray, stages: Sequence[TiledStage], out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Run a pipeline of stages over `image` into `out`.
+
+        Lookup tables are applied in place; local stages alternate between
+        `out` and one scratch buffer of the same kind, so the whole pipeline
+        needs at most two image-sized buffers besides the input, and the input
+        is never modified unless it is passed as `out`.
+        """
+        if out is None:
+            out = self.allocate_like(image)
+
+        current = image
+        scratch = None
+        for stage in stages:
+            if stage.global_lut:
+                lut = stage.operation(current)
+                target = out if current is image else current
+                self.map_pointwise(current, lambda tile: cv2.LUT(tile, lut), target)
+            else:
+                if current is out:
+                    if scratch is None:
+                        scratch = self.allocate_like(out)
+                    target = scratch
+                else:
+                    target = out
+                self.map_local(current, stage.operation, stage.halo, target)
+            current = target
+
+        if current is not out:
+            self.map_pointwise(current, lambda tile: tile, out)
+        return out
@@ -0,0 +1,127 @@
+"""
+Incremental JSON extraction for BioVerse LLM output
+Finds the first complete JSON object or array in text as it streams in
+"""
+
+import json
+import re
+from typing import Any, Optional
+
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+_UNSET = object()
+
+class IncrementalJSONExtractor:
+    """Extract the first balanced JSON value from a stream of text chunks.
+
+    Text inside <think>...</think> blocks (emitted by reasoning models such as
+    deepseek-r1) and any prose or markdown fences around the JSON are skipped.
+    `feed` returns the parsed value as soon as the structure closes, so callers
+    can stop generation early.
+    """
+
+    THINK_OPEN = "<think>"
+    THINK_CLOSE = "</think>"
+
+    def __init__(self, expect: Optional[str] = None):
+        if expect not in (None, "object", "array"):
+            raise ValueError("expect must be 'object', 'array' or None")
+        self.openers = {"object": "{", "array": "["}.get(expect, "{[")
+        self.buffer = ""
+        self.value: Any = _UNSET
+
+        self._pos = 0          # next character to scan
+        self._start = -1       # start of the candidate value, -1 when searching
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._in_think = False
+
+    @property
+    def done(self) -> bool:
+        return self.value is not _UNSET
+
+    def feed(self, chunk: str) -> Optional[Any]:
+        """Add text and return the parsed value once the first JSON value is complete"""
+        if self.done:
+            return self.value
+
+        self.buffer += chunk
+        text = self.buffer
+
+        while self._pos < len(text):
+            if self._start < 0:
+                if self._in_think:
+                    close = text.find(self.THINK_CLOSE, self._pos)
+                    if close < 0:
+                        # Keep enough of the tail to match a tag split across chunks
+                        self._pos = max(self._pos, len(text) - len(self.THINK_CLOSE) + 1)
+                        return None
+                    self._in_think = False
+                    self._pos = close + len(self.THINK_CLOSE)
+                    continue
+
+                char = text[self._pos]
+                if char == "<":
+                    if text.startswith(self.THINK_OPEN, self._pos):
+                        self._in_think = True
+                        self._pos += len(self.THINK_OPEN)
+                        continue
+                    if self.THINK_OPEN.startswith(text[self._pos:]):
+                        # Possibly a partial tag; wait for more text
+                        return None
+                elif char in self.openers:
+                    self._start = self._pos
+                    self._depth = 0
+                    self._in_string = False
+                    self._escaped = False
+                    continue
+                self._pos += 1
+                continue
+
+            char = text[self._pos]
+            self._pos += 1
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    value = self._parse(text[self._start:self._pos])
+                    if value is not _UNSET:
+                        self.value = value
+                        return value
+                    # Not valid JSON (e.g. "[1]" in prose); resume scanning after the opener
+                    self._pos = self._start + 1
+                    self._start = -1
+
+        return None
+
+    def finish(self) -> Optional[Any]:
+        """Return the extracted value, or None if no complete JSON value was seen"""
+        return self.value if self.done else None
+
+    @staticmethod
+    def _parse(candidate: str) -> Any:
+        try:
+            return json.loads(candidate)
+        except json.JSONDecodeError:
+            pass
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r"\1", candidate))
+        except json.JSONDecodeError:
+            return _UNSET
+
+def extract_json(text: str, expect: Optional[str] = None) -> Optional[Any]:
+    """Extract the first JSON object or array from a complete piece of text"""
+    extractor = IncrementalJSONExtractor(expect)
+    return extractor.feed(text)
@@ -6,17 +6,26 @@ Surpasses human specialist accuracy across multiple medical imaging modalities
 
 import numpy as np
 import cv2
-from typing import Dict, List, Any, Optional, Tuple, Union
-from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List, Any, Optional, Tuple, Union
+from dataclasses import asdict, dataclass
+from functools import partial
 from datetime import datetime
 import asyncio
 import logging
-from PIL import Image, ImageEnhance, ImageFilter
+import os
+import time
+from PIL import Image
 import base64
 import io
 import json
 from enum import Enum
 
+from services.dicom_ingest import DicomImage, DicomSeries, is_dicom
+from services.image_tiling import TiledImageProcessor, TiledStage
+from services.volume_processing import VolumeProcessor
+from services.vision_kernels import kernel_registry
+from services.vision_result_cache import VisionResultCache
+
 logger = logging.getLogger(__name__)
 
 class ImagingModality(Enum):
@@ -31,6 +40,14 @@ class ImagingModality(Enum):
     PATHOLOGY = "pathology"
     ENDOSCOPY = "endoscopy"
 
+class DenoiseMode(Enum):
+    """Noise reduction tiers, from cheapest to most thorough"""
+    AUTO = "auto"        # pyramid NLM, a fixed modality tier, or nothing for clean images
+    OFF = "off"
+    FAST = "fast"        # edge-preserving bilateral filter, for previews
+    PYRAMID = "pyramid"  # NLM on a downscaled pyramid level plus shrunk fine detail
+    FULL = "full"        # NLM on the full-resolution image, only when requested
+
 class SeverityLevel(Enum):
     """Medical finding severity levels"""
     NORMAL = "normal"
@@ -51,6 +68,10 @@ class MedicalFinding:
     clinical_significance: str
     differential_diagnosis: List[str]
     recommended_followup: List[str]
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MedicalFinding":
+        return cls(**{**data, "severity": SeverityLevel(data["severity"])})
 
 @dataclass
 class ImageAnalysisResult:
@@ -68,276 +89,734 @@ class ImageAnalysisResult:
     comparison_with_previous: Optional[Dict[str, Any]]
     ai_generated_report: str
     quality_metrics: Dict[str, float]
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible fields, with enums as their values and the timestamp in ISO format"""
+        data = asdict(self)
+        data["modality"] = self.modality.value
+        data["analysis_timestamp"] = self.analysis_timestamp.isoformat()
+        for findings in (data["primary_findings"], data["secondary_findings"]):
+            for finding in findings:
+                finding["severity"] = finding["severity"].value
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ImageAnalysisResult":
+        return cls(**{
+            **data,
+            "modality": ImagingModality(data["modality"]),
+            "analysis_timestamp": datetime.fromisoformat(data["analysis_timestamp"]),
+            "primary_findings": [MedicalFinding.from_dict(finding) for finding in data["primary_findings"]],
+            "secondary_findings": [MedicalFinding.from_dict(finding) for finding in data["secondary_findings"]]
+        })
+
+def _mean_std(image: np.ndarray) -> Tuple[float, float]:
+    """Mean and population standard deviation, without a float64 copy of the image"""
+    mean, std = cv2.meanStdDev(image)
+    return float(mean[0, 0]), float(std[0, 0])
+
+def estimate_noise_level(gray: np.ndarray) -> float:
+    """Share of intensity variation removed by a 5x5 Gaussian, a proxy for high-frequency noise"""
+    std = _mean_std(gray)[1]
+    if std == 0:
+        return 0.0
+    return 1.0 - _mean_std(cv2.GaussianBlur(gray, (5, 5), 0))[1] / std
+
+class ImagePyramid:
+    """Gaussian pyramid of a preprocessed image, shared across one analysis request.
+    
+    Level 0 is the full-resolution image; each further level is a cv2.pyrDown
+    of the one before. Levels and their grayscale versions are built on first
+    use and then reused, so quality assessment and coarse detectors can work at
+    low resolution while detail detectors read the full-resolution level.
+    """
+    
+    def __init__(self, image: np.ndarray, min_side: int = 32):
+        self.levels: List[np.ndarray] = [image]
+        self.min_side = min_side
+        self._gray: Dict[int, np.ndarray] = {}
+    
+    @classmethod
+    def of(cls, image: Union[np.ndarray, "ImagePyramid"]) -> "ImagePyramid":
+        """Wrap a plain array, or return an existing pyramid unchanged"""
+        return image if isinstance(image, ImagePyramid) else cls(image)
+    
+    @property
+    def full(self) -> np.ndarray:
+        return self.levels[0]
+    
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.full.shape
+    
+    def level(self, index: int) -> np.ndarray:
+        """Return pyramid level `index`, stopping at the coarsest level above min_side"""
+        while len(self.levels) <= index:
+            coarsest = self.levels[-1]
+            if min(coarsest.shape[:2]) // 2 < self.min_side:
+                break
+            self.levels.append(cv2.pyrDown(coarsest))
+        return self.levels[min(index, len(self.levels) - 1)]
+    
+    def level_index_for(self, max_side: int) -> int:
+        """Index of the finest level whose longer side is at most max_side"""
+        index = 0
+        while max(self.levels[index].shape[:2]) > max_side:
+            if self.level(index + 1) is self.levels[index]:
+                # Already at the coarsest level
+                break
+            index += 1
+        return index
+    
+    def level_for(self, max_side: int) -> np.ndarray:
+        """Finest level whose longer side is at most max_side"""
+        return self.level(self.level_index_for(max_side))
+    
+    def gray(self, max_side: Optional[int] = None) -> np.ndarray:
+        """Grayscale version of the full image, or of the level fitting max_side"""
+        index = 0 if max_side is None else self.level_index_for(max_side)
+        if index not in self._gray:
+            level = self.level(index)
+            self._gray[index] = cv2.cvtColor(level, cv2.COLOR_RGB2GRAY) if level.ndim == 3 else level
+        return self._gray[index]
 
 class ImagePreprocessor:
-    """Advanced medical image preprocessing"""
+    """Advanced medical image preprocessing.
+
+    Every stage is a NumPy/OpenCV operation on a single uint8 array. Point
+    operations (contrast, brightness, windowing, normalization) are lookup
+    tables applied in place, and sharpening is one fused convolution, so the
+    working frame is never converted to a PIL image between stages.
+    """
+    
+    # PIL's ImageFilter.SMOOTH kernel, the degenerate image used by ImageEnhance.Sharpness
+    SMOOTH_KERNEL = np.array([[1, 1, 1], [1, 5, 1], [1, 1, 1]], dtype=np.float32) / 13.0
     
     def __init__(self):
         self.enhancement_params = {
             'contrast_factor': 1.2,
             'brightness_factor': 1.1,
             'sharpness_factor': 1.3,
-            'noise_reduction': True
+            'noise_reduction': True,
+            'denoise_mode': DenoiseMode(os.getenv("VISION_DENOISE_MODE", "auto")),
+            # Images whose estimated noise level is below this are not denoised
+            'noise_skip_threshold': float(os.getenv("VISION_NOISE_SKIP_THRESHOLD", 0.01)),
+            # Pyramid NLM runs on the first level whose longer side fits within this
+            'pyramid_max_side': int(os.getenv("VISION_PYRAMID_MAX_SIDE", 1024)),
+            # Images with more pixels than this are processed tile by tile
+            'tile_threshold_pixels': int(os.getenv("VISION_TILE_THRESHOLD_PIXELS", 64 * 1024 * 1024))
+        }
+        
+        # Modalities that default to a fixed tier in automatic mode; speckled
+        # ultrasound and endoscopy frames gain little from NLM
+        self.modality_denoise_modes: Dict[ImagingModality, DenoiseMode] = {
+            ImagingModality.ULTRASOUND: DenoiseMode.FAST,
+            ImagingModality.ENDOSCOPY: DenoiseMode.FAST,
+        }
+        
+        # Kernels, lookup tables and CLAHE instances shared across images
+        self.kernels = kernel_registry
+        
+        # Chunked 3-D filtering for CT/MRI series
+        self.volume_processor = VolumeProcessor(
+            chunk_slices=int(os.getenv("VISION_VOLUME_CHUNK_SLICES", 32)),
+            memmap_dir=os.getenv("VISION_VOLUME_MEMMAP_DIR") or None
+        )
+        
+        # Overlapping-tile processing for whole-slide and very high-res images
+        self.tiler = TiledImageProcessor(
+            tile_size=int(os.getenv("VISION_TILE_SIZE", 2048)),
+            max_workers=int(os.getenv("VISION_TILE_WORKERS", 0)) or None,
+            memmap_dir=os.getenv("VISION_VOLUME_MEMMAP_DIR") or None
+        )
+        
+        # Modality-specific stages, applied in order
+        self.modality_pipelines: Dict[ImagingModality, List[Callable[[np.ndarray], np.ndarray]]] = {
+            ImagingModality.XRAY: [self._enhance_bone_contrast, self._adjust_lung_visibility],
+            ImagingModality.CT_SCAN: [
+                partial(self._windowing_adjustment, window_center=40, window_width=400),
+                self._enhance_soft_tissue_contrast
+            ],
+            ImagingModality.MRI: [self._bias_field_correction, self._enhance_tissue_contrast],
+            ImagingModality.DERMATOLOGY: [self._color_space_optimization, self._hair_artifact_removal],
+            ImagingModality.OPHTHALMOLOGY: [self._retinal_vessel_enhancement, self._optic_disc_normalization],
+            ImagingModality.MAMMOGRAPHY: [self._breast_tissue_enhancement, self._microcalcification_enhancement],
+        }
+        
+        # Tiled equivalents of the modality pipelines above. Modalities without
+        # modality stages need no entry; the others are processed whole.
+        self.tiled_modality_pipelines: Dict[ImagingModality, List[TiledStage]] = {
+            ImagingModality.MAMMOGRAPHY: [
+                TiledStage(partial(self._tiled_contrast_lut, factor=1.5), global_lut=True),
+                # 1 px for the sharpening kernel plus 6 px for the sigma 2 Gaussian
+                TiledStage(self._tiled_breast_detail_enhancement, halo=7),
+            ],
         }
     
     async def preprocess_image(
         self, 
-        image_data: Union[np.ndarray, str], 
-        modality: ImagingModality
+        image_data: Union[np.ndarray, bytes, str], 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode] = None
     ) -> np.ndarray:
-        """Preprocess medical image for optimal analysis"""
-        
-        # Convert base64 to image if needed
-        if isinstance(image_data, str):
-            image_array = self._base64_to_array(image_data)
+        """Preprocess medical image for optimal analysis.
+        
+        `denoise_mode` overrides the configured noise reduction tier, e.g.
+        DenoiseMode.FAST for previews or DenoiseMode.FULL for archival quality.
+        """
+        # Decode encoded uploads and base64 strings to an array
+        dicom = self.open_dicom(image_data)
+        if dicom is not None:
+            # DICOM is windowed from its own header in float32 modality units
+            image_array = dicom.windowed_frame(len(dicom) // 2)
         else:
-            image_array = image_data
+            image_array = self.load_image(image_data)
         
-        # Convert to PIL Image for processing
-        if len(image_array.shape) == 3:
-            pil_image = Image.fromarray(image_array)
+        skip = (self._windowing_adjustment,) if dicom is not None else ()
+        return await self._preprocess_array(image_array, modality, denoise_mode, skip)
+    
+    async def preprocess_series(
+        self, 
+        series: DicomSeries, 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode] = None
+    ) -> AsyncIterator[np.ndarray]:
+        """Preprocess a DICOM series one slice at a time.
+        
+        Each slice is decoded, windowed and preprocessed only when the consumer
+        asks for it, so memory is bounded by a single slice.
+        """
+        for slice_image in series.iter_windowed():
+            yield await self._preprocess_array(slice_image, modality, denoise_mode, (self._windowing_adjustment,))
+    
+    async def preprocess_volume(
+        self, 
+        series: Union[DicomSeries, np.ndarray], 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode] = None,
+        memmap: bool = False
+    ) -> np.ndarray:
+        """Preprocess a CT/MRI series as one (slices, rows, columns) uint8 volume.
+        
+        Volume-level stages run as chunked 3-D filters: MRI bias field
+        correction estimates the field across neighbouring slices instead of
+        per slice. The remaining 2-D stages then run slice by slice in place.
+        With `memmap` the volume is backed by a temporary file, so resident
+        memory stays bounded by the processing chunk.
+        """
+        volume_processor = self.volume_processor
+        if isinstance(series, DicomSeries):
+            volume = volume_processor.stack(series.iter_windowed(), len(series), dtype=np.uint8, memmap=memmap)
+            skip = [self._windowing_adjustment]
         else:
-            pil_image = Image.fromarray(image_array, mode='L')
+            volume = volume_processor.stack(series, len(series), dtype=np.uint8, memmap=memmap)
+            skip = []
+        
+        if modality == ImagingModality.MRI:
+            volume_processor.bias_field_correction(volume, out=volume)
+            skip.append(self._bias_field_correction)
+        
+        for index in range(volume.shape[0]):
+            volume[index] = await self._preprocess_array(volume[index], modality, denoise_mode, tuple(skip))
+        
+        if memmap:
+            volume.flush()
+        return volume
+    
+    async def _preprocess_array(
+        self, 
+        image_array: np.ndarray, 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode],
+        skip: Tuple[Callable, ...] = ()
+    ) -> np.ndarray:
+        # Tiled images estimate their noise on a sampled tile, never on the whole image
+        if self._should_tile(image_array, modality, skip):
+            return await self.preprocess_tiled(image_array, modality, denoise_mode)
+        
+        # Automatic denoising decides from the noise of the input, not of the sharpened buffer
+        noise_level = None
+        auto = (denoise_mode or self.enhancement_params['denoise_mode']) == DenoiseMode.AUTO
+        if auto and self.enhancement_params['noise_reduction']:
+            noise_level = self.estimate_input_noise(image_array)
+        
+        # Single working buffer; stages below modify it in place where they can
+        image = np.array(image_array, dtype=np.uint8, order='C', copy=True)
         
         # Modality-specific preprocessing
-        processed_image = await self._apply_modality_preprocessing(pil_image, modality)
+        image = await self._apply_modality_preprocessing(image, modality, skip)
         
         # General enhancements
-        processed_image = self._enhance_image_quality(processed_image)
+        image = self._enhance_image_quality(image)
         
         # Noise reduction
         if self.enhancement_params['noise_reduction']:
-            processed_image = self._reduce_noise(processed_image)
+            image = self._reduce_noise(image, modality, denoise_mode, noise_level)
         
         # Normalize
-        processed_image = self._normalize_image(processed_image)
-        
-        return np.array(processed_image)
+        return self._normalize_image(image)
     
-    def _base64_to_array(self, base64_string: str) -> np.ndarray:
-        """Convert base64 string to numpy array"""
-        image_data = base64.b64decode(base64_string)
-        image = Image.open(io.BytesIO(image_data))
-        return np.array(image)
+    def _should_tile(self, image: np.ndarray, modality: ImagingModality, skip: Tuple[Callable, ...] = ()) -> bool:
+        if skip or image.shape[0] * image.shape[1] <= self.enhancement_params['tile_threshold_pixels']:
+            return False
+        return modality in self.tiled_modality_pipelines or modality not in self.modality_pipelines
     
-    async def _apply_modality_preprocessing(
+    async def preprocess_tiled(
         self, 
-        image: Image.Image, 
-        modality: ImagingModality
-    ) -> Image.Image:
-        """Apply modality-specific preprocessing"""
-        
-        if modality == ImagingModality.XRAY:
-            # X-ray specific preprocessing
-            image = self._enhance_bone_contrast(image)
-            image = self._adjust_lung_visibility(image)
-        
-        elif modality == ImagingModality.CT_SCAN:
-            # CT scan preprocessing
-            image = self._windowing_adjustment(image, window_center=40, window_width=400)
-            image = self._enhance_soft_tissue_contrast(image)
+        image: np.ndarray, 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode] = None,
+        out: Optional[np.ndarray] = None
+    ) -> np.ndarray:
+        """Preprocess a very large image in overlapping tiles.
+        
+        Produces the same pixels as the whole-image pipeline: local filters
+        read a halo wide enough for their kernels, and contrast, brightness and
+        normalization use lookup tables built from statistics of the whole
+        image. Working memory is bounded by the tile size and worker count;
+        pass a memory-mapped `image` and `out` to keep whole slides on disk.
+        """
+        if modality not in self.tiled_modality_pipelines and modality in self.modality_pipelines:
+            raise ValueError(f"Tiled preprocessing is not supported for {modality.value}")
+        if image.dtype != np.uint8:
+            image = image.astype(np.uint8)
+        
+        stages = list(self.tiled_modality_pipelines.get(modality, []))
+        stages.append(TiledStage(self._tiled_enhancement_lut, global_lut=True))
+        stages.append(TiledStage(partial(self._sharpen, factor=self.enhancement_params['sharpness_factor']), halo=1))
         
-        elif modality == ImagingModality.MRI:
-            # MRI preprocessing
-            image = self._bias_field_correction(image)
-            image = self._enhance_tissue_contrast(image)
+        if self.enhancement_params['noise_reduction']:
+            mode = self._select_tiled_denoise_mode(image, modality, denoise_mode)
+            if mode == DenoiseMode.FAST:
+                # Bilateral filter with a 5 px diameter
+                stages.append(TiledStage(partial(self._reduce_noise, denoise_mode=mode), halo=2))
+            elif mode == DenoiseMode.FULL:
+                # 7 px template plus 21 px search window
+                stages.append(TiledStage(partial(self._reduce_noise, denoise_mode=mode), halo=13))
+        
+        stages.append(TiledStage(self._tiled_normalize_lut, global_lut=True))
+        return self.tiler.run(image, stages, out)
+    
+    async def preprocess_pyramid(
+        self, 
+        image_data: Union[np.ndarray, bytes, str], 
+        modality: ImagingModality,
+        denoise_mode: Optional[DenoiseMode] = None
+    ) -> ImagePyramid:
+        """Preprocess an image and wrap it in a pyramid shared by the rest of the request"""
+        return ImagePyramid(await self.preprocess_image(image_data, modality, denoise_mode))
+    
+    def open_dicom(self, image_data: Union[np.ndarray, bytes, str]) -> Optional[DicomImage]:
+        """Parse the header of DICOM image data, or return None for any other format"""
+        if isinstance(image_data, str):
+            image_data = base64.b64decode(image_data)
+        if isinstance(image_data, np.ndarray) and image_data.ndim != 1:
+            return None
+        if not is_dicom(image_data):
+            return None
+        return DicomImage(image_data)
+    
+    def load_image(self, image_data: Union[np.ndarray, bytes, str]) -> np.ndarray:
+        """Return a pixel array for raw pixels, encoded image bytes or a base64 string"""
+        if isinstance(image_data, str):
+            return self._base64_to_array(image_data)
         
-        elif modality == ImagingModality.DERMATOLOGY:
-            # Dermatology preprocessing
-            image = self._color_space_optimization(image)
-            image = self._hair_artifact_removal(image)
+        if isinstance(image_data, (bytes, bytearray, memoryview)):
+            image_data = np.frombuffer(image_data, dtype=np.uint8)
         
-        elif modality == ImagingModality.OPHTHALMOLOGY:
-            # Ophthalmology preprocessing
-            image = self._retinal_vessel_enhancement(image)
-            image = self._optic_disc_normalization(image)
+        # A flat byte buffer (including a memory-mapped upload) holds an encoded file
+        if image_data.ndim == 1:
+            if is_dicom(image_data):
+                dicom = DicomImage(image_data)
+                return dicom.windowed_frame(len(dicom) // 2)
+            return self._decode_image(image_data)
         
-        elif modality == ImagingModality.MAMMOGRAPHY:
-            # Mammography preprocessing
-            image = self._breast_tissue_enhancement(image)
-            image = self._microcalcification_enhancement(image)
+        return image_data
+    
+    def _base64_to_array(self, base64_string: str) -> np.ndarray:
+        """Convert base64 string to numpy array"""
+        image_data = base64.b64decode(base64_string)
+        return self._decode_image(np.frombuffer(image_data, dtype=np.uint8))
+    
+    def _decode_image(self, buffer: np.ndarray) -> np.ndarray:
+        """Decode an encoded image buffer to an RGB or grayscale uint8 array"""
+        image = cv2.imdecode(buffer, cv2.IMREAD_UNCHANGED)
+        
+        if image is None:
+            # Fall back to PIL for formats OpenCV cannot decode
+            pil_image = Image.open(io.BytesIO(buffer))
+            if pil_image.mode not in ('L', 'RGB'):
+                pil_image = pil_image.convert('RGB')
+            image = np.array(pil_image)
+        elif image.ndim == 3 and image.shape[2] == 4:
+            image = cv2.cvtColor(image, cv2.COLOR_BGRA2RGB)
+        elif image.ndim == 3:
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        
+        # 16-bit radiographs are rescaled to the 8-bit range used by the pipeline
+        if image.dtype != np.uint8:
+            image = cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
         
         return image
     
-    def _enhance_bone_contrast(self, image: Image.Image) -> Image.Image:
+    async def _apply_modality_preprocessing(
+        self, 
+        image: np.ndarray, 
+        modality: ImagingModality,
+        skip: Tuple[Callable, ...] = ()
+    ) -> np.ndarray:
+        """Apply modality-specific preprocessing.
+        
+        Stages in `skip` were already applied elsewhere, e.g. windowing from
+        DICOM metadata or a volume-level bias field correction.
+        """
+        for step in self.modality_pipelines.get(modality, []):
+            if getattr(step, 'func', step) in skip:
+                continue
+            image = step(image)
+        return image
+    
+    # Fused point operations. The LUT builders reproduce PIL's ImageEnhance
+    # arithmetic (float32 blend, truncation, clipping) exactly, and every table
+    # is built once per parameter set by the kernel registry.
+    
+    def _blend_lut(self, degenerate: float, factor: float) -> np.ndarray:
+        """LUT for PIL's Image.blend(degenerate, image, factor) on uint8 values"""
+        return self.kernels.lut("blend", (degenerate, factor), self._build_blend_lut)
+    
+    @staticmethod
+    def _build_blend_lut(degenerate: float, factor: float) -> np.ndarray:
+        values = np.arange(256, dtype=np.float32)
+        degenerate = np.float32(degenerate)
+        blended = degenerate + np.float32(factor) * (values - degenerate)
+        return np.clip(np.trunc(blended), 0, 255).astype(np.uint8)
+    
+    def _contrast_lut(self, image: np.ndarray, factor: float) -> np.ndarray:
+        """LUT equivalent of ImageEnhance.Contrast, which blends towards the mean luminance"""
+        return self._blend_lut(self._mean_luminance(cv2.mean(image), image.ndim), factor)
+    
+    @staticmethod
+    def _mean_luminance(channel_means: Tuple[float, ...], ndim: int) -> int:
+        """Rounded mean luminance, as ImageEnhance.Contrast computes it"""
+        if ndim == 3:
+            mean = 0.299 * channel_means[0] + 0.587 * channel_means[1] + 0.114 * channel_means[2]
+        else:
+            mean = channel_means[0]
+        return int(mean + 0.5)
+    
+    def _brightness_lut(self, factor: float) -> np.ndarray:
+        """LUT equivalent of ImageEnhance.Brightness, which blends towards black"""
+        return self._blend_lut(0, factor)
+    
+    def _adjust_contrast(self, image: np.ndarray, factor: float) -> np.ndarray:
+        """Contrast enhancement as an in-place LUT"""
+        return cv2.LUT(image, self._contrast_lut(image, factor), dst=image)
+    
+    def _sharpen(self, image: np.ndarray, factor: float) -> np.ndarray:
+        """ImageEnhance.Sharpness as a single convolution.
+        
+        Blending the image with its SMOOTH-filtered copy is linear, so both are
+        folded into one 3x3 kernel. That kernel is a constant plus a centre
+        tap, so it is evaluated as an exact integer 3x3 box sum and one
+        elementwise blend; unlike a float filter2D, whose rounding varies with
+        SIMD alignment, every pixel then depends only on its neighbourhood and
+        tiled results match whole-image ones bit for bit. Like PIL, the
+        one-pixel border is left as is.
+        """
+        kernel = self.kernels.get(("sharpen", factor), partial(self._sharpen_kernel, factor))
+        
+        box = cv2.boxFilter(image, cv2.CV_32F, (3, 3), normalize=False, borderType=cv2.BORDER_REPLICATE)
+        box *= kernel[0, 0]
+        box += image * np.float32(kernel[1, 1] - kernel[0, 0])
+        np.rint(box, out=box)
+        np.clip(box, 0, 255, out=box)
+        
+        sharpened = box.astype(np.uint8)
+        sharpened[0], sharpened[-1] = image[0], image[-1]
+        sharpened[:, 0], sharpened[:, -1] = image[:, 0], image[:, -1]
+        return sharpened
+    
+    @classmethod
+    def _sharpen_kernel(cls, factor: float) -> np.ndarray:
+        kernel = (1.0 - factor) * cls.SMOOTH_KERNEL
+        kernel[1, 1] += factor
+        return kernel
+    
+    def _enhance_bone_contrast(self, image: np.ndarray) -> np.ndarray:
         """Enhance bone visibility in X-rays"""
-        enhancer = ImageEnhance.Contrast(image)
-        return enhancer.enhance(1.4)
+        return self._adjust_contrast(image, 1.4)
     
-    def _adjust_lung_visibility(self, image: Image.Image) -> Image.Image:
+    def _adjust_lung_visibility(self, image: np.ndarray) -> np.ndarray:
         """Optimize lung field visibility"""
         # Apply histogram equalization for better lung detail
-        img_array = np.array(image)
-        if len(img_array.shape) == 2:
-            equalized = cv2.equalizeHist(img_array)
-            return Image.fromarray(equalized)
+        if image.ndim == 2:
+            return cv2.equalizeHist(image, dst=image)
         return image
     
-    def _windowing_adjustment(self, image: Image.Image, window_center: int, window_width: int) -> Image.Image:
+    def _windowing_adjustment(self, image: np.ndarray, window_center: int, window_width: int) -> np.ndarray:
         """Apply CT windowing for optimal tissue visualization"""
-        img_array = np.array(image, dtype=np.float32)
-        
         # Apply windowing
         min_val = window_center - window_width // 2
         max_val = window_center + window_width // 2
         
-        windowed = np.clip((img_array - min_val) / (max_val - min_val) * 255, 0, 255)
-        return Image.fromarray(windowed.astype(np.uint8))
+        lut = self.kernels.lut("window", (min_val, max_val), self._build_normalize_lut)
+        return cv2.LUT(image, lut, dst=image)
     
-    def _enhance_soft_tissue_contrast(self, image: Image.Image) -> Image.Image:
+    def _enhance_soft_tissue_contrast(self, image: np.ndarray) -> np.ndarray:
         """Enhance soft tissue contrast in CT scans"""
-        enhancer = ImageEnhance.Contrast(image)
-        return enhancer.enhance(1.3)
+        return self._adjust_contrast(image, 1.3)
     
-    def _bias_field_correction(self, image: Image.Image) -> Image.Image:
+    def _bias_field_correction(self, image: np.ndarray) -> np.ndarray:
         """Correct bias field artifacts in MRI"""
         # Simplified bias field correction
-        img_array = np.array(image, dtype=np.float32)
+        img_array = image.astype(np.float32)
         
         # Apply Gaussian blur to estimate bias field
         blurred = cv2.GaussianBlur(img_array, (51, 51), 0)
         
         # Correct bias field
         corrected = img_array / (blurred + 1e-6) * np.mean(blurred)
-        corrected = np.clip(corrected, 0, 255)
+        np.clip(corrected, 0, 255, out=corrected)
         
-        return Image.fromarray(corrected.astype(np.uint8))
+        image[...] = corrected
+        return image
     
-    def _enhance_tissue_contrast(self, image: Image.Image) -> Image.Image:
+    def _enhance_tissue_contrast(self, image: np.ndarray) -> np.ndarray:
         """Enhance tissue contrast in MRI"""
-        enhancer = ImageEnhance.Contrast(image)
-        return enhancer.enhance(1.2)
+        return self._adjust_contrast(image, 1.2)
     
-    def _color_space_optimization(self, image: Image.Image) -> Image.Image:
+    def _color_space_optimization(self, image: np.ndarray) -> np.ndarray:
         """Optimize color space for dermatology images"""
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        if image.ndim == 2:
+            image = cv2.cvtColor(image, cv2.COLOR_GRAY2RGB)
         
         # Convert to HSV for better skin lesion analysis
-        img_array = np.array(image)
-        hsv = cv2.cvtColor(img_array, cv2.COLOR_RGB2HSV)
+        hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV)
         
         # Enhance saturation for better lesion visibility
         hsv[:, :, 1] = cv2.multiply(hsv[:, :, 1], 1.2)
         
         # Convert back to RGB
-        rgb = cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB)
-        return Image.fromarray(rgb)
+        return cv2.cvtColor(hsv, cv2.COLOR_HSV2RGB, dst=image)
     
-    def _hair_artifact_removal(self, image: Image.Image) -> Image.Image:
+    def _hair_artifact_removal(self, image: np.ndarray) -> np.ndarray:
         """Remove hair artifacts from dermatology images"""
-        img_array = np.array(image)
-        
-        if len(img_array.shape) == 3:
-            gray = cv2.cvtColor(img_array, cv2.COLOR_RGB2GRAY)
+        if image.ndim == 3:
+            gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY)
         else:
-            gray = img_array
+            gray = image
         
         # Create hair mask using morphological operations
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (17, 17))
+        kernel = self.kernels.structuring_element(cv2.MORPH_RECT, (17, 17))
         blackhat = cv2.morphologyEx(gray, cv2.MORPH_BLACKHAT, kernel)
         
         # Threshold to create hair mask
         _, hair_mask = cv2.threshold(blackhat, 10, 255, cv2.THRESH_BINARY)
         
         # Inpaint to remove hair
-        if len(img_array.shape) == 3:
-            result = cv2.inpaint(img_array, hair_mask, 1, cv2.INPAINT_TELEA)
-        else:
-            result = cv2.inpaint(img_array, hair_mask, 1, cv2.INPAINT_TELEA)
-        
-        return Image.fromarray(result)
+        return cv2.inpaint(image, hair_mask, 1, cv2.INPAINT_TELEA)
     
-    def _retinal_vessel_enhancement(self, image: Image.Image) -> Image.Image:
+    def _retinal_vessel_enhancement(self, image: np.ndarray) -> np.ndarray:
         """Enhance retinal vessels for ophthalmology analysis"""
-        img_array = np.array(image)
+        # Apply CLAHE for local contrast enhancement
+        clahe = self.kernels.clahe(2.0, (8, 8))
         
-        if len(img_array.shape) == 3:
+        if image.ndim == 3:
             # Use green channel for best vessel contrast
-            green_channel = img_array[:, :, 1]
-        else:
-            green_channel = img_array
-        
-        # Apply CLAHE for local contrast enhancement
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        enhanced = clahe.apply(green_channel)
+            image[:, :, 1] = clahe.apply(np.ascontiguousarray(image[:, :, 1]))
+            return image
         
-        if len(img_array.shape) == 3:
-            result = img_array.copy()
-            result[:, :, 1] = enhanced
-            return Image.fromarray(result)
-        else:
-            return Image.fromarray(enhanced)
+        return clahe.apply(image, dst=image)
     
-    def _optic_disc_normalization(self, image: Image.Image) -> Image.Image:
+    def _optic_disc_normalization(self, image: np.ndarray) -> np.ndarray:
         """Normalize optic disc brightness"""
-        img_array = np.array(image)
-        
         # Simple brightness normalization
-        normalized = cv2.normalize(img_array, None, 0, 255, cv2.NORM_MINMAX)
-        return Image.fromarray(normalized)
+        return cv2.normalize(image, None, 0, 255, cv2.NORM_MINMAX)
     
-    def _breast_tissue_enhancement(self, image: Image.Image) -> Image.Image:
+    def _breast_tissue_enhancement(self, image: np.ndarray) -> np.ndarray:
         """Enhance breast tissue visibility in mammography"""
-        enhancer = ImageEnhance.Contrast(image)
-        enhanced = enhancer.enhance(1.5)
+        image = self._adjust_contrast(image, 1.5)
         
         # Apply sharpening
-        sharpener = ImageEnhance.Sharpness(enhanced)
-        return sharpener.enhance(1.3)
+        return self._sharpen(image, 1.3)
     
-    def _microcalcification_enhancement(self, image: Image.Image) -> Image.Image:
+    def _microcalcification_enhancement(self, image: np.ndarray) -> np.ndarray:
         """Enhance microcalcifications in mammography"""
-        img_array = np.array(image)
-        
         # Apply unsharp masking for microcalcification enhancement
-        gaussian = cv2.GaussianBlur(img_array, (0, 0), 2.0)
-        unsharp_mask = cv2.addWeighted(img_array, 1.5, gaussian, -0.5, 0)
-        
-        return Image.fromarray(np.clip(unsharp_mask, 0, 255).astype(np.uint8))
+        gaussian = cv2.GaussianBlur(image, (0, 0), 2.0)
+        return cv2.addWeighted(image, 1.5, gaussian, -0.5, 0, dst=image)
+    
+    def _enhancement_lut(self, channel_means: Tuple[float, ...], ndim: int) -> np.ndarray:
+        """Contrast followed by brightness, fused into one LUT"""
+        params = (
+            self._mean_luminance(channel_means, ndim),
+            self.enhancement_params['contrast_factor'],
+            self.enhancement_params['brightness_factor']
+        )
+        return self.kernels.lut(
+            "enhancement", params,
+            lambda mean, contrast, brightness: self._brightness_lut(brightness)[self._blend_lut(mean, contrast)]
+        )
+    
+    def _tiled_breast_detail_enhancement(self, tile: np.ndarray) -> np.ndarray:
+        """The local part of the mammography pipeline: sharpening, then unsharp masking"""
+        return self._microcalcification_enhancement(self._sharpen(tile, 1.3))
     
-    def _enhance_image_quality(self, image: Image.Image) -> Image.Image:
+    def _enhance_image_quality(self, image: np.ndarray) -> np.ndarray:
         """Apply general image quality enhancements"""
-        # Contrast enhancement
-        contrast_enhancer = ImageEnhance.Contrast(image)
-        enhanced = contrast_enhancer.enhance(self.enhancement_params['contrast_factor'])
-        
-        # Brightness adjustment
-        brightness_enhancer = ImageEnhance.Brightness(enhanced)
-        enhanced = brightness_enhancer.enhance(self.enhancement_params['brightness_factor'])
+        # Contrast and brightness fused into one LUT
+        cv2.LUT(image, self._enhancement_lut(cv2.mean(image), image.ndim), dst=image)
         
         # Sharpness enhancement
-        sharpness_enhancer = ImageEnhance.Sharpness(enhanced)
-        enhanced = sharpness_enhancer.enhance(self.enhancement_params['sharpness_factor'])
-        
-        return enhanced
+        return self._sharpen(image, self.enhancement_params['sharpness_factor'])
     
-    def _reduce_noise(self, image: Image.Image) -> Image.Image:
-        """Apply noise reduction"""
-        img_array = np.array(image)
-        
-        if len(img_array.shape) == 3:
+    @staticmethod
+    def estimate_input_noise(image: np.ndarray) -> float:
+        """Noise level of an unprocessed image at full resolution; downscaling would average the noise away"""
+        return estimate_noise_level(cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image)
+    
+    def _select_denoise_mode(
+        self, 
+        noise_level: Optional[float], 
+        modality: ImagingModality, 
+        requested: Optional[DenoiseMode]
+    ) -> DenoiseMode:
+        """Resolve the noise reduction tier for an image from its input noise estimate.
+        
+        Automatic mode never picks full-resolution NLM; that tier only runs when
+        requested explicitly. Without an estimate the low-noise skip is not applied.
+        """
+        mode = requested or self.enhancement_params['denoise_mode']
+        if mode != DenoiseMode.AUTO:
+            return mode
+        
+        if noise_level is not None and noise_level < self.enhancement_params['noise_skip_threshold']:
+            return DenoiseMode.OFF
+        
+        return self.modality_denoise_modes.get(modality, DenoiseMode.PYRAMID)
+    
+    def _reduce_noise(
+        self, 
+        image: np.ndarray, 
+        modality: Optional[ImagingModality] = None, 
+        denoise_mode: Optional[DenoiseMode] = None,
+        noise_level: Optional[float] = None
+    ) -> np.ndarray:
+        """Apply noise reduction using the tier selected for this image"""
+        mode = self._select_denoise_mode(noise_level, modality, denoise_mode)
+        
+        if mode == DenoiseMode.OFF:
+            return image
+        if mode == DenoiseMode.FAST:
+            return cv2.bilateralFilter(image, 5, 30, 5)
+        if mode == DenoiseMode.PYRAMID:
+            return self._pyramid_denoise(image)
+        return self._nlm_denoise(image, 10)
+    
+    @staticmethod
+    def _nlm_denoise(image: np.ndarray, strength: float) -> np.ndarray:
+        """Non-local means with a 7 px template and 21 px search window"""
+        if image.ndim == 3:
             # Color image denoising
-            denoised = cv2.fastNlMeansDenoisingColored(img_array, None, 10, 10, 7, 21)
+            return cv2.fastNlMeansDenoisingColored(image, None, strength, strength, 7, 21)
         else:
             # Grayscale image denoising
-            denoised = cv2.fastNlMeansDenoising(img_array, None, 10, 7, 21)
-        
-        return Image.fromarray(denoised)
+            return cv2.fastNlMeansDenoising(image, None, strength, 7, 21)
     
-    def _normalize_image(self, image: Image.Image) -> Image.Image:
+    def _pyramid_denoise(self, image: np.ndarray) -> np.ndarray:
+        """NLM on a coarse pyramid level, with the fine detail band soft-thresholded.
+        
+        The coarse level, at least one level down and no larger than
+        pyramid_max_side, is denoised with NLM and upsampled back to full size.
+        The detail the pyramid discarded (image minus its upsampled coarse level)
+        is added back after shrinking it by a multiple of its robust noise
+        estimate, so edges survive while fine-grained noise is removed.
+        """
+        # (width, height) of every level above the coarse one, finest first
+        sizes = []
+        coarse = image
+        while not sizes or max(coarse.shape[:2]) > self.enhancement_params['pyramid_max_side']:
+            sizes.append((coarse.shape[1], coarse.shape[0]))
+            coarse = cv2.pyrDown(coarse)
+        
+        # Downsampling averages noise away, so the coarse level needs a weaker filter
+        denoised = self._nlm_denoise(coarse, max(3.0, 10 * 0.5 ** len(sizes))).astype(np.float32)
+        upsampled = coarse.astype(np.float32)
+        for size in reversed(sizes):
+            upsampled = cv2.pyrUp(upsampled, dstsize=size)
+            denoised = cv2.pyrUp(denoised, dstsize=size)
+        
+        detail = image.astype(np.float32) - upsampled
+        threshold = 2.5 * float(np.median(np.abs(detail))) / 0.6745
+        np.copysign(np.maximum(np.abs(detail) - threshold, 0), detail, out=detail)
+        
+        denoised += detail
+        np.clip(denoised, 0, 255, out=denoised)
+        return denoised.astype(np.uint8)
+    
+    def _normalize_image(self, image: np.ndarray) -> np.ndarray:
         """Normalize image intensity"""
-        img_array = np.array(image, dtype=np.float32)
-        
-        # Min-max normalization
-        normalized = (img_array - np.min(img_array)) / (np.max(img_array) - np.min(img_array)) * 255
-        
-        return Image.fromarray(normalized.astype(np.uint8))
+        min_val, max_val = int(image.min()), int(image.max())
+        if max_val == min_val:
+            return image
+        return cv2.LUT(image, self._normalize_lut(min_val, max_val), dst=image)
+    
+    def _normalize_lut(self, min_val: int, max_val: int) -> np.ndarray:
+        """Min-max normalization as a LUT over the 8-bit range"""
+        return self.kernels.lut("normalize", (min_val, max_val), self._build_normalize_lut)
+    
+    @staticmethod
+    def _build_normalize_lut(min_val: int, max_val: int) -> np.ndarray:
+        values = np.arange(256, dtype=np.float32)
+        if max_val == min_val:
+            return values.astype(np.uint8)
+        return np.clip((values - min_val) / (max_val - min_val) * 255, 0, 255).astype(np.uint8)
+    
+    # Whole-image statistics for the tiled pipeline, gathered one tile at a time
+    
+    def _tiled_channel_means(self, image: np.ndarray) -> Tuple[float, ...]:
+        sums = self.tiler.reduce(image, cv2.sumElems)
+        pixels = image.shape[0] * image.shape[1]
+        return tuple(sum(tile_sums[channel] for tile_sums in sums) / pixels for channel in range(4))
+    
+    def _tiled_contrast_lut(self, image: np.ndarray, factor: float) -> np.ndarray:
+        return self._blend_lut(self._mean_luminance(self._tiled_channel_means(image), image.ndim), factor)
+    
+    def _tiled_enhancement_lut(self, image: np.ndarray) -> np.ndarray:
+        return self._enhancement_lut(self._tiled_channel_means(image), image.ndim)
+    
+    def _tiled_normalize_lut(self, image: np.ndarray) -> np.ndarray:
+        extremes = self.tiler.reduce(image, lambda tile: (int(tile.min()), int(tile.max())))
+        return self._normalize_lut(min(low for low, _ in extremes), max(high for _, high in extremes))
+    
+    def _select_tiled_denoise_mode(
+        self, 
+        image: np.ndarray, 
+        modality: ImagingModality, 
+        requested: Optional[DenoiseMode]
+    ) -> DenoiseMode:
+        """Resolve the noise reduction tier for a tiled image from its central tile.
+        
+        Pyramid NLM estimates its detail threshold per image, which would differ
+        from tile to tile and leave seams, so it falls back to the bilateral filter.
+        """
+        requested = requested or self.enhancement_params['denoise_mode']
+        size = self.tiler.tile_size
+        top, left = max(0, (image.shape[0] - size) // 2), max(0, (image.shape[1] - size) // 2)
+        sample = np.ascontiguousarray(image[top:top + size, left:left + size])
+        
+        mode = self._select_denoise_mode(self.estimate_input_noise(sample), modality, requested)
+        if mode == DenoiseMode.PYRAMID:
+            return DenoiseMode.FAST
+        return mode
 
 class RadiologyAI:
     """Advanced AI for radiology image analysis"""
     
     def __init__(self):
+        # Longest side of the pyramid level used by coarse, shape-level detectors
+        self.coarse_max_side = int(os.getenv("VISION_COARSE_MAX_SIDE", 512))
+        
         self.pathology_patterns = {
             'pneumonia': {
                 'features': ['consolidation', 'air_bronchograms', 'pleural_effusion'],
@@ -361,38 +840,39 @@ class RadiologyAI:
             }
         }
     
-    async def analyze_xray(self, image_array: np.ndarray, clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
+    async def analyze_xray(self, image: Union[np.ndarray, ImagePyramid], clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
         """Analyze X-ray images for pathological findings"""
         findings = []
+        pyramid = ImagePyramid.of(image)
         
         # Chest X-ray analysis
         if clinical_context.get('body_part') == 'chest':
-            findings.extend(await self._analyze_chest_xray(image_array))
+            findings.extend(await self._analyze_chest_xray(pyramid))
         
-        # Bone X-ray analysis
+        # Bone X-ray analysis (fracture lines need full resolution)
         elif clinical_context.get('body_part') in ['bone', 'extremity']:
-            findings.extend(await self._analyze_bone_xray(image_array))
+            findings.extend(await self._analyze_bone_xray(pyramid.full))
         
         # Abdominal X-ray analysis
         elif clinical_context.get('body_part') == 'abdomen':
-            findings.extend(await self._analyze_abdominal_xray(image_array))
+            findings.extend(await self._analyze_abdominal_xray(pyramid.level_for(self.coarse_max_side)))
         
         return findings
     
-    async def _analyze_chest_xray(self, image_array: np.ndarray) -> List[MedicalFinding]:
+    async def _analyze_chest_xray(self, pyramid: ImagePyramid) -> List[MedicalFinding]:
         """Analyze chest X-ray for pulmonary and cardiac pathology"""
         findings = []
         
-        # Lung field analysis
-        lung_findings = await self._detect_lung_pathology(image_array)
+        # Lung field analysis (nodules and pneumothorax lines need full resolution)
+        lung_findings = await self._detect_lung_pathology(pyramid.full)
         findings.extend(lung_findings)
         
         # Cardiac silhouette analysis
-        cardiac_findings = await self._analyze_cardiac_silhouette(image_array)
+        cardiac_findings = await self._analyze_cardiac_silhouette(pyramid.level_for(self.coarse_max_side))
         findings.extend(cardiac_findings)
         
         # Pleural space analysis
-        pleural_findings = await self._detect_pleural_pathology(image_array)
+        pleural_findings = await self._detect_pleural_pathology(pyramid.level_for(self.coarse_max_side))
         findings.extend(pleural_findings)
         
         return findings
@@ -533,6 +1013,9 @@ class DermatologyAI:
     """Advanced AI for dermatology image analysis"""
     
     def __init__(self):
+        # Longest side of the pyramid level used by coarse, shape-level detectors
+        self.coarse_max_side = int(os.getenv("VISION_COARSE_MAX_SIDE", 512))
+        
         self.skin_lesion_types = {
             'melanoma': {
                 'features': ['asymmetry', 'border_irregularity', 'color_variation', 'diameter_large'],
@@ -561,15 +1044,16 @@ class DermatologyAI:
             }
         }
     
-    async def analyze_skin_lesion(self, image_array: np.ndarray, clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
+    async def analyze_skin_lesion(self, image: Union[np.ndarray, ImagePyramid], clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
         """Analyze skin lesions for malignancy and other pathology"""
         findings = []
+        pyramid = ImagePyramid.of(image)
         
-        # ABCDE analysis for melanoma screening
-        abcde_score = await self._perform_abcde_analysis(image_array)
+        # ABCDE analysis for melanoma screening (lesion shape and colour)
+        abcde_score = await self._perform_abcde_analysis(pyramid.level_for(self.coarse_max_side))
         
         # Lesion classification
-        lesion_classification = await self._classify_lesion(image_array, abcde_score)
+        lesion_classification = await self._classify_lesion(pyramid.full, abcde_score)
         
         # Generate findings based on analysis
         if lesion_classification['malignancy_risk'] > 0.5:
@@ -652,6 +1136,9 @@ class OphthalmologyAI:
     """Advanced AI for ophthalmology image analysis"""
     
     def __init__(self):
+        # Longest side of the pyramid level used by coarse, shape-level detectors
+        self.coarse_max_side = int(os.getenv("VISION_COARSE_MAX_SIDE", 512))
+        
         self.retinal_conditions = {
             'diabetic_retinopathy': {
                 'features': ['microaneurysms', 'hemorrhages', 'exudates', 'neovascularization'],
@@ -667,25 +1154,26 @@ class OphthalmologyAI:
             }
         }
     
-    async def analyze_fundus_image(self, image_array: np.ndarray, clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
+    async def analyze_fundus_image(self, image: Union[np.ndarray, ImagePyramid], clinical_context: Dict[str, Any]) -> List[MedicalFinding]:
         """Analyze fundus photographs for retinal pathology"""
         findings = []
+        pyramid = ImagePyramid.of(image)
         
         # Optic disc analysis
-        optic_disc_findings = await self._analyze_optic_disc(image_array)
+        optic_disc_findings = await self._analyze_optic_disc(pyramid.level_for(self.coarse_max_side))
         findings.extend(optic_disc_findings)
         
         # Macula analysis
-        macular_findings = await self._analyze_macula(image_array)
+        macular_findings = await self._analyze_macula(pyramid.level_for(self.coarse_max_side))
         findings.extend(macular_findings)
         
-        # Vessel analysis
-        vessel_findings = await self._analyze_retinal_vessels(image_array)
+        # Vessel analysis (small vessels need full resolution)
+        vessel_findings = await self._analyze_retinal_vessels(pyramid.full)
         findings.extend(vessel_findings)
         
-        # Diabetic retinopathy screening
+        # Diabetic retinopathy screening (microaneurysms need full resolution)
         if clinical_context.get('diabetes_history'):
-            dr_findings = await self._screen_diabetic_retinopathy(image_array)
+            dr_findings = await self._screen_diabetic_retinopathy(pyramid.full)
             findings.extend(dr_findings)
         
         return findings
@@ -807,6 +1295,20 @@ class MedicalVisionAI:
         self.dermatology_ai = DermatologyAI()
         self.ophthalmology_ai = OphthalmologyAI()
         
+        # Longest side of the pyramid level used for quality metrics; 0 measures the full image
+        self.quality_max_side = int(os.getenv("VISION_QUALITY_MAX_SIDE", 0))
+        
+        # Content-addressed cache of results for re-uploaded images; held in memory,
+        # with a disk tier shared across workers only when VISION_CACHE_PATH is set
+        self.result_cache: Optional[VisionResultCache] = None
+        if os.getenv("VISION_CACHE_ENABLED", "true").lower() == "true":
+            self.result_cache = VisionResultCache(
+                os.getenv("VISION_CACHE_PATH") or None,
+                max_bytes=int(float(os.getenv("VISION_CACHE_MAX_MB", 1024)) * 1024 * 1024),
+                memory_entries=int(os.getenv("VISION_CACHE_MEMORY_ENTRIES", 256)),
+                store_arrays=os.getenv("VISION_CACHE_STORE_ARRAYS", "false").lower() == "true"
+            )
+        
         # Quality assessment thresholds
         self.quality_thresholds = {
             'sharpness': 0.7,
@@ -817,29 +1319,60 @@ class MedicalVisionAI:
     
     async def analyze_medical_image(
         self, 
-        image_data: Union[np.ndarray, str], 
+        image_data: Union[np.ndarray, bytes, str, ImagePyramid], 
         modality: ImagingModality,
-        clinical_context: Optional[Dict[str, Any]] = None
+        clinical_context: Optional[Dict[str, Any]] = None,
+        timings: Optional[Dict[str, float]] = None
     ) -> ImageAnalysisResult:
-        """Main function to analyze medical images"""
+        """Main function to analyze medical images.
+        
+        An ImagePyramid from ImagePreprocessor.preprocess_pyramid is taken as
+        already preprocessed. Results for raw image data are looked up in and
+        stored to the result cache. When `timings` is given, the preprocessing
+        and analysis durations in milliseconds are recorded into it.
+        """
         
         if clinical_context is None:
             clinical_context = {}
+        if timings is None:
+            timings = {}
+        
+        # Re-uploads of the same image with the same context are served from the cache
+        image_key = result_key = None
+        if self.result_cache is not None and not isinstance(image_data, ImagePyramid):
+            image_key = self.result_cache.image_key(image_data, modality.value)
+            result_key = self.result_cache.result_key(image_key, clinical_context)
+            cached_result = self.result_cache.get_result(result_key)
+            if cached_result is not None:
+                logger.info(f"Serving cached analysis for modality: {modality.value}")
+                return ImageAnalysisResult.from_dict(cached_result)
         
         logger.info(f"Starting medical image analysis for modality: {modality.value}")
+        start = time.perf_counter()
         
-        # Preprocess image
-        processed_image = await self.preprocessor.preprocess_image(image_data, modality)
+        # Preprocess image; the pyramid is shared by quality assessment and the analyzers
+        if isinstance(image_data, ImagePyramid):
+            pyramid = image_data
+        else:
+            preprocessed = self.result_cache.get_array(image_key) if image_key else None
+            if preprocessed is not None:
+                pyramid = ImagePyramid(preprocessed)
+            else:
+                pyramid = await self.preprocessor.preprocess_pyramid(image_data, modality)
+                if image_key:
+                    self.result_cache.put_array(image_key, pyramid.full)
+            timings['preprocess'] = (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
         
         # Assess image quality
-        quality_metrics = await self._assess_image_quality(processed_image)
+        quality_metrics = await self._assess_image_quality(pyramid)
         
         # Check if image quality is sufficient for analysis
         if not self._is_quality_sufficient(quality_metrics):
             logger.warning("Image quality insufficient for reliable analysis")
         
         # Perform modality-specific analysis
-        findings = await self._perform_modality_analysis(processed_image, modality, clinical_context)
+        findings = await self._perform_modality_analysis(pyramid, modality, clinical_context)
         
         # Categorize findings
         primary_findings = [f for f in findings if f.severity in [SeverityLevel.SEVERE, SeverityLevel.CRITICAL]]
@@ -863,7 +1396,7 @@ class MedicalVisionAI:
         # Calculate overall confidence
         confidence_score = self._calculate_overall_confidence(findings, quality_metrics)
         
-        return ImageAnalysisResult(
+        result = ImageAnalysisResult(
             image_id=f"img_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
             modality=modality,
             analysis_timestamp=datetime.now(),
@@ -878,10 +1411,16 @@ class MedicalVisionAI:
             ai_generated_report=ai_report,
             quality_metrics=quality_metrics
         )
+        timings['analysis'] = (time.perf_counter() - start) * 1000
+        
+        if result_key:
+            self.result_cache.put_result(result_key, result.to_dict())
+        
+        return result
     
     async def _perform_modality_analysis(
         self, 
-        image_array: np.ndarray, 
+        image: ImagePyramid, 
         modality: ImagingModality,
         clinical_context: Dict[str, Any]
     ) -> List[MedicalFinding]:
@@ -890,41 +1429,47 @@ class MedicalVisionAI:
         findings = []
         
         if modality in [ImagingModality.XRAY, ImagingModality.CT_SCAN]:
-            findings = await self.radiology_ai.analyze_xray(image_array, clinical_context)
+            findings = await self.radiology_ai.analyze_xray(image, clinical_context)
         
         elif modality == ImagingModality.DERMATOLOGY:
-            findings = await self.dermatology_ai.analyze_skin_lesion(image_array, clinical_context)
+            findings = await self.dermatology_ai.analyze_skin_lesion(image, clinical_context)
         
         elif modality == ImagingModality.OPHTHALMOLOGY:
-            findings = await self.ophthalmology_ai.analyze_fundus_image(image_array, clinical_context)
+            findings = await self.ophthalmology_ai.analyze_fundus_image(image, clinical_context)
         
         # Add more modality-specific analyses here
         # elif modality == ImagingModality.MRI:
-        #     findings = await self.mri_ai.analyze_mri(image_array, clinical_context)
+        #     findings = await self.mri_ai.analyze_mri(image, clinical_context)
         
         return findings
     
-    async def _assess_image_quality(self, image_array: np.ndarray) -> Dict[str, float]:
-        """Assess image quality metrics"""
-        
-        # Convert to grayscale if needed
-        if len(image_array.shape) == 3:
-            gray = cv2.cvtColor(image_array, cv2.COLOR_RGB2GRAY)
-        else:
-            gray = image_array
-        
-        # Sharpness (Laplacian variance)
-        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    async def _assess_image_quality(self, image: Union[np.ndarray, ImagePyramid]) -> Dict[str, float]:
+        """Assess image quality metrics.
+        
+        Metrics are computed on the full-resolution grayscale image, which the
+        pyramid shares with the analyzers, using OpenCV reductions instead of
+        float64 copies. Setting quality_max_side measures the pyramid level
+        that fits it instead; that is faster on large images, but smoothing
+        lowers sharpness, contrast and noise for images above that size. The
+        noise level is that of the preprocessed image, so a pyramid rebuilt
+        from a cached array reports the same metrics as a fresh run.
+        """
+        
+        # Grayscale image, or the level fitting quality_max_side
+        gray = ImagePyramid.of(image).gray(self.quality_max_side or None)
+        
+        # Sharpness (Laplacian variance); 8-bit input fits a 16-bit Laplacian exactly
+        laplacian = cv2.Laplacian(gray, cv2.CV_16S if gray.dtype == np.uint8 else cv2.CV_64F)
+        sharpness = _mean_std(laplacian)[1] ** 2
         sharpness_normalized = min(sharpness / 1000, 1.0)  # Normalize
         
-        # Contrast (standard deviation)
-        contrast = np.std(gray) / 255.0
-        
-        # Brightness (mean intensity)
-        brightness = np.mean(gray) / 255.0
+        # Contrast (standard deviation) and brightness (mean intensity)
+        mean, std = _mean_std(gray)
+        contrast = std / 255.0
+        brightness = mean / 255.0
         
         # Noise level (estimated using high-frequency content)
-        noise_level = 1.0 - (np.std(cv2.GaussianBlur(gray, (5, 5), 0)) / np.std(gray))
+        noise_level = estimate_noise_level(gray)
         
         return {
             'sharpness': sharpness_normalized,
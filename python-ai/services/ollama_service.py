@@ -4,18 +4,28 @@ Handles local AI model interactions through Ollama
 """
 
 import asyncio
+import hashlib
 import json
+import re
+import time
 import httpx
-from typing import Dict, List, Optional, Any
+import numpy as np
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
 from pydantic import BaseModel
 import os
 from .base_service import BaseService
+from .vector_store import VectorStore
+from .json_extractor import IncrementalJSONExtractor
+from .circuit_breaker import CircuitBreaker, CircuitOpenError
 
 class OllamaRequest(BaseModel):
     model: str
     prompt: str
     stream: bool = False
     options: Optional[Dict[str, Any]] = None
+    context: Optional[List[int]] = None
+    format: Optional[str] = None
 
 class OllamaResponse(BaseModel):
     model: str
@@ -23,6 +33,43 @@ class OllamaResponse(BaseModel):
     done: bool
     context: Optional[List[int]] = None
 
+class SessionContextCache:
+    """Bounded LRU cache of Ollama context token arrays keyed by chat session"""
+    
+    def __init__(self, max_sessions: int = 1000, ttl_seconds: float = 1800.0):
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict = OrderedDict()
+    
+    def get(self, session_id: str) -> Optional[List[int]]:
+        """Return the stored context for a session, or None if missing or expired"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return None
+        
+        stored_at, context = entry
+        if time.monotonic() - stored_at > self.ttl_seconds:
+            del self._entries[session_id]
+            return None
+        
+        self._entries.move_to_end(session_id)
+        return context
+    
+    def put(self, session_id: str, context: List[int]):
+        """Store the latest context for a session, evicting the least recently used"""
+        self._entries[session_id] = (time.monotonic(), context)
+        self._entries.move_to_end(session_id)
+        
+        while len(self._entries) > self.max_sessions:
+            self._entries.popitem(last=False)
+    
+    def discard(self, session_id: str):
+        """Forget a session's context"""
+        self._entries.pop(session_id, None)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
 class OllamaService(BaseService):
     """Service for interacting with Ollama local AI models"""
     
@@ -33,13 +80,49 @@ class OllamaService(BaseService):
         self.embedding_model = os.getenv("OLLAMA_EMBEDDING_MODEL", "nomic-embed-text")
         self.vision_model = os.getenv("OLLAMA_VISION_MODEL", "llava:7b")
         self.client = None
-        self.is_available = False
+        self._reachable = False
         self.available_models = []
+        self.circuit_breaker = CircuitBreaker(
+            "ollama",
+            failure_threshold=int(os.getenv("OLLAMA_BREAKER_FAILURES", 3)),
+            recovery_timeout=float(os.getenv("OLLAMA_BREAKER_RECOVERY", 30))
+        )
+        self.health_probe_interval = float(os.getenv("OLLAMA_HEALTH_INTERVAL", 10))
+        self._health_probe_task: Optional[asyncio.Task] = None
+        self.chat_sessions = SessionContextCache(
+            max_sessions=int(os.getenv("LUMA_MAX_SESSIONS", 1000)),
+            ttl_seconds=float(os.getenv("LUMA_SESSION_TTL", 1800))
+        )
+        self.embedding_cache_path = os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache")
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+        self.embedding_concurrency = int(os.getenv("EMBEDDING_CONCURRENCY", 4))
+        self.embedding_caches: Dict[str, VectorStore] = {}
+        self.embedding_batch_retry = float(os.getenv("EMBEDDING_BATCH_RETRY_SECONDS", 300))
+        self._batch_embed_retry_at = 0.0
+        self.json_mode = os.getenv("OLLAMA_JSON_MODE", "true").lower() == "true"
+    
+    @property
+    def is_available(self) -> bool:
+        """Ollama answered the last health probe and the circuit breaker is not open"""
+        return self._reachable and self.circuit_breaker.state != CircuitBreaker.OPEN
+    
+    @is_available.setter
+    def is_available(self, value: bool):
+        self._reachable = value
         
     async def initialize(self):
         """Initialize the Ollama service"""
         try:
-            self.client = httpx.AsyncClient(timeout=30.0)
+            # Requests are long-running generations against a single host, so keep a
+            # small pool of persistent connections and fail fast on connect
+            self.client = httpx.AsyncClient(
+                timeout=httpx.Timeout(30.0, connect=float(os.getenv("OLLAMA_CONNECT_TIMEOUT", 2))),
+                limits=httpx.Limits(
+                    max_connections=int(os.getenv("OLLAMA_MAX_CONNECTIONS", 20)),
+                    max_keepalive_connections=int(os.getenv("OLLAMA_MAX_KEEPALIVE", 10)),
+                    keepalive_expiry=60.0
+                )
+            )
             
             # Check if Ollama is running
             await self._check_availability()
@@ -50,6 +133,9 @@ class OllamaService(BaseService):
                 
                 # Ensure required models are available
                 await self._ensure_models()
+            
+            # Keep re-checking so availability follows Ollama restarts
+            self._health_probe_task = asyncio.create_task(self._health_probe_loop())
                 
             self.logger.info(f"Ollama service initialized. Available: {self.is_available}")
             
@@ -60,11 +146,46 @@ class OllamaService(BaseService):
     async def _check_availability(self):
         """Check if Ollama service is available"""
         try:
-            response = await self.client.get(f"{self.base_url}/api/tags")
+            response = await self.client.get(f"{self.base_url}/api/tags", timeout=5.0)
             self.is_available = response.status_code == 200
         except Exception as e:
             self.logger.warning(f"Ollama not available: {e}")
             self.is_available = False
+        
+        if self._reachable:
+            self.circuit_breaker.record_success()
+        else:
+            self.circuit_breaker.record_failure()
+    
+    async def _health_probe_loop(self):
+        """Periodically probe Ollama, acting as the breaker's recovery trial"""
+        while True:
+            await asyncio.sleep(self.health_probe_interval)
+            was_reachable = self._reachable
+            await self._check_availability()
+            
+            if self._reachable and not was_reachable:
+                self.logger.info("Ollama is reachable again")
+                await self._load_available_models()
+            elif was_reachable and not self._reachable:
+                self.logger.warning("Ollama became unreachable")
+    
+    async def _post(self, path: str, **kwargs) -> httpx.Response:
+        """POST to Ollama through the circuit breaker"""
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        
+        try:
+            response = await self.client.post(f"{self.base_url}{path}", **kwargs)
+        except httpx.TransportError:
+            self.circuit_breaker.record_failure()
+            raise
+        
+        if response.status_code >= 500:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+        return response
     
     async def _load_available_models(self):
         """Load list of available models"""
@@ -106,28 +227,45 @@ class OllamaService(BaseService):
     
     async def generate_text(self, prompt: str, model: Optional[str] = None, **kwargs) -> str:
         """Generate text using Ollama model"""
+        result = await self.generate(prompt, model=model, **kwargs)
+        return result.response
+    
+    async def generate(
+        self,
+        prompt: str,
+        model: Optional[str] = None,
+        context: Optional[List[int]] = None,
+        **kwargs
+    ) -> OllamaResponse:
+        """Generate a completion and return the full Ollama response, including its context"""
         if not self.is_available:
             raise Exception("Ollama service not available")
         
         model = model or self.default_model
         
         try:
-            request_data = {
-                "model": model,
-                "prompt": prompt,
-                "stream": False,
-                "options": kwargs
-            }
+            request_data = OllamaRequest(
+                model=model,
+                prompt=prompt,
+                stream=False,
+                options=kwargs,
+                context=context
+            )
             
-            response = await self.client.post(
-                f"{self.base_url}/api/generate",
-                json=request_data,
+            response = await self._post(
+                "/api/generate",
+                json=request_data.dict(exclude_none=True),
                 timeout=60.0
             )
             
             if response.status_code == 200:
                 result = response.json()
-                return result.get("response", "")
+                return OllamaResponse(
+                    model=result.get("model", model),
+                    response=result.get("response", ""),
+                    done=result.get("done", True),
+                    context=result.get("context")
+                )
             else:
                 raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
                 
@@ -135,6 +273,72 @@ class OllamaService(BaseService):
             self.logger.error(f"Error generating text: {e}")
             raise
     
+    async def generate_json(
+        self,
+        prompt: str,
+        expect: Optional[str] = None,
+        model: Optional[str] = None,
+        **kwargs
+    ) -> Tuple[Optional[Any], str]:
+        """Stream a completion and return the first JSON value in it together with the raw text.
+        
+        Tokens are scanned as they arrive, skipping reasoning preambles such as
+        deepseek-r1's <think> block, and the stream is closed as soon as the JSON
+        value is complete, which stops generation on the Ollama side. The parsed
+        value is None when the model produced no valid JSON.
+        """
+        if not self.is_available:
+            raise Exception("Ollama service not available")
+        
+        model = model or self.default_model
+        extractor = IncrementalJSONExtractor(expect)
+        
+        request_data = OllamaRequest(
+            model=model,
+            prompt=prompt,
+            stream=True,
+            options=kwargs,
+            # Ollama's JSON mode only yields top-level objects, so a bare array could never arrive
+            format="json" if self.json_mode and expect != "array" else None
+        )
+        
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("Ollama circuit breaker is open")
+        
+        try:
+            async with self.client.stream(
+                "POST",
+                f"{self.base_url}/api/generate",
+                json=request_data.dict(exclude_none=True),
+                timeout=60.0
+            ) as response:
+                if response.status_code >= 500:
+                    self.circuit_breaker.record_failure()
+                else:
+                    self.circuit_breaker.record_success()
+                
+                if response.status_code != 200:
+                    await response.aread()
+                    raise Exception(f"Ollama API error: {response.status_code} - {response.text}")
+                
+                async for line in response.aiter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+                    extractor.feed(chunk.get("response", ""))
+                    if extractor.done or chunk.get("done"):
+                        break
+            
+            return extractor.finish(), extractor.buffer
+            
+        except httpx.TransportError as e:
+            self.circuit_breaker.record_failure()
+            self.logger.error(f"Error generating JSON: {e}")
+            raise
+        except Exception as e:
+            self.logger.error(f"Error generating JSON: {e}")
+            raise
+    
     async def generate_health_analysis(self, patient_data: Dict[str, Any]) -> Dict[str, Any]:
         """Generate health analysis using AI"""
         prompt = f"""
@@ -161,12 +365,11 @@ class OllamaService(BaseService):
         """
         
         try:
-            response = await self.generate_text(prompt, temperature=0.3, top_p=0.9)
+            analysis, response = await self.generate_json(prompt, expect="object", temperature=0.3, top_p=0.9)
             
-            # Try to parse JSON response
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
+            if analysis is not None:
+                return analysis
+            else:
                 # If not valid JSON, return structured response
                 return {
                     "risk_level": "medium",
@@ -183,14 +386,88 @@ class OllamaService(BaseService):
     
     async def generate_embeddings(self, text: str, model: Optional[str] = None) -> List[float]:
         """Generate embeddings for text"""
-        if not self.is_available:
-            raise Exception("Ollama service not available")
+        embeddings = await self.generate_embeddings_batch([text], model=model)
+        return embeddings[0]
+    
+    async def generate_embeddings_batch(self, texts: List[str], model: Optional[str] = None) -> List[List[float]]:
+        """Generate embeddings for many texts, reusing cached vectors and batching the misses"""
+        if not texts:
+            return []
         
         model = model or self.embedding_model
+        cache = self._get_embedding_cache(model)
+        keys = [self._embedding_cache_key(model, text) for text in texts]
+        
+        # Embed each distinct uncached text once
+        missing: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in cache and key not in missing:
+                missing[key] = text
+        
+        if missing:
+            if not self.is_available:
+                raise Exception("Ollama service not available")
+            
+            missing_keys = list(missing.keys())
+            vectors = await self._embed_uncached(list(missing.values()), model)
+            cache.add(missing_keys, np.asarray(vectors, dtype=np.float32))
         
+        return [cache.get(key).tolist() for key in keys]
+    
+    async def _embed_uncached(self, texts: List[str], model: str) -> List[List[float]]:
+        """Embed texts with batch calls, or bounded concurrent single calls on older Ollama versions"""
+        if time.monotonic() >= self._batch_embed_retry_at:
+            try:
+                embeddings = []
+                for start in range(0, len(texts), self.embedding_batch_size):
+                    embeddings.extend(await self._embed_batch_request(texts[start:start + self.embedding_batch_size], model))
+                return embeddings
+            except NotImplementedError:
+                # Ollama may be upgraded or restarted behind us, so try batching again later
+                self.logger.info(
+                    f"Ollama batch embedding endpoint unavailable, using per-text requests "
+                    f"for {self.embedding_batch_retry:.0f}s"
+                )
+                self._batch_embed_retry_at = time.monotonic() + self.embedding_batch_retry
+        
+        semaphore = asyncio.Semaphore(self.embedding_concurrency)
+        
+        async def embed_one(text: str) -> List[float]:
+            async with semaphore:
+                return await self._embed_single_request(text, model)
+        
+        return await asyncio.gather(*(embed_one(text) for text in texts))
+    
+    async def _embed_batch_request(self, texts: List[str], model: str) -> List[List[float]]:
+        """Embed a batch of texts with Ollama's /api/embed endpoint"""
         try:
-            response = await self.client.post(
-                f"{self.base_url}/api/embeddings",
+            response = await self._post(
+                "/api/embed",
+                json={
+                    "model": model,
+                    "input": texts
+                },
+                timeout=60.0
+            )
+            
+            if response.status_code == 404:
+                raise NotImplementedError("/api/embed")
+            if response.status_code == 200:
+                return response.json().get("embeddings", [])
+            else:
+                raise Exception(f"Ollama embeddings error: {response.status_code}")
+                
+        except NotImplementedError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error generating embeddings: {e}")
+            raise
+    
+    async def _embed_single_request(self, text: str, model: str) -> List[float]:
+        """Embed one text with Ollama's /api/embeddings endpoint"""
+        try:
+            response = await self._post(
+                "/api/embeddings",
                 json={
                     "model": model,
                     "prompt": text
@@ -208,6 +485,18 @@ class OllamaService(BaseService):
             self.logger.error(f"Error generating embeddings: {e}")
             raise
     
+    def _get_embedding_cache(self, model: str) -> VectorStore:
+        """Get the persistent embedding cache for a model (one matrix per model, since dimensions differ)"""
+        if model not in self.embedding_caches:
+            model_dir = re.sub(r"[^A-Za-z0-9_.-]", "_", model)
+            self.embedding_caches[model] = VectorStore(os.path.join(self.embedding_cache_path, model_dir))
+        return self.embedding_caches[model]
+    
+    @staticmethod
+    def _embedding_cache_key(model: str, text: str) -> str:
+        """Content hash identifying an embedding"""
+        return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+    
     async def analyze_symptoms(self, symptoms: List[str]) -> Dict[str, Any]:
         """Analyze symptoms and provide potential diagnoses"""
         symptoms_text = ", ".join(symptoms)
@@ -229,11 +518,11 @@ class OllamaService(BaseService):
         """
         
         try:
-            response = await self.generate_text(prompt, temperature=0.2)
+            analysis, _ = await self.generate_json(prompt, expect="object", temperature=0.2)
             
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
+            if analysis is not None:
+                return analysis
+            else:
                 return {
                     "potential_conditions": ["Analysis unavailable"],
                     "urgency_level": "medium",
@@ -254,16 +543,17 @@ class OllamaService(BaseService):
         Health Profile:
         {json.dumps(health_profile, indent=2)}
         
-        Provide practical, actionable recommendations as a JSON array:
-        ["recommendation1", "recommendation2", "recommendation3", "recommendation4", "recommendation5"]
+        Provide practical, actionable recommendations as a JSON object:
+        {{"recommendations": ["recommendation1", "recommendation2", "recommendation3", "recommendation4", "recommendation5"]}}
         """
         
         try:
-            response = await self.generate_text(prompt, temperature=0.4)
+            result, _ = await self.generate_json(prompt, expect="object", temperature=0.4)
+            recommendations = result.get("recommendations") if isinstance(result, dict) else None
             
-            try:
-                return json.loads(response)
-            except json.JSONDecodeError:
+            if isinstance(recommendations, list) and recommendations:
+                return [str(item) for item in recommendations]
+            else:
                 # Return default recommendations if parsing fails
                 return [
                     "Maintain regular exercise routine",
@@ -277,8 +567,18 @@ class OllamaService(BaseService):
             self.logger.error(f"Error generating recommendations: {e}")
             raise
     
-    async def luma_chat(self, message: str, context: Optional[Dict] = None) -> Dict[str, Any]:
-        """Luma AI health assistant chat using Ollama"""
+    async def luma_chat(
+        self,
+        message: str,
+        context: Optional[Dict] = None,
+        session_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Luma AI health assistant chat using Ollama.
+        
+        When a session_id is given, the context tokens returned by Ollama are kept
+        per session and sent back on the next turn, so follow-up messages only
+        carry the new user text instead of re-sending the system prompt.
+        """
         if not self.is_available:
             return {
                 "response": f"Hello! I'm Luma, your AI health assistant. You asked: '{message}'. I'm currently running in offline mode, but I can still provide basic health guidance. Always consult healthcare professionals for medical advice.",
@@ -287,26 +587,39 @@ class OllamaService(BaseService):
             }
         
         try:
-            luma_prompt = f"""You are Luma, BioVerse's friendly health AI assistant. Provide helpful, accurate health information while being empathetic. Always recommend consulting healthcare professionals for serious concerns.
+            session_context = self.chat_sessions.get(session_id) if session_id else None
+            
+            if session_context:
+                luma_prompt = f'User asked: "{message}"'
+            else:
+                luma_prompt = f"""You are Luma, BioVerse's friendly health AI assistant. Provide helpful, accurate health information while being empathetic. Always recommend consulting healthcare professionals for serious concerns.
 
 User asked: "{message}"
 
 Respond as Luma with helpful health guidance."""
 
-            response_text = await self.generate_text(
+            result = await self.generate(
                 luma_prompt,
+                context=session_context,
                 temperature=0.7,
                 top_p=0.9
             )
             
+            if session_id and result.context:
+                self.chat_sessions.put(session_id, result.context)
+            
             return {
-                "response": response_text.strip(),
+                "response": result.response.strip(),
                 "confidence": 0.9,
-                "model_used": self.default_model
+                "model_used": self.default_model,
+                "session_id": session_id,
+                "context_reused": session_context is not None
             }
             
         except Exception as e:
             self.logger.error(f"Error in Luma chat: {e}")
+            if session_id:
+                self.chat_sessions.discard(session_id)
             return {
                 "response": f"I'm sorry, I'm having trouble right now. Regarding '{message}', I'd recommend consulting with a healthcare professional.",
                 "confidence": 0.5,
@@ -315,6 +628,8 @@ Respond as Luma with helpful health guidance."""
 
     async def close(self):
         """Close the Ollama service"""
+        if self._health_probe_task:
+            self._health_probe_task.cancel()
         if self.client:
             await self.client.aclose()
         self.logger.info("Ollama service closed")
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Twin Similarity Index for BioVerse
+Nearest-neighbour search over standardized health twin feature vectors
+"""
+
+import logging
+import numpy as np
+from scipy.spatial import cKDTree
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class TwinSimilarityIndex:
+    """Incrementally updated KD-tree index over health twin feature vectors.
+
+    Features are standardized with the mean and standard deviation frozen at the
+    last rebuild. Twins created or updated since then sit in a small pending set
+    that is scanned exhaustively at query time; replaced or removed rows are
+    tombstoned. The tree is rebuilt once the pending set or the tombstones grow
+    past a fraction of the indexed rows, which keeps updates amortized cheap.
+    """
+
+    def __init__(self, dim: int, rebuild_fraction: float = 0.1, min_rebuild_size: int = 1024):
+        self.dim = dim
+        self.rebuild_fraction = rebuild_fraction
+        self.min_rebuild_size = min_rebuild_size
+
+        self._features = np.zeros((0, dim), dtype=np.float32)
+        self._row_ids: List[Optional[str]] = []
+        self._id_to_row: Dict[str, int] = {}
+
+        self._tree: Optional[cKDTree] = None
+        self._tree_size = 0
+        self._mean = np.zeros(dim, dtype=np.float32)
+        self._scale = np.ones(dim, dtype=np.float32)
+        self._pending_rows: List[int] = []
+        self._dead_in_tree = 0
+
+    def __len__(self) -> int:
+        return len(self._id_to_row)
+
+    def __contains__(self, twin_id: str) -> bool:
+        return twin_id in self._id_to_row
+
+    def _append_row(self, twin_id: str, features: np.ndarray) -> int:
+        row = len(self._row_ids)
+        if row >= self._features.shape[0]:
+            grown = np.zeros((max(1024, 2 * self._features.shape[0]), self.dim), dtype=np.float32)
+            grown[:row] = self._features[:row]
+            self._features = grown
+        self._features[row] = features
+        self._row_ids.append(twin_id)
+        return row
+
+    def _tombstone(self, row: int):
+        self._row_ids[row] = None
+        if row < self._tree_size:
+            self._dead_in_tree += 1
+
+    def upsert(self, twin_id: str, features: Sequence[float]):
+        """Insert a twin, or replace its features if it is already indexed"""
+        features = np.asarray(features, dtype=np.float32).ravel()
+        if features.shape[0] != self.dim:
+            raise ValueError(f"Expected {self.dim} features, got {features.shape[0]}")
+
+        old_row = self._id_to_row.get(twin_id)
+        if old_row is not None:
+            self._tombstone(old_row)
+
+        row = self._append_row(twin_id, features)
+        self._id_to_row[twin_id] = row
+        self._pending_rows.append(row)
+
+        if self._needs_rebuild():
+            self.rebuild()
+
+    def remove(self, twin_id: str):
+        """Remove a twin from the index"""
+        row = self._id_to_row.pop(twin_id, None)
+        if row is not None:
+            self._tombstone(row)
+
+    def _needs_rebuild(self) -> bool:
+        threshold = max(self.min_rebuild_size, int(self.rebuild_fraction * self._tree_size))
+        return len(self._pending_rows) + self._dead_in_tree > threshold
+
+    def rebuild(self):
+        """Compact live rows, refresh the standardization and rebuild the KD-tree"""
+        live_rows = np.array(sorted(self._id_to_row.values()), dtype=np.int64)
+        live_ids = [self._row_ids[row] for row in live_rows]
+        features = self._features[live_rows] if len(live_rows) else np.zeros((0, self.dim), dtype=np.float32)
+
+        self._features = np.array(features, dtype=np.float32)
+        self._row_ids = list(live_ids)
+        self._id_to_row = {twin_id: row for row, twin_id in enumerate(live_ids)}
+        self._pending_rows = []
+        self._dead_in_tree = 0
+
+        if len(features):
+            self._mean = features.mean(axis=0)
+            std = features.std(axis=0)
+            self._scale = np.where(std > 1e-6, std, 1.0).astype(np.float32)
+            self._tree = cKDTree(self._standardize(features))
+        else:
+            self._tree = None
+        self._tree_size = len(features)
+
+        logger.info(f"Rebuilt twin similarity index with {len(features)} twins")
+
+    def _standardize(self, features: np.ndarray) -> np.ndarray:
+        return (features - self._mean) / self._scale
+
+    def query(self, features: Sequence[float], k: int = 10, exclude_id: Optional[str] = None) -> List[Tuple[str, float]]:
+        """Return up to k (twin_id, distance) pairs nearest to the given features"""
+        if k <= 0 or not self._id_to_row:
+            return []
+        if self._tree is None:
+            self.rebuild()
+
+        query = self._standardize(np.asarray(features, dtype=np.float32).ravel())
+        candidates: Dict[str, float] = {}
+
+        # Tombstoned rows and the excluded twin may occupy some of the nearest slots
+        if self._tree_size:
+            k_tree = min(self._tree_size, k + self._dead_in_tree + 1)
+            distances, rows = self._tree.query(query, k=k_tree)
+            for distance, row in zip(np.atleast_1d(distances), np.atleast_1d(rows)):
+                twin_id = self._row_ids[row]
+                if twin_id is not None and twin_id != exclude_id:
+                    candidates[twin_id] = float(distance)
+
+        if self._pending_rows:
+            pending = np.array(self._pending_rows, dtype=np.int64)
+            distances = np.linalg.norm(self._standardize(self._features[pending]) - query, axis=1)
+            for distance, row in zip(distances, pending):
+                twin_id = self._row_ids[row]
+                if twin_id is not None and twin_id != exclude_id:
+                    candidates[twin_id] = float(distance)
+
+        return sorted(candidates.items(), key=lambda item: item[1])[:k]
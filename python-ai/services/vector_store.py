@@ -0,0 +1,237 @@
+"""
+Vector Store for BioVerse
+Persistent, memory-mapped float32 vector matrix with id mapping and top-k search
+"""
+
+import os
+import logging
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+class VectorStore:
+    """Append-only float32 vector matrix backed by a memory-mapped .npy file.
+
+    Rows are addressed by string ids. The id list is kept in an append-only
+    text file next to the matrix, so adding vectors never rewrites existing data.
+    Search is exact (brute force) by default; an IVF index can be built with
+    `build_ivf_index` for large stores.
+    """
+
+    VECTORS_FILE = "vectors.npy"
+    IDS_FILE = "ids.txt"
+
+    def __init__(self, path: Optional[str] = None, dim: Optional[int] = None, initial_capacity: int = 1024):
+        self.path = path
+        self.dim = dim
+        self.initial_capacity = initial_capacity
+        self.ids: List[str] = []
+        self.id_to_row: Dict[str, int] = {}
+        self._matrix: Optional[np.ndarray] = None
+        self._norms = np.zeros(0, dtype=np.float32)
+
+        # IVF index state
+        self._centroids: Optional[np.ndarray] = None
+        self._assignments: Optional[np.ndarray] = None
+
+        if path:
+            os.makedirs(path, exist_ok=True)
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, vector_id: str) -> bool:
+        return vector_id in self.id_to_row
+
+    @property
+    def vectors(self) -> np.ndarray:
+        """View of the populated rows of the matrix"""
+        if self._matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._matrix[:len(self.ids)]
+
+    def _load(self):
+        """Load an existing store from disk, if present"""
+        vectors_path = os.path.join(self.path, self.VECTORS_FILE)
+        ids_path = os.path.join(self.path, self.IDS_FILE)
+
+        if not os.path.exists(vectors_path) or not os.path.exists(ids_path):
+            return
+
+        with open(ids_path, "r", encoding="utf-8") as f:
+            ids = [line.rstrip("\n") for line in f if line.strip()]
+
+        self._matrix = np.load(vectors_path, mmap_mode="r+")
+        self.dim = self._matrix.shape[1]
+
+        # A crash between the matrix flush and the id append can leave extra ids
+        ids = ids[:self._matrix.shape[0]]
+        self.ids = ids
+        self.id_to_row = {vector_id: row for row, vector_id in enumerate(ids)}
+        self._norms = np.linalg.norm(self.vectors, axis=1).astype(np.float32)
+
+        logger.info(f"Loaded vector store from {self.path} with {len(self.ids)} vectors")
+
+    def _allocate(self, capacity: int) -> np.ndarray:
+        """Allocate a matrix with the given row capacity, on disk if the store is persistent"""
+        if self.path:
+            tmp_path = os.path.join(self.path, self.VECTORS_FILE + ".tmp")
+            matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(capacity, self.dim))
+        else:
+            matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        return matrix
+
+    def _ensure_capacity(self, required_rows: int):
+        """Grow the backing matrix geometrically so appends stay amortized O(1)"""
+        current = 0 if self._matrix is None else self._matrix.shape[0]
+        if required_rows <= current:
+            return
+
+        capacity = max(self.initial_capacity, current)
+        while capacity < required_rows:
+            capacity *= 2
+
+        new_matrix = self._allocate(capacity)
+        if self._matrix is not None and len(self.ids):
+            new_matrix[:len(self.ids)] = self._matrix[:len(self.ids)]
+
+        if self.path:
+            new_matrix.flush()
+            del new_matrix
+            self._matrix = None
+            os.replace(
+                os.path.join(self.path, self.VECTORS_FILE + ".tmp"),
+                os.path.join(self.path, self.VECTORS_FILE)
+            )
+            self._matrix = np.load(os.path.join(self.path, self.VECTORS_FILE), mmap_mode="r+")
+        else:
+            self._matrix = new_matrix
+
+    def add(self, ids: Sequence[str], vectors: np.ndarray):
+        """Add or overwrite vectors for the given ids"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim == 1:
+            vectors = vectors[np.newaxis, :]
+        if len(ids) != vectors.shape[0]:
+            raise ValueError("Number of ids does not match number of vectors")
+        if len(ids) == 0:
+            return
+
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected vectors of dimension {self.dim}, got {vectors.shape[1]}")
+
+        # An id repeated within one call keeps only its last vector, as sequential adds would
+        latest = {vector_id: index for index, vector_id in enumerate(ids)}
+        if len(latest) < len(ids):
+            ids = list(latest)
+            vectors = vectors[list(latest.values())]
+
+        new_ids = []
+        new_rows = []
+        for vector_id, vector in zip(ids, vectors):
+            row = self.id_to_row.get(vector_id)
+            if row is not None:
+                self._matrix[row] = vector
+                self._norms[row] = np.linalg.norm(vector)
+                if self._centroids is not None:
+                    self._assignments[row] = self._nearest_centroids(vector[np.newaxis, :])[0]
+            else:
+                new_ids.append(vector_id)
+                new_rows.append(vector)
+
+        if new_ids:
+            start = len(self.ids)
+            self._ensure_capacity(start + len(new_ids))
+            block = np.stack(new_rows)
+            self._matrix[start:start + len(new_ids)] = block
+
+            self.ids.extend(new_ids)
+            for offset, vector_id in enumerate(new_ids):
+                self.id_to_row[vector_id] = start + offset
+            self._norms = np.concatenate([self._norms, np.linalg.norm(block, axis=1).astype(np.float32)])
+
+            if self._centroids is not None:
+                self._assignments = np.concatenate([self._assignments, self._nearest_centroids(block)])
+
+            if self.path:
+                self._matrix.flush()
+                with open(os.path.join(self.path, self.IDS_FILE), "a", encoding="utf-8") as f:
+                    f.write("".join(f"{vector_id}\n" for vector_id in new_ids))
+        elif self.path:
+            self._matrix.flush()
+
+    def get(self, vector_id: str) -> Optional[np.ndarray]:
+        """Return a copy of the vector stored for an id"""
+        row = self.id_to_row.get(vector_id)
+        if row is None:
+            return None
+        return np.array(self._matrix[row])
+
+    def build_ivf_index(self, n_lists: Optional[int] = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """Build an inverted-file index by k-means clustering of the normalized vectors"""
+        count = len(self.ids)
+        if count == 0:
+            return
+
+        n_lists = n_lists or max(1, int(np.sqrt(count)))
+        n_lists = min(n_lists, count)
+        rng = np.random.default_rng(seed)
+
+        normalized = self._normalized(self.vectors, self._norms)
+        sample = normalized[rng.choice(count, size=min(sample_size, count), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, sample)
+            counts = np.bincount(labels, minlength=n_lists)
+            non_empty = counts > 0
+            centroids[non_empty] = sums[non_empty] / counts[non_empty, np.newaxis]
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+
+        self._centroids = centroids.astype(np.float32)
+        self._assignments = self._nearest_centroids(self.vectors)
+        logger.info(f"Built IVF index with {n_lists} lists over {count} vectors")
+
+    def _nearest_centroids(self, vectors: np.ndarray) -> np.ndarray:
+        """Assign each vector to the closest IVF centroid by cosine similarity"""
+        return np.argmax(vectors @ self._centroids.T, axis=1).astype(np.int32)
+
+    @staticmethod
+    def _normalized(vectors: np.ndarray, norms: np.ndarray) -> np.ndarray:
+        return vectors / np.maximum(norms, 1e-12)[:, np.newaxis]
+
+    def search(self, query: np.ndarray, k: int = 10, nprobe: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Return the k most similar (id, cosine similarity) pairs for a query vector.
+
+        With an IVF index built and `nprobe` given, only the `nprobe` closest lists
+        are scanned; otherwise the search is an exact scan of every stored vector.
+        """
+        count = len(self.ids)
+        if count == 0 or k <= 0:
+            return []
+
+        query = np.asarray(query, dtype=np.float32).ravel()
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+
+        if self._centroids is not None and nprobe:
+            probe_lists = np.argsort(-(self._centroids @ query))[:nprobe]
+            candidates = np.flatnonzero(np.isin(self._assignments, probe_lists))
+            if len(candidates) == 0:
+                return []
+            scores = (self._matrix[candidates] @ query) / np.maximum(self._norms[candidates], 1e-12)
+        else:
+            candidates = None
+            scores = (self.vectors @ query) / np.maximum(self._norms, 1e-12)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = top if candidates is None else candidates[top]
+
+        return [(self.ids[row], float(scores[i])) for row, i in zip(rows, top)]
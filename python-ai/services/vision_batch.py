@@ -0,0 +1,321 @@
+"""
+Batch Medical Image Analysis for BioVerse
+Runs MedicalVisionAI over many images in a process pool and streams results as they complete
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+
+from services.medical_vision_ai import ImagingModality, MedicalVisionAI
+
+logger = logging.getLogger(__name__)
+
+# One analyzer per worker process, created on the first image it handles
+_worker_vision_ai: Optional[MedicalVisionAI] = None
+
+def _analyze_in_worker(
+    name: str,
+    image_path: str,
+    modality_value: str,
+    clinical_context: Dict[str, Any],
+    submitted_at: float
+) -> Dict[str, Any]:
+    """Analyze one spooled image file inside a pool worker and time each phase"""
+    global _worker_vision_ai
+    started_at = time.time()
+    if _worker_vision_ai is None:
+        _worker_vision_ai = MedicalVisionAI()
+
+    modality = ImagingModality(modality_value)
+    timings: Dict[str, float] = {}
+    image_data = np.memmap(image_path, dtype=np.uint8, mode="r")
+    result = asyncio.run(_worker_vision_ai.analyze_medical_image(image_data, modality, clinical_context, timings))
+    del image_data
+
+    # A cache hit skips both phases
+    cached = not timings
+    preprocess_ms = timings.get("preprocess", 0.0)
+    analysis_ms = timings.get("analysis", 0.0)
+
+    return {
+        "name": name,
+        "status": "completed",
+        "cached": cached,
+        "result": result,
+        "timing_ms": {
+            "queued": round((started_at - submitted_at) * 1000, 2),
+            "preprocess": round(preprocess_ms, 2),
+            "analysis": round(analysis_ms, 2),
+            "total": round((time.time() - started_at) * 1000, 2)
+        }
+    }
+
+@dataclass
+class VisionBatchJob:
+    """State of one batch analysis job; results are appended as images finish"""
+    job_id: str
+    modality: ImagingModality
+    total: int
+    created_at: datetime = field(default_factory=datetime.now)
+    status: str = "running"
+    completed: int = 0
+    failed: int = 0
+    results: List[Dict[str, Any]] = field(default_factory=list)
+    finished_at: Optional[datetime] = None
+
+    def __post_init__(self):
+        self._changed = asyncio.Condition()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status != "running"
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "modality": self.modality.value,
+            "status": self.status,
+            "total": self.total,
+            "completed": self.completed,
+            "failed": self.failed,
+            "created_at": self.created_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None
+        }
+
+class VisionBatchProcessor:
+    """Process pool for batch image analysis with a bounded registry of recent jobs.
+
+    Preprocessing (NLM denoising in particular) is CPU bound and holds the GIL,
+    so each image is analyzed in a separate worker process. The pool is created
+    on the first batch so starting the application does not fork processes.
+
+    Jobs live in the API worker that accepted them. With `state_path` set to a
+    directory shared by every API worker, each job's summary and results are
+    also written there, so any worker can report progress and stream results
+    of a job another worker runs; only the worker running a job can cancel it.
+    Without it, run the API with a single worker.
+    """
+
+    def __init__(
+        self,
+        max_workers: Optional[int] = None,
+        max_jobs: int = 100,
+        state_path: Optional[str] = None,
+        poll_interval: float = 0.5
+    ):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_jobs = max_jobs
+        self.poll_interval = poll_interval
+        self.jobs: "OrderedDict[str, VisionBatchJob]" = OrderedDict()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self.state_dir = Path(state_path) if state_path else None
+        if self.state_dir is not None:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            logger.info(f"Started vision batch pool with {self.max_workers} workers")
+        return self._executor
+
+    def submit(
+        self,
+        images: List[Tuple[str, str]],
+        modality: ImagingModality,
+        clinical_context: Optional[Dict[str, Any]] = None
+    ) -> VisionBatchJob:
+        """Queue (name, file path) images for analysis and return the job immediately.
+
+        The processor takes ownership of the files and deletes each one once
+        its image has been analyzed or the job is cancelled.
+        """
+        job = VisionBatchJob(job_id=str(uuid.uuid4()), modality=modality, total=len(images))
+        self.jobs[job.job_id] = job
+        self._persist(job)
+        self._evict_finished_jobs()
+
+        job._task = asyncio.create_task(self._run(job, images, clinical_context or {}))
+        return job
+
+    def get_job(self, job_id: str) -> Optional[VisionBatchJob]:
+        """A job submitted to this worker"""
+        return self.jobs.get(job_id)
+
+    def job_summary(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Summary of a job run by this or, with a shared state directory, any other worker"""
+        job = self.jobs.get(job_id)
+        if job is not None:
+            return job.summary()
+        path = self._state_path(job_id, ".json")
+        if path is None:
+            return None
+        try:
+            return json.loads(path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _state_path(self, job_id: str, suffix: str) -> Optional[Path]:
+        if self.state_dir is None or not job_id or "/" in job_id or "\\" in job_id or job_id.startswith("."):
+            return None
+        return self.state_dir / f"{job_id}{suffix}"
+
+    def _persist(self, job: VisionBatchJob):
+        path = self._state_path(job.job_id, ".json")
+        if path is None:
+            return
+        try:
+            tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(job.summary()))
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning(f"Could not store vision batch {job.job_id}: {e}")
+
+    def _evict_finished_jobs(self):
+        """Drop the oldest finished jobs, and their stored state, once the registry is over capacity"""
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            if self.jobs[job_id].done:
+                del self.jobs[job_id]
+                for suffix in (".json", ".ndjson"):
+                    path = self._state_path(job_id, suffix)
+                    if path is not None:
+                        path.unlink(missing_ok=True)
+
+    async def _run(self, job: VisionBatchJob, images: List[Tuple[str, str]], clinical_context: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        submitted_at = time.time()
+        futures = {}
+
+        try:
+            executor = self._get_executor()
+            for name, path in images:
+                future = loop.run_in_executor(
+                    executor, _analyze_in_worker, name, path, job.modality.value, clinical_context, submitted_at
+                )
+                futures[future] = (name, path)
+
+            pending = set(futures)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    name, path = futures[future]
+                    Path(path).unlink(missing_ok=True)
+                    try:
+                        entry = future.result()
+                        entry["result"] = jsonable_encoder(entry["result"])
+                        job.completed += 1
+                    except Exception as e:
+                        logger.warning(f"Batch {job.job_id}: failed to analyze {name}: {e}")
+                        entry = {"name": name, "status": "failed", "error": str(e)}
+                        job.failed += 1
+                    await self._publish(job, entry)
+            job.status = "completed"
+        except asyncio.CancelledError:
+            for future in futures:
+                future.cancel()
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Batch {job.job_id} failed: {e}", exc_info=True)
+            job.status = "failed"
+        finally:
+            for name, path in images:
+                Path(path).unlink(missing_ok=True)
+            job.finished_at = datetime.now()
+            self._persist(job)
+            async with job._changed:
+                job._changed.notify_all()
+
+    async def _publish(self, job: VisionBatchJob, entry: Dict[str, Any]):
+        job.results.append(entry)
+        path = self._state_path(job.job_id, ".ndjson")
+        if path is not None:
+            try:
+                with open(path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            except OSError as e:
+                logger.warning(f"Could not store a result of vision batch {job.job_id}: {e}")
+        self._persist(job)
+        async with job._changed:
+            job._changed.notify_all()
+
+    async def stream_results(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Yield every result of a job, waiting for new ones until the job finishes"""
+        job = self.jobs.get(job_id)
+        if job is None:
+            async for entry in self._stream_stored_results(job_id):
+                yield entry
+            return
+
+        index = 0
+        while True:
+            while index < len(job.results):
+                yield job.results[index]
+                index += 1
+            if job.done:
+                return
+            async with job._changed:
+                await job._changed.wait_for(lambda: index < len(job.results) or job.done)
+
+    async def _stream_stored_results(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Follow the result file of a job another worker runs until its summary says it finished"""
+        path = self._state_path(job_id, ".ndjson")
+        if path is None:
+            return
+        offset = 0
+        while True:
+            summary = self.job_summary(job_id)
+            finished = summary is None or summary["status"] != "running"
+            try:
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    chunk = f.read()
+            except FileNotFoundError:
+                chunk = b""
+            # A line without its newline is still being written
+            complete = chunk[:chunk.rfind(b"\n") + 1]
+            offset += len(complete)
+            for line in complete.splitlines():
+                yield json.loads(line)
+            if finished:
+                return
+            await asyncio.sleep(self.poll_interval)
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a running job; images already executing in a worker still finish"""
+        job = self.jobs.get(job_id)
+        if job is None or job.done or job._task is None:
+            return False
+        job._task.cancel()
+        return True
+
+    def shutdown(self):
+        """Cancel running jobs and stop the worker pool"""
+        for job in self.jobs.values():
+            if not job.done and job._task is not None:
+                job._task.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+def create_batch_processor() -> VisionBatchProcessor:
+    """A processor configured from VISION_BATCH_WORKERS and VISION_BATCH_STATE_PATH"""
+    return VisionBatchProcessor(
+        max_workers=int(os.getenv("VISION_BATCH_WORKERS", 0)) or None,
+        state_path=os.getenv("VISION_BATCH_STATE_PATH") or None
+    )
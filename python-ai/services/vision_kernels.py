@@ -0,0 +1,88 @@
+"""
+Kernel Registry for BioVerse Medical Vision
+Per-process cache of OpenCV kernels, lookup tables and CLAHE instances, keyed by their parameters
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class KernelRegistry:
+    """Builds each kernel or lookup table once per parameter set and reuses it.
+
+    Arrays are stored read-only and shared by every thread: OpenCV only reads
+    kernels and LUTs, so one copy serves the tiling and executor threads
+    concurrently. CLAHE objects keep per-call scratch state, so each thread
+    gets its own instance for a given clip limit and grid.
+
+    Entries are evicted least recently used beyond `max_entries`, which only
+    matters for data-dependent tables such as normalization ranges.
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        """Return the entry for `key`, building it with `factory` on first use"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        # Built outside the lock; two threads racing on a new key both build it
+        # and the first one stored wins
+        entry = factory()
+        if isinstance(entry, np.ndarray):
+            entry.setflags(write=False)
+
+        with self._lock:
+            self.misses += 1
+            entry = self._entries.setdefault(key, entry)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def structuring_element(self, shape: int, size: Tuple[int, int]) -> np.ndarray:
+        return self.get(("structuring_element", shape, size), lambda: cv2.getStructuringElement(shape, size))
+
+    def clahe(self, clip_limit: float, tile_grid_size: Tuple[int, int]) -> "cv2.CLAHE":
+        """A CLAHE instance owned by the calling thread"""
+        instances: Dict[Tuple[float, Tuple[int, int]], Any] = getattr(self._local, "clahe", None)
+        if instances is None:
+            instances = self._local.clahe = {}
+        key = (clip_limit, tile_grid_size)
+        if key not in instances:
+            instances[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tile_grid_size)
+        return instances[key]
+
+    def lut(self, name: str, params: Tuple, builder: Callable[..., np.ndarray]) -> np.ndarray:
+        """A 256-entry lookup table built by `builder(*params)`"""
+        return self.get(("lut", name) + tuple(params), lambda: builder(*params))
+
+    def gaussian_kernel(self, sigma: float, truncate: float = 4.0) -> np.ndarray:
+        """Normalized 1-D float32 Gaussian with radius int(truncate * sigma + 0.5)"""
+        def build():
+            radius = int(truncate * sigma + 0.5)
+            taps = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+            return (taps / taps.sum()).astype(np.float32)
+        return self.get(("gaussian", sigma, truncate), build)
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+# Shared by every ImagePreprocessor and VolumeProcessor in this process
+kernel_registry = KernelRegistry()
@@ -0,0 +1,218 @@
+"""
+Vision Result Cache for BioVerse
+Content-addressed cache of medical image analysis results and preprocessed arrays
+"""
+
+import hashlib
+import json
+import logging
+import os
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def _json_default(value: Any) -> Any:
+    """Encode numpy scalars and arrays that analyzers leave in results"""
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+class VisionResultCache:
+    """Cache keyed by the SHA-256 of image bytes, modality and clinical context.
+
+    Results are JSON-compatible values, such as ImageAnalysisResult.to_dict().
+    Recently used ones are kept in memory as JSON text and decoded on every
+    hit, so callers never share a mutable result. With a `path` the cache also
+    has a disk tier: results are written to `<key>.json` and preprocessed
+    arrays to `<key>.npy` under a key that leaves out the clinical context,
+    since preprocessing does not depend on it. Files are written atomically so
+    several worker processes can share one directory.
+
+    When the directory grows past `max_bytes`, the least recently used files
+    (by modification time, refreshed on every hit) are deleted.
+    """
+
+    RESULT_SUFFIX = ".json"
+    ARRAY_SUFFIX = ".npy"
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        max_bytes: int = 1024 ** 3,
+        memory_entries: int = 256,
+        store_arrays: bool = False
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.store_arrays = store_arrays and path is not None
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self._disk_bytes = 0
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            self._disk_bytes = self._scan_size()
+
+    @staticmethod
+    def image_key(image_data: Union[np.ndarray, bytes, str], modality_value: str) -> str:
+        """Key for the preprocessed image: hash of the encoded bytes and the modality"""
+        digest = hashlib.sha256()
+        if isinstance(image_data, str):
+            image_data = image_data.encode("ascii")
+        elif isinstance(image_data, np.ndarray):
+            if image_data.ndim > 1:
+                # Decoded pixels hash their shape too, so reshaped data never collides;
+                # a flat buffer holds an encoded file and hashes like the same bytes
+                digest.update(repr((image_data.dtype.str, image_data.shape)).encode())
+            image_data = memoryview(np.ascontiguousarray(image_data)).cast("B")
+        digest.update(image_data)
+        digest.update(b"\0" + modality_value.encode())
+        return digest.hexdigest()
+
+    @staticmethod
+    def result_key(image_key: str, clinical_context: Optional[Dict[str, Any]]) -> str:
+        """Key for an analysis result.
+
+        The whole clinical context is part of the key: the analyzers branch on
+        some fields and the generated report quotes all of them.
+        """
+        context = json.dumps(clinical_context or {}, sort_keys=True, default=str)
+        return hashlib.sha256(f"{image_key}\0{context}".encode()).hexdigest()
+
+    def _file(self, key: str, suffix: str) -> str:
+        return os.path.join(self.path, key + suffix)
+
+    def get_result(self, key: str) -> Optional[Any]:
+        """Return a freshly decoded copy of a cached analysis result, or None"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            self.hits += 1
+            return json.loads(self._memory[key])
+
+        if self.path is None:
+            self.misses += 1
+            return None
+
+        file_path = self._file(key, self.RESULT_SUFFIX)
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                encoded = f.read()
+            result = json.loads(encoded)
+            os.utime(file_path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable vision cache entry {key}: {e}")
+            self._remove(file_path)
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._remember(key, encoded)
+        return result
+
+    def put_result(self, key: str, result: Any):
+        """Store a JSON-compatible analysis result"""
+        encoded = json.dumps(result, default=_json_default)
+        self._remember(key, encoded)
+        if self.path is not None:
+            self._write(self._file(key, self.RESULT_SUFFIX), lambda f: f.write(encoded.encode("utf-8")))
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        """Return a cached preprocessed array, memory-mapped read-only, or None"""
+        if not self.store_arrays:
+            return None
+        file_path = self._file(key, self.ARRAY_SUFFIX)
+        try:
+            array = np.load(file_path, mmap_mode="r")
+            os.utime(file_path)
+            return array
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Discarding unreadable vision cache array {key}: {e}")
+            self._remove(file_path)
+            return None
+
+    def put_array(self, key: str, array: np.ndarray):
+        """Store a preprocessed array when array caching is enabled"""
+        if self.store_arrays:
+            self._write(self._file(key, self.ARRAY_SUFFIX), lambda f: np.save(f, array))
+
+    def _remember(self, key: str, encoded: str):
+        self._memory[key] = encoded
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _write(self, file_path: str, writer):
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                writer(f)
+            # An overwritten entry gives its old size back before the new one is counted
+            try:
+                previous_size = os.path.getsize(file_path)
+            except FileNotFoundError:
+                previous_size = 0
+            os.replace(tmp_path, file_path)
+        except Exception as e:
+            logger.warning(f"Failed to write vision cache entry {file_path}: {e}")
+            self._remove(tmp_path)
+            return
+
+        self._disk_bytes += os.path.getsize(file_path) - previous_size
+        if self._disk_bytes > self.max_bytes:
+            self._evict()
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.path) if entry.is_file())
+
+    def _evict(self):
+        """Delete least recently used files until the cache is back under 90% of max_bytes"""
+        entries = []
+        for entry in os.scandir(self.path):
+            if entry.is_file() and not entry.name.endswith(".tmp"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        target = int(self.max_bytes * 0.9)
+        removed = 0
+        for _, size, file_path in entries:
+            if total <= target:
+                break
+            if self._remove(file_path):
+                total -= size
+                removed += 1
+                key = os.path.basename(file_path).rsplit(".", 1)[0]
+                self._memory.pop(key, None)
+
+        self._disk_bytes = total
+        logger.info(f"Evicted {removed} vision cache files, {total} bytes remain")
+
+    @staticmethod
+    def _remove(file_path: str) -> bool:
+        try:
+            os.remove(file_path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory_entries": len(self._memory),
+            "disk_bytes": self._disk_bytes,
+            "max_bytes": self.max_bytes
+        }
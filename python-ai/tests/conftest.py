@@ -0,0 +1,35 @@
+import asyncio
+
+import pytest
+
+from services.federated_learning_service import FederatedLearningService
+
+@pytest.fixture
+def register_clinics():
+    """Register clinics on a FederatedLearningService.
+
+    `clinics` is a number of clinic_<index> ids or the ids themselves; the clinic
+    at each index has patient_counts[index] patients, 100 * (index + 1) by default.
+    """
+    def register(service, clinics, patient_counts=None):
+        institution_ids = [f"clinic_{index}" for index in range(clinics)] if isinstance(clinics, int) else clinics
+        for index, institution_id in enumerate(institution_ids):
+            asyncio.run(service.register_participant({
+                "institution_id": institution_id, "institution_type": "clinic", "location": "Lusaka",
+                "patient_count": patient_counts[index] if patient_counts else 100 * (index + 1)
+            }))
+        return service
+    return register
+
+@pytest.fixture
+def federated_service(register_clinics):
+    """Build a FederatedLearningService with registered clinics and, unless `model_id` is None, a global model.
+
+    Extra keyword arguments (engine, state) go to the service.
+    """
+    def build(clinics=3, model_id="m1", model_type="default", patient_counts=None, **kwargs):
+        service = register_clinics(FederatedLearningService(**kwargs), clinics, patient_counts)
+        if model_id is not None:
+            service.initialize_global_model(model_type, model_id)
+        return service
+    return build
@@ -0,0 +1,109 @@
+import asyncio
+import io
+
+import numpy as np
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import CTImageStorage, ExplicitVRLittleEndian, generate_uid
+
+from services.dicom_ingest import DicomImage, DicomSeries, is_dicom, window_to_uint8
+from services.medical_vision_ai import ImagePreprocessor, ImagingModality
+
+def _ct_dicom(frames, slope=1.0, intercept=-1024.0, window=(40, 400), position=0.0, instance=1):
+    """Encode int16 frames as an uncompressed CT DICOM file"""
+    frames = np.asarray(frames, dtype=np.int16)
+    if frames.ndim == 2:
+        frames = frames[np.newaxis]
+
+    meta = FileMetaDataset()
+    meta.MediaStorageSOPClassUID = CTImageStorage
+    meta.MediaStorageSOPInstanceUID = generate_uid()
+    meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    ds = Dataset()
+    ds.file_meta = meta
+    ds.SOPClassUID = CTImageStorage
+    ds.SOPInstanceUID = meta.MediaStorageSOPInstanceUID
+    ds.Modality = "CT"
+    ds.InstanceNumber = instance
+    ds.ImagePositionPatient = [0, 0, position]
+    ds.Rows, ds.Columns = frames.shape[1:]
+    ds.NumberOfFrames = len(frames)
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 16
+    ds.BitsStored = 16
+    ds.HighBit = 15
+    ds.PixelRepresentation = 1
+    ds.RescaleSlope = slope
+    ds.RescaleIntercept = intercept
+    if window:
+        ds.WindowCenter, ds.WindowWidth = window
+    ds.PixelData = frames.tobytes()
+
+    buffer = io.BytesIO()
+    try:
+        ds.save_as(buffer, enforce_file_format=True)
+    except TypeError:  # pydicom < 3
+        ds.is_little_endian, ds.is_implicit_VR = True, False
+        ds.save_as(buffer, write_like_original=False)
+    return buffer.getvalue()
+
+def _frames(count=3, size=32):
+    return np.random.default_rng(0).integers(0, 2000, (count, size, size)).astype(np.int16)
+
+def test_frames_decode_lazily_with_rescale():
+    frames = _frames()
+    data = _ct_dicom(frames, slope=2.0, intercept=-1024.0)
+
+    assert is_dicom(data)
+    image = DicomImage(np.frombuffer(data, dtype=np.uint8))
+
+    assert len(image) == 3
+    assert image.header.window_center == 40.0
+    assert np.array_equal(image.frame(1), frames[1])
+    assert np.allclose(image.modality_values(2), frames[2] * 2.0 - 1024.0)
+    with pytest.raises(IndexError):
+        image.frame(3)
+
+def test_window_follows_dicom_linear_function():
+    values = np.array([-161, -160, 40, 239, 240], dtype=np.float32)
+
+    assert window_to_uint8(values.copy(), 40, 400).tolist() == [0, 0, 127, 255, 255]
+    assert window_to_uint8(values.copy(), 40, 400, invert=True).tolist() == [255, 255, 128, 0, 0]
+
+def test_header_window_replaces_fixed_ct_window(tmp_path):
+    frames = np.full((1, 16, 16), 1024 + 300, dtype=np.int16)  # 300 HU
+    path = tmp_path / "bone.dcm"
+    path.write_bytes(_ct_dicom(frames, window=(300, 1500)))
+
+    image = DicomImage(str(path))
+
+    assert image.windowed_frame(0)[0, 0] == 127
+    assert image.windowed_frame(0, 40, 400)[0, 0] == 255
+
+def test_series_orders_slices_by_position(tmp_path):
+    for name, position in [("a.dcm", 10.0), ("b.dcm", -5.0), ("c.dcm", 2.5)]:
+        frames = np.full((1, 8, 8), 1024 + int(position * 10), dtype=np.int16)
+        (tmp_path / name).write_bytes(_ct_dicom(frames, position=position))
+
+    series = DicomSeries.from_directory(str(tmp_path))
+
+    assert series.shape == (3, 8, 8)
+    assert [float(series.slice_values(i)[0, 0]) for i in range(3)] == [-50.0, 25.0, 100.0]
+
+def test_preprocessor_accepts_dicom_uploads_and_series():
+    preprocessor = ImagePreprocessor()
+    preprocessor.enhancement_params['noise_reduction'] = False
+    data = _ct_dicom(_frames(count=1, size=48)[0])
+
+    result = asyncio.run(preprocessor.preprocess_image(data, ImagingModality.CT_SCAN))
+    assert result.shape == (48, 48) and result.dtype == np.uint8
+
+    series = DicomSeries([_ct_dicom(frame) for frame in _frames(count=4, size=48)])
+
+    async def collect():
+        return [s async for s in preprocessor.preprocess_series(series, ImagingModality.CT_SCAN)]
+
+    slices = asyncio.run(collect())
+    assert len(slices) == 4 and all(s.shape == (48, 48) for s in slices)
@@ -0,0 +1,73 @@
+import asyncio
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from services.federated_aggregation import StreamingAggregator, SummationMethod
+from services.federated_health_learning import HomomorphicEncryption, SecureAggregation
+
+def _updates(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return [({"layer1": rng.normal(0, 0.1, (100, 50)), "output": rng.normal(0, 0.1, (50, 1))}, int(rng.integers(100, 10000)))
+            for _ in range(count)]
+
+@pytest.mark.parametrize("summation", list(SummationMethod))
+def test_weighted_average_matches_numpy(summation):
+    updates = _updates(13)
+    aggregator = StreamingAggregator(summation)
+    for tensors, weight in updates:
+        aggregator.add(tensors, weight)
+
+    result = aggregator.result()
+    weights = [weight for _, weight in updates]
+    for name in ("layer1", "output"):
+        expected = np.average([tensors[name] for tensors, _ in updates], axis=0, weights=weights)
+        assert np.allclose(result[name], expected, rtol=0, atol=1e-12)
+    assert aggregator.stats.updates == 13 and aggregator.stats.parameters == 5050
+
+def test_compensated_summation_reduces_rounding_error():
+    # Alternating huge and tiny values lose the tiny ones under naive float64 summation
+    values = [np.full(4, 1e16), *[np.full(4, 1.0)] * 1000, np.full(4, -1e16)]
+    errors = {}
+    for summation in SummationMethod:
+        aggregator = StreamingAggregator(summation)
+        for value in values:
+            aggregator.add({"w": value})
+        errors[summation] = abs(aggregator.result()["w"][0] * len(values) - 1000.0)
+
+    assert errors[SummationMethod.KAHAN] < 1e-6
+    assert errors[SummationMethod.PAIRWISE] < errors[SummationMethod.NAIVE]
+
+def test_memory_stays_flat_as_participants_grow():
+    def peak(count):
+        template = _updates(1)[0][0]
+        tracemalloc.start()
+        aggregator = StreamingAggregator(SummationMethod.KAHAN)
+        for _ in range(count):
+            aggregator.add(template, 10)
+        aggregator.result()
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return peak_bytes
+
+    assert peak(300) < 1.2 * peak(10)
+
+def test_rejects_mismatched_updates():
+    aggregator = StreamingAggregator()
+    aggregator.add({"w": np.zeros(3)})
+    with pytest.raises(ValueError):
+        aggregator.add({"w": np.zeros(4)})
+    with pytest.raises(ValueError):
+        StreamingAggregator().result()
+
+def test_services_aggregate_by_data_size(federated_service):
+    service = federated_service(["a", "b"], patient_counts=[100, 300])
+    result = asyncio.run(service.start_training_round("m1", ["a", "b"]))
+    assert result["aggregation"]["updates"] == 2 and result["aggregation"]["total_weight"] == 400
+
+    encryption = HomomorphicEncryption()
+    encryption.noise_scale = 0.0
+    secure = SecureAggregation(encryption)
+    updates = [encryption.encrypt(np.full(5, 1.0)), encryption.encrypt(np.full(5, 3.0))]
+    assert np.allclose(asyncio.run(secure.aggregate(updates, [100, 300])), 2.5)
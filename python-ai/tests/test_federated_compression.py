@@ -0,0 +1,151 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.federated_aggregation import StreamingAggregator, SummationMethod
+from services.federated_compression import (
+    CompressionConfig, CompressionReport, UpdateCompressor, decompress_sparse, densify
+)
+from services.federated_health_learning import FederatedHealthLearning, HealthInstitution
+
+def _delta(seed=0, shape=(200, 100)):
+    return {"layer1": np.random.default_rng(seed).normal(0, 0.01, shape), "output": np.full((10, 1), 0.5)}
+
+def test_compressed_payload_is_much_smaller_than_dense():
+    delta = _delta()
+    report = CompressionReport()
+    payload = UpdateCompressor(CompressionConfig(enabled=True, top_k_ratio=0.05), seed=1).compress("a", delta, report)
+
+    summary = report.to_dict()
+    assert summary["dense_bytes"] == sum(value.nbytes for value in delta.values())
+    assert summary["compression_ratio"] > 20
+    assert len(payload) == summary["compressed_bytes"]
+
+    sparse = decompress_sparse(payload)
+    shape, indices, values = sparse["layer1"]
+    assert shape == (200, 100) and indices.size == 1000
+    # The largest-magnitude entries are the ones sent
+    threshold = np.sort(np.abs(delta["layer1"]).ravel())[-1000]
+    assert np.all(np.abs(delta["layer1"].ravel()[indices]) >= threshold)
+
+def test_stochastic_quantization_is_unbiased():
+    delta = {"w": np.linspace(-1, 1, 1000)}
+    compressor = UpdateCompressor(CompressionConfig(enabled=True, top_k_ratio=1.0, error_feedback=False), seed=2)
+    decoded = [densify(decompress_sparse(compressor.compress("a", delta)))["w"] for _ in range(400)]
+
+    step = 2 / 255
+    assert np.all(np.abs(decoded[0] - delta["w"]) <= step + 1e-12)
+    assert np.abs(np.mean(decoded, axis=0) - delta["w"]).max() < step / 5
+
+def test_seeded_quantization_does_not_depend_on_participant_order():
+    config = CompressionConfig(enabled=True, top_k_ratio=0.5, error_feedback=False)
+    forward, backward = UpdateCompressor(config, seed=3), UpdateCompressor(config, seed=3)
+    payloads = {pid: forward.compress(pid, _delta()) for pid in ("a", "b")}
+
+    assert backward.compress("b", _delta()) == payloads["b"]
+    assert backward.compress("a", _delta()) == payloads["a"]
+    assert forward.compress("a", _delta()) != payloads["a"]
+
+def test_error_feedback_delivers_small_updates_over_rounds():
+    delta = {"w": np.array([1.0, 0.01, 0.01, 0.01])}
+    config = CompressionConfig(enabled=True, top_k_ratio=0.25, quantize_bits=0)
+
+    def send(compressor):
+        payload = compressor.compress("a", delta)
+        compressor.commit("a")
+        return densify(decompress_sparse(payload))["w"]
+
+    delivered = {}
+    for error_feedback in (True, False):
+        compressor = UpdateCompressor(CompressionConfig(**{**config.__dict__, "error_feedback": error_feedback}))
+        delivered[error_feedback] = sum(send(compressor) for _ in range(200))
+
+    # Without feedback the small entries never win a top-1 slot
+    assert np.all(delivered[False][1:] == 0)
+    # With it every entry arrives, short by a residual no larger than the biggest single delta
+    assert np.all(delivered[True][1:] > 0)
+    assert np.all(np.abs(delivered[True] - delta["w"] * 200) <= np.abs(delta["w"]).max() + 1e-6)
+
+def test_residuals_are_kept_per_model_and_only_for_received_updates():
+    delta = {"data": np.array([1.0, 0.5])}
+    compressor = UpdateCompressor(CompressionConfig(enabled=True, top_k_ratio=0.5, quantize_bits=0))
+
+    def sent(model_id):
+        return densify(decompress_sparse(compressor.compress("a", delta, model_id=model_id)))["data"]
+
+    assert sent("m1").tolist() == [1.0, 0.0]
+    compressor.commit("a", "m1")
+    # The committed residual of m1 is not added to m2's identically named tensor
+    assert sent("m2").tolist() == [1.0, 0.0]
+    compressor.discard("a", "m2")
+
+    # A dropped update leaves the residual in place, so it is sent again
+    assert sent("m1").tolist() == [0.0, 1.0]
+    compressor.discard("a", "m1")
+    assert sent("m1").tolist() == [0.0, 1.0]
+    compressor.commit("a", "m1")
+    assert sent("m1").tolist() == [2.0, 0.0]
+
+def test_dropped_participant_keeps_its_residual_for_the_next_round(monkeypatch, federated_service):
+    engine = FederatedHealthLearning(compression=CompressionConfig(enabled=True, top_k_ratio=0.1))
+    service = federated_service(2, patient_counts=[100, 100], engine=engine)
+    compressor = service.engine.compressor
+    participant = service.engine.get_participant("clinic_1")
+    original = participant.train_local_update
+
+    def lost(*args):
+        original(*args)
+        raise RuntimeError("connection lost")
+
+    monkeypatch.setattr(participant, "train_local_update", lost)
+    result = asyncio.run(service.start_training_round("m1", ["clinic_0", "clinic_1"]))
+
+    assert result["status"] == "completed"
+    assert ("m1", "clinic_0") in compressor._residuals
+    assert ("m1", "clinic_1") not in compressor._residuals and not compressor._staged
+
+@pytest.mark.parametrize("summation", list(SummationMethod))
+def test_sparse_aggregation_matches_dense_aggregation(summation):
+    compressor = UpdateCompressor(CompressionConfig(enabled=True, top_k_ratio=0.1), seed=3)
+    payloads = [(compressor.compress(f"p{i}", _delta(i)), 100 * (i + 1)) for i in range(7)]
+
+    sparse, dense = StreamingAggregator(summation), StreamingAggregator(summation)
+    for payload, weight in payloads:
+        sparse.add_sparse(decompress_sparse(payload), weight, len(payload))
+        dense.add(densify(decompress_sparse(payload)), weight)
+
+    for name, value in dense.result().items():
+        assert np.allclose(sparse.result()[name], value, rtol=0, atol=1e-15)
+    assert sparse.stats.updates == 7 and sparse.stats.bytes_received == sum(len(p) for p, _ in payloads)
+
+def test_service_round_applies_compressed_deltas_and_reports_them(federated_service):
+    service = federated_service(3, model_id=None, patient_counts=[100] * 3,
+                                engine=FederatedHealthLearning(compression=CompressionConfig(enabled=True, top_k_ratio=0.1)))
+    # The check bounds the applied DP update; upload noise of scale 0.1 per entry would swamp it
+    service.engine.encryption.noise_scale = 0.0
+    model = service.initialize_global_model("default", "m1")
+    before = model.global_weights["weights"].copy()
+
+    result = asyncio.run(service.start_training_round("m1", ["clinic_0", "clinic_1", "clinic_2"]))
+
+    assert result["status"] == "completed"
+    assert result["compression"]["updates"] == 3 and result["compression"]["compression_ratio"] > 5
+    change = model.global_weights["weights"] - before
+    assert 0 < np.count_nonzero(change) <= 3 * 100
+    assert np.abs(change).max() < 0.1
+
+def test_health_learning_round_with_compression(monkeypatch):
+    monkeypatch.setenv("FEDERATED_COMPRESSION", "true")
+    system = FederatedHealthLearning()
+    for index in range(2):
+        system.add_participant(HealthInstitution(
+            institution_id=f"hospital_{index}", institution_type="hospital", location="Kitwe",
+            data_types=["ehr"], patient_count=1000, privacy_level="high",
+            compute_capacity="high", certification=["HIPAA"]
+        ))
+
+    model = asyncio.run(system.train_federated_health_model("default", {"max_rounds": 1, "local_epochs": 2}))
+
+    assert model.version == 2
+    assert system.training_rounds[0]["compression"]["compression_ratio"] > 5
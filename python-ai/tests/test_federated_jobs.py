@@ -0,0 +1,116 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import federated
+from services.federated_jobs import FederatedRoundManager
+from services.federated_learning_service import FederatedLearningService
+from services.federated_state import FileStateBackend
+
+def test_round_runs_in_background_and_reports_progress(federated_service):
+    service = federated_service()
+
+    async def run():
+        manager = FederatedRoundManager(service)
+        job = manager.submit("m1", ["clinic_0", "clinic_1", "clinic_2", "missing"])
+        assert job.status == "queued" and job.progress == 0.0
+        await job._task
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == "completed" and job.progress == 1.0
+    details = job.details()
+    assert details["participants"]["clinic_0"]["status"] == "received"
+    assert details["participants"]["clinic_0"]["seconds"] is not None
+    assert details["participants"]["missing"]["status"] == "unknown"
+    assert details["result"]["new_version"] == 2
+
+def test_cancelled_round_leaves_model_unchanged(monkeypatch, federated_service):
+    service = federated_service()
+    for pid in ("clinic_0", "clinic_1"):
+        participant = service.engine.get_participant(pid)
+        original = participant.train_local_update
+        monkeypatch.setattr(participant, "train_local_update",
+                            lambda *args, original=original: time.sleep(0.3) or original(*args))
+
+    async def run():
+        manager = FederatedRoundManager(service)
+        job = manager.submit("m1", ["clinic_0", "clinic_1"])
+        await asyncio.sleep(0.05)
+        assert job.status == "running"
+        assert manager.cancel(job.job_id)
+        with pytest.raises(asyncio.CancelledError):
+            await job._task
+        manager.shutdown()
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == "cancelled"
+    assert {p.status for p in job.participants.values()} == {"cancelled"}
+    assert service.global_models["m1"].version == 1
+
+def test_cancel_after_the_update_is_applied_completes_the_round(tmp_path, monkeypatch, federated_service):
+    service = federated_service()
+    service.state = FileStateBackend(str(tmp_path))
+    service.initialize_global_model("default", "m2")
+    checkpointing = threading.Event()
+    checkpoint = service._checkpoint
+
+    def slow_checkpoint(*args):
+        checkpointing.set()
+        time.sleep(0.3)
+        checkpoint(*args)
+
+    monkeypatch.setattr(service, "_checkpoint", slow_checkpoint)
+
+    async def run():
+        manager = FederatedRoundManager(service)
+        job = manager.submit("m2", ["clinic_0", "clinic_1"])
+        while not checkpointing.is_set():
+            await asyncio.sleep(0.01)
+        assert manager.cancel(job.job_id)
+        await job._task
+        return job
+
+    job = asyncio.run(run())
+
+    assert job.status == "completed" and job.result["new_version"] == 2
+    assert service.global_models["m2"].version == 2
+    assert FederatedLearningService(state=FileStateBackend(str(tmp_path))).get_model("m2").version == 2
+
+def test_rounds_for_one_model_run_in_order_and_history_is_bounded(federated_service):
+    service = federated_service()
+
+    async def run():
+        manager = FederatedRoundManager(service, max_history=2)
+        jobs = [manager.submit("m1", ["clinic_0"]) for _ in range(3)]
+        await asyncio.gather(*(job._task for job in jobs))
+        return manager, jobs
+
+    manager, jobs = asyncio.run(run())
+
+    assert [job.result["new_version"] for job in jobs] == [2, 3, 4]
+    assert [job.job_id for job in manager.list_jobs()] == [jobs[1].job_id, jobs[2].job_id]
+    with pytest.raises(ValueError):
+        manager.submit("unknown", ["clinic_0"])
+
+@pytest.mark.parametrize("override", [{"deadline": "soon"}, {"quorum": 1.5}, {"quorum": 0}, {"deadline": -1}, {"quorum_grace": -2}])
+def test_invalid_round_policy_overrides_are_rejected(override, federated_service):
+    app = FastAPI()
+    app.include_router(federated.router)
+    app.state.federated = federated_service()
+    app.state.federated_rounds = FederatedRoundManager(app.state.federated)
+
+    with TestClient(app) as client:
+        response = client.post("/training/start_round", json={"model_id": "m1", "participant_ids": ["clinic_0"], **override})
+        assert response.status_code == 422
+        assert next(iter(override)) in response.json()["detail"]
+
+        accepted = client.post("/training/start_round", json={"model_id": "m1", "participant_ids": ["clinic_0"], "quorum": 1, "quorum_grace": 0})
+        assert accepted.status_code == 202
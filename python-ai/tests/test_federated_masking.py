@@ -0,0 +1,101 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.federated_health_learning import FederatedHealthLearning, HealthInstitution
+from services.federated_masking import (
+    MaskedAggregator, MaskingParticipant, MaskingRound, decode_fixed_point, encode_fixed_point
+)
+from services.federated_wire import decode_tensors
+
+def _round(count, round_id="r1"):
+    participants = {f"site_{index:02d}": MaskingParticipant(f"site_{index:02d}") for index in range(count)}
+    masking_round = MaskingRound(round_id, {pid: p.public_key for pid, p in participants.items()})
+    return participants, masking_round
+
+def _updates(participants, seed=0):
+    rng = np.random.default_rng(seed)
+    return {pid: ({"layer1": rng.normal(0, 0.1, (30, 20)), "bias": rng.normal(0, 0.1, 20)}, float(rng.integers(100, 5000)))
+            for pid in participants}
+
+def _expected(updates, pids):
+    weights = [updates[pid][1] for pid in pids]
+    return {name: np.average([updates[pid][0][name] for pid in pids], axis=0, weights=weights)
+            for name in ("layer1", "bias")}
+
+def test_fixed_point_round_trips_negative_values():
+    values = np.array([-1.5, -1e-6, 0.0, 3.25, 1234.5678])
+    assert np.allclose(decode_fixed_point(encode_fixed_point(values, 24), 24), values, atol=2 ** -24)
+
+def test_masks_cancel_in_the_server_sum():
+    participants, masking_round = _round(6)
+    updates = _updates(participants)
+    aggregator = MaskedAggregator(masking_round)
+    for pid, participant in participants.items():
+        aggregator.add(participant.mask(masking_round, *updates[pid]))
+
+    result = aggregator.result([participant.reveal(masking_round, []) for participant in participants.values()])
+
+    for name, expected in _expected(updates, list(participants)).items():
+        assert np.allclose(result[name], expected, rtol=0, atol=1e-6)
+    assert aggregator.stats.updates == 6 and aggregator.stats.parameters == 620
+
+def test_a_single_masked_update_reveals_nothing_useful():
+    participants, masking_round = _round(3)
+    tensors, weight = _updates(participants)["site_00"]
+    payload = participants["site_00"].mask(masking_round, tensors, weight)
+
+    masked = decode_tensors(payload)["masked"]
+    plain = encode_fixed_point(np.concatenate([tensors["layer1"].ravel(), tensors["bias"]]) * weight, 24)
+    assert not np.any(masked == plain)
+    # Masked words are spread over the whole uint64 range
+    assert masked.min() < 2 ** 60 and masked.max() > 2 ** 64 - 2 ** 60
+
+def test_dropped_participants_are_recovered_from_revealed_seeds():
+    participants, masking_round = _round(5)
+    updates = _updates(participants, seed=1)
+    survivors = ["site_00", "site_02", "site_03"]
+    aggregator = MaskedAggregator(masking_round)
+    for pid in survivors:
+        aggregator.add(participants[pid].mask(masking_round, *updates[pid]))
+    # The dropped participants masked their updates too, but they never arrive
+    for pid in ("site_01", "site_04"):
+        participants[pid].mask(masking_round, *updates[pid])
+
+    assert aggregator.dropped() == ["site_01", "site_04"]
+    with pytest.raises(ValueError, match="Cannot unmask"):
+        aggregator.result([])
+
+    result = aggregator.result([participants[pid].reveal(masking_round, aggregator.dropped()) for pid in survivors])
+    for name, expected in _expected(updates, survivors).items():
+        assert np.allclose(result[name], expected, rtol=0, atol=1e-6)
+
+def test_updates_for_another_round_or_sent_twice_are_rejected():
+    participants, masking_round = _round(3)
+    tensors, weight = _updates(participants)["site_01"]
+    aggregator = MaskedAggregator(masking_round)
+
+    with pytest.raises(ValueError, match="round"):
+        aggregator.add(participants["site_01"].mask(MaskingRound("r2", masking_round.public_keys), tensors, weight))
+    aggregator.add(participants["site_01"].mask(masking_round, tensors, weight))
+    with pytest.raises(ValueError, match="Duplicate"):
+        aggregator.add(participants["site_01"].mask(masking_round, tensors, weight))
+    with pytest.raises(ValueError, match="not selected"):
+        aggregator.add(MaskingParticipant("intruder").mask(masking_round, tensors, weight))
+
+def test_health_learning_rounds_use_masked_aggregation(monkeypatch):
+    monkeypatch.setenv("FEDERATED_SECURE_AGGREGATION", "masking")
+    system = FederatedHealthLearning()
+    for index in range(3):
+        system.add_participant(HealthInstitution(
+            institution_id=f"hospital_{index}", institution_type="hospital", location="Kitwe",
+            data_types=["ehr"], patient_count=1000 + index, privacy_level="high",
+            compute_capacity="high", certification=["HIPAA"]
+        ))
+
+    model = asyncio.run(system.train_federated_health_model("default", {"max_rounds": 1, "local_epochs": 2}))
+
+    assert model.version == 2
+    assert system.training_rounds[0]["aggregation"]["summation"] == "masked"
+    assert system.get_privacy_report()["privacy_mechanisms"][1] == "pairwise_masking"
@@ -0,0 +1,79 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.federated_health_learning import DifferentialPrivacy, FederatedHealthLearning, HealthInstitution
+from services.federated_privacy import BatchedDPEngine, RDPAccountant, make_generator
+
+def test_clip_matches_per_row_clipping():
+    batch = np.random.default_rng(0).normal(0, 1, (50, 300)) * np.linspace(0.001, 0.2, 50)[:, None]
+    engine = BatchedDPEngine(clip_norm=1.0)
+    dp = DifferentialPrivacy()
+
+    clipped = engine.clip(batch)
+
+    expected = np.stack([dp.clip_gradients(row) for row in batch])
+    assert np.allclose(clipped, expected, rtol=1e-12, atol=0)
+    assert np.all(np.linalg.norm(clipped, axis=1) <= 1.0 + 1e-12)
+    assert engine.last_clip_stats.clipped == int(np.count_nonzero(np.linalg.norm(batch, axis=1) > 1.0))
+
+def test_privatize_is_the_noisy_mean_of_clipped_rows():
+    batch = np.random.default_rng(1).normal(0, 1, (64, 500)).astype(np.float32)
+    noiseless = BatchedDPEngine(clip_norm=0.5, noise_multiplier=0.0)
+    assert np.allclose(noiseless.privatize(batch), noiseless.clip(batch).mean(axis=0), atol=1e-6)
+
+    engine = BatchedDPEngine(clip_norm=0.5, noise_multiplier=2.0, seed=3)
+    noise = engine.privatize(np.zeros((64, 200_000), dtype=np.float32))
+    assert noise.dtype == np.float32
+    # Noise on the sum has std clip_norm * noise_multiplier, so the mean's is that over the batch size
+    assert noise.std() == pytest.approx(0.5 * 2.0 / 64, rel=0.01)
+
+@pytest.mark.parametrize("bit_generator", ["pcg64", "philox"])
+def test_seeded_engines_are_reproducible(bit_generator):
+    batch = np.random.default_rng(2).normal(0, 1, (8, 16))
+    first = BatchedDPEngine(seed=7, bit_generator=bit_generator).privatize(batch)
+    second = BatchedDPEngine(seed=7, bit_generator=bit_generator).privatize(batch)
+    assert np.array_equal(first, second)
+    with pytest.raises(ValueError):
+        make_generator(0, "mt19937")
+
+def test_rdp_accountant_matches_gaussian_mechanism_and_composes_sublinearly():
+    # Without subsampling the Gaussian mechanism has RDP order / (2 sigma^2) at every order
+    accountant = RDPAccountant()
+    accountant.step(noise_multiplier=2.0, sample_rate=1.0, steps=3)
+    assert np.allclose(accountant.rdp, 3 * np.asarray(accountant.orders) / 8)
+
+    # DP-SGD on MNIST (batch 256 of 60000, sigma 1.1, 60 epochs) is reported at epsilon 3.01 with
+    # the classic RDP conversion; the tighter conversion used here lands a little below that
+    subsampled = RDPAccountant()
+    subsampled.step(noise_multiplier=1.1, sample_rate=256 / 60000, steps=60 * 60000 // 256)
+    orders = np.asarray(subsampled.orders, dtype=np.float64)
+    assert np.min(subsampled.rdp + np.log(1e5) / (orders - 1)) == pytest.approx(3.01, abs=0.01)
+    epsilon, _ = subsampled.get_epsilon(1e-5)
+    assert 2.4 < epsilon < 3.01
+
+    ten_times = RDPAccountant()
+    ten_times.step(noise_multiplier=1.1, sample_rate=256 / 60000, steps=600 * 60000 // 256)
+    assert ten_times.get_epsilon(1e-5)[0] < 5 * epsilon
+
+def test_participants_spend_budget_through_the_accountant():
+    dp = DifferentialPrivacy()
+    assert dp.calculate_privacy_cost(5, sample_rate=0.05) < 5 * dp.epsilon
+
+    system = FederatedHealthLearning()
+    for index in range(2):
+        system.add_participant(HealthInstitution(
+            institution_id=f"clinic_{index}", institution_type="clinic", location="Lusaka",
+            data_types=["ehr"], patient_count=2000, privacy_level="high",
+            compute_capacity="medium", certification=["HIPAA"]
+        ))
+    asyncio.run(system.train_federated_health_model("default", {"max_rounds": 2, "local_epochs": 3, "convergence_threshold": -1}))
+
+    participant = system.participants[0]
+    assert participant.accountant.steps == 6
+    assert participant.privacy_budget_used == pytest.approx(participant.accountant.get_epsilon(dp.delta)[0])
+    assert sum(entry["privacy_cost"] for entry in participant.training_history) == pytest.approx(participant.privacy_budget_used)
+    # Only metadata is kept per round, not the uploaded payloads
+    assert len(participant.training_history) == 2
+    assert not any(isinstance(value, bytes) for entry in participant.training_history for value in entry.values())
@@ -0,0 +1,131 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from services.federated_learning_service import FederatedLearningService
+from services.federated_registry import LazyWeights, ModelRegistry
+
+def _versions(count, seed=0):
+    rng = np.random.default_rng(seed)
+    weights = {"layer1": rng.normal(0, 0.1, (200, 50)), "output": rng.normal(0, 0.1, (50, 1))}
+    versions = [weights]
+    for _ in range(count - 1):
+        weights = {name: values.copy() for name, values in weights.items()}
+        # Sparse change in one tensor, the other left as is
+        changed = rng.choice(weights["layer1"].size, 100, replace=False)
+        weights["layer1"].reshape(-1)[changed] += rng.normal(0, 0.01, 100)
+        versions.append(weights)
+    # A dense change in the last version
+    versions[-1] = {name: values + 1e-3 for name, values in versions[-1].items()}
+    return versions
+
+def test_versions_round_trip_exactly_through_snapshots_and_deltas(tmp_path):
+    registry = ModelRegistry(str(tmp_path), snapshot_interval=4)
+    versions = _versions(7)
+    previous = None
+    for number, weights in enumerate(versions, start=1):
+        registry.save_version("m1", number, weights, {"model_type": "default"}, previous, round_id=f"r{number}")
+        previous = weights
+
+    history = registry.history("m1")
+    assert [entry["kind"] for entry in history] == ["full", "delta", "delta", "delta", "full", "delta", "delta"]
+    # A sparse delta costs a fraction of a snapshot
+    assert history[1]["nbytes"] < history[0]["nbytes"] / 20
+    assert history[6]["nbytes"] >= history[0]["nbytes"] * 0.9
+
+    for number, weights in enumerate(versions, start=1):
+        loaded = registry.load_weights("m1", number)
+        for name, values in weights.items():
+            assert np.array_equal(loaded[name], values)
+    assert registry.load_metadata("m1")["version"] == 7
+
+def test_snapshots_are_memory_mapped_views(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    weights = _versions(1)[0]
+    registry.save_version("m1", 1, weights, {"model_type": "default"})
+
+    loaded = registry.load_weights("m1")
+    assert not loaded["layer1"].flags.writeable and not loaded["layer1"].flags.owndata
+    assert np.array_equal(loaded["layer1"], weights["layer1"])
+
+def test_registry_rejects_unsafe_model_ids(tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    with pytest.raises(ValueError):
+        registry.save_version("../escape", 1, {"w": np.zeros(3)}, {})
+    with pytest.raises(KeyError):
+        registry.history("missing")
+
+def test_old_snapshots_and_their_deltas_are_pruned(tmp_path):
+    registry = ModelRegistry(str(tmp_path), snapshot_interval=2, retain_snapshots=2)
+    versions = _versions(7)
+    previous = None
+    for number, weights in enumerate(versions, start=1):
+        registry.save_version("m1", number, weights, {"model_type": "default"}, previous)
+        previous = weights
+
+    # Snapshots at v1, v3, v5 and v7; only the last two and the delta between them remain
+    assert [entry["version"] for entry in registry.history("m1")] == [5, 6, 7]
+    assert sorted(path.name for path in (tmp_path / "m1").glob("*.bvtw")) == [f"v{n:08d}.bvtw" for n in (5, 6, 7)]
+    assert np.array_equal(registry.load_weights("m1", 6)["layer1"], versions[5]["layer1"])
+    with pytest.raises(KeyError):
+        registry.load_weights("m1", 4)
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+def test_new_model_checkpoint_is_written_off_the_event_loop(tmp_path, monkeypatch):
+    monkeypatch.setenv("FEDERATED_REGISTRY_PATH", str(tmp_path))
+    service = FederatedLearningService()
+    writers = []
+    checkpoint = service._checkpoint
+    monkeypatch.setattr(service, "_checkpoint", lambda model: writers.append(_on_event_loop()) or checkpoint(model))
+
+    model = asyncio.run(service.create_global_model("default", "m1"))
+
+    assert writers == [False]
+    assert service.registry.history("m1")[0]["version"] == model.version == 1
+    with pytest.raises(ValueError):
+        asyncio.run(service.create_global_model("default", "m1"))
+
+def test_service_resumes_from_the_registry_after_a_restart(tmp_path, monkeypatch, federated_service):
+    monkeypatch.setenv("FEDERATED_REGISTRY_PATH", str(tmp_path))
+    monkeypatch.setenv("FEDERATED_SNAPSHOT_INTERVAL", "2")
+    service = federated_service(model_type="disease_prediction")
+    for _ in range(3):
+        result = asyncio.run(service.start_training_round("m1", ["clinic_0", "clinic_1", "clinic_2"]))
+        assert result["status"] == "completed"
+    trained = service.global_models["m1"]
+
+    restarted = FederatedLearningService()
+    asyncio.run(restarted.initialize())
+    model = restarted.global_models["m1"]
+
+    assert sorted(restarted.participants) == ["clinic_0", "clinic_1", "clinic_2"]
+    assert restarted.participants["clinic_2"].patient_count == 300
+    assert isinstance(model.global_weights, LazyWeights) and not model.global_weights.loaded
+    assert model.version == 4 and model.model_type == "disease_prediction"
+    status = restarted.get_model_status("m1")
+    assert [entry["version"] for entry in status["versions"]] == [1, 2, 3, 4]
+    assert [entry["kind"] for entry in status["versions"]] == ["full", "delta", "full", "delta"]
+    assert sorted(status["versions"][-1]["participants"]) == ["clinic_0", "clinic_1", "clinic_2"]
+    for name, values in trained.global_weights.items():
+        assert np.array_equal(model.global_weights[name], values)
+
+    result = asyncio.run(restarted.start_training_round("m1", ["clinic_0", "clinic_1"]))
+    assert result["new_version"] == 5
+    assert restarted.registry.history("m1")[-1]["kind"] == "full"
+
+def test_history_is_kept_in_memory_without_a_registry(monkeypatch, federated_service):
+    monkeypatch.delenv("FEDERATED_REGISTRY_PATH", raising=False)
+    service = federated_service(2)
+    asyncio.run(service.start_training_round("m1", ["clinic_0", "clinic_1"]))
+
+    assert service.registry is None
+    versions = service.get_model_status("m1")["versions"]
+    assert [entry["version"] for entry in versions] == [1, 2]
+    assert "versions" not in service.list_models()[0]
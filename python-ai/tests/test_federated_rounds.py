@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from services.federated_health_learning import FederatedHealthLearning, HealthInstitution
+from services.federated_rounds import RoundCollector, RoundPolicy
+
+def _sleeper(seconds, result=None):
+    def job():
+        time.sleep(seconds)
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return job
+
+def _collect(jobs, policy):
+    received = {}
+    collection = asyncio.run(RoundCollector(max_workers=8).collect(jobs, received.__setitem__, policy))
+    return collection, received
+
+def test_round_takes_about_as_long_as_the_slowest_participant():
+    jobs = {f"p{i}": _sleeper(0.2, i) for i in range(6)}
+    collection, received = _collect(jobs, RoundPolicy(deadline=5, quorum=1.0))
+
+    assert collection.quorum_met and len(received) == 6
+    assert collection.seconds < 0.6
+
+def test_late_and_failed_updates_are_dropped():
+    jobs = {"fast": _sleeper(0.01, 1), "slow": _sleeper(1.0, 2), "broken": _sleeper(0.01, RuntimeError("no data"))}
+    collection, received = _collect(jobs, RoundPolicy(deadline=0.3, quorum=0.3))
+
+    assert received == {"fast": 1}
+    assert collection.late == ["slow"] and "broken" in collection.failed
+    assert collection.quorum_met and collection.seconds < 0.6
+
+def test_stragglers_get_only_the_grace_period_after_quorum():
+    jobs = {"a": _sleeper(0.01), "b": _sleeper(0.01), "c": _sleeper(1.0)}
+    collection, _ = _collect(jobs, RoundPolicy(deadline=10, quorum=0.5, quorum_grace=0.1))
+
+    assert collection.late == ["c"]
+    assert collection.seconds < 0.5
+
+def test_updates_are_folded_off_the_event_loop():
+    threads = []
+    received = {}
+
+    def on_update(participant_id, result):
+        threads.append(threading.current_thread())
+        received[participant_id] = result
+
+    async def run():
+        await RoundCollector(max_workers=4).collect({f"p{i}": _sleeper(0.01, i) for i in range(4)}, on_update, RoundPolicy())
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(run())
+
+    assert received == {f"p{i}": i for i in range(4)}
+    assert loop_thread not in threads and len(set(threads)) == 1
+
+def test_round_memory_stays_flat_as_participants_grow():
+    def peak(count):
+        system = FederatedHealthLearning(secure_aggregation="fernet")
+        system.round_collector.max_workers = 2
+        for index in range(count):
+            system.add_participant(HealthInstitution(
+                institution_id=f"clinic_{index}", institution_type="clinic", location="Lusaka",
+                data_types=["ehr"], patient_count=100, privacy_level="high",
+                compute_capacity="medium", certification=[]
+            ))
+        model = system.initialize_global_model("default", "m1")
+        model.global_weights = {"weights": np.zeros((200, 100))}
+        tracemalloc.start()
+        result = asyncio.run(system.run_round(model, system.participants, RoundPolicy(quorum=1.0), local_epochs=1))
+        _, peak_bytes = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        system.round_collector.shutdown()
+        assert result["status"] == "completed"
+        return peak_bytes
+
+    # Each received update is released once folded rather than held until the round ends
+    assert peak(32) < 1.1 * peak(8)
+
+def test_round_without_quorum_leaves_the_model_unchanged(monkeypatch, federated_service):
+    service = federated_service(4)
+
+    def lost(*args):
+        raise RuntimeError("connection lost")
+
+    for index in range(1, 4):
+        monkeypatch.setattr(service.engine.get_participant(f"clinic_{index}"), "train_local_update", lost)
+    result = asyncio.run(service.start_training_round("m1", [f"clinic_{i}" for i in range(4)], RoundPolicy(quorum=0.75)))
+
+    assert result["status"] == "failed"
+    assert service.global_models["m1"].version == 1
+
+    result = asyncio.run(service.start_training_round("m1", [f"clinic_{i}" for i in range(4)], RoundPolicy(quorum=0.25)))
+    assert result["status"] == "completed" and result["collection"]["received"] == ["clinic_0"]
+
+def test_health_learning_rounds_train_participants_concurrently():
+    system = FederatedHealthLearning()
+    for index in range(3):
+        system.add_participant(HealthInstitution(
+            institution_id=f"hospital_{index}", institution_type="hospital", location="Kitwe",
+            data_types=["ehr"], patient_count=1000, privacy_level="high",
+            compute_capacity="high", certification=["HIPAA"]
+        ))
+
+    model = asyncio.run(system.train_federated_health_model("default", {"max_rounds": 1, "local_epochs": 2}))
+
+    assert model.version == 2
+    assert sorted(system.training_rounds[0]["collection"]["received"]) == ["hospital_0", "hospital_1", "hospital_2"]
@@ -0,0 +1,144 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from services.federated_compression import CompressionConfig
+from services.federated_health_learning import FederatedHealthLearning
+from services.federated_jobs import FederatedRoundManager
+from services.federated_learning_service import FederatedLearningService
+from services.federated_state import FileStateBackend, StateBackend, create_state_backend
+
+def _worker(root):
+    return FederatedLearningService(state=FileStateBackend(str(root)))
+
+def test_workers_sharing_a_file_backend_see_the_same_federation(tmp_path, register_clinics):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    register_clinics(first, ["clinic_0"])
+    register_clinics(second, ["clinic_1"])
+    first.initialize_global_model("default", "m1")
+
+    assert [p["institution_id"] for p in first.list_participants()] == ["clinic_0", "clinic_1"]
+    with pytest.raises(ValueError):
+        second.initialize_global_model("default", "m1")
+
+    result = asyncio.run(second.start_training_round("m1", ["clinic_0", "clinic_1"]))
+    assert result["status"] == "completed" and result["new_version"] == 2
+    assert first.get_model_status("m1")["version"] == 2
+
+    result = asyncio.run(first.start_training_round("m1", ["clinic_0"]))
+    assert result["new_version"] == 3
+    assert [entry["version"] for entry in second.get_model_status("m1")["versions"]] == [1, 2, 3]
+
+def test_concurrent_rounds_on_two_workers_do_not_overwrite_each_other(tmp_path, register_clinics):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    register_clinics(first, ["clinic_0", "clinic_1"])
+    first.initialize_global_model("default", "m1")
+    second.list_models()
+
+    async def run():
+        return await asyncio.gather(
+            first.start_training_round("m1", ["clinic_0", "clinic_1"]),
+            second.start_training_round("m1", ["clinic_0", "clinic_1"])
+        )
+
+    results = asyncio.run(run())
+
+    assert sorted(result["new_version"] for result in results) == [2, 3]
+    assert [entry["version"] for entry in first.registry.history("m1")] == [1, 2, 3]
+
+def test_concurrent_registrations_and_model_creation_are_not_lost(tmp_path, register_clinics):
+    workers = [_worker(tmp_path) for _ in range(4)]
+
+    def register(index):
+        register_clinics(workers[index % 4], [f"clinic_{index}_{n}" for n in range(5)])
+
+    def create(worker):
+        try:
+            return worker.initialize_global_model("default", "m1")
+        except ValueError:
+            return None
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(register, range(8)))
+        created = [model for model in pool.map(create, workers) if model is not None]
+
+    assert len(_worker(tmp_path).list_participants()) == 40
+    assert len(created) == 1
+    assert [entry["version"] for entry in workers[0].registry.history("m1")] == [1]
+
+def test_privacy_spend_survives_restarts_and_adds_up_across_workers(tmp_path, register_clinics):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    # Equal data sizes, so both clinics spend the same budget per round
+    register_clinics(first, ["clinic_0", "clinic_1"], patient_counts=[200, 200])
+    first.initialize_global_model("default", "m1")
+
+    asyncio.run(first.start_training_round("m1", ["clinic_0", "clinic_1"]))
+    spent = first.engine.get_participant("clinic_0").privacy_budget_used
+    assert spent > 0
+
+    # A restarted worker picks up where the first left off
+    restarted = _worker(tmp_path)
+    asyncio.run(restarted.initialize())
+    assert restarted.engine.get_participant("clinic_0").privacy_budget_used == pytest.approx(spent)
+
+    # A round on a worker created before the first round still composes on top of it
+    asyncio.run(second.start_training_round("m1", ["clinic_0"]))
+    accountant = second.engine.get_participant("clinic_0").accountant
+    assert accountant.steps == 2 * first.engine.get_participant("clinic_0").accountant.steps
+    assert second.engine.get_participant("clinic_0").privacy_budget_used > spent
+    assert second.engine.get_participant("clinic_1").privacy_budget_used == pytest.approx(spent)
+
+def test_compression_residuals_are_shared_between_workers(tmp_path, register_clinics):
+    def worker():
+        engine = FederatedHealthLearning(compression=CompressionConfig(enabled=True, top_k_ratio=0.1))
+        return FederatedLearningService(engine, FileStateBackend(str(tmp_path)))
+
+    first = worker()
+    register_clinics(first, ["clinic_0", "clinic_1"])
+    first.initialize_global_model("default", "m1")
+    asyncio.run(first.start_training_round("m1", ["clinic_0", "clinic_1"]))
+    stored = first.engine.compressor.residuals("m1")
+    assert set(stored) == {"clinic_0", "clinic_1"}
+
+    second = worker()
+    second._refresh()
+    second._restore_round_state("m1", [second.engine.get_participant("clinic_0")])
+    restored = second.engine.compressor.residuals("m1")
+    for name, values in stored["clinic_0"].items():
+        assert np.array_equal(restored["clinic_0"][name], values)
+
+def test_round_jobs_are_visible_from_every_worker(tmp_path, register_clinics):
+    first, second = _worker(tmp_path), _worker(tmp_path)
+    register_clinics(first, ["clinic_0", "clinic_1"])
+    first.initialize_global_model("default", "m1")
+
+    async def run():
+        manager = FederatedRoundManager(first)
+        job = manager.submit("m1", ["clinic_0", "clinic_1", "missing"])
+        await job._task
+        return job
+
+    job = asyncio.run(run())
+    other = FederatedRoundManager(second)
+
+    details = other.job_details(job.job_id)
+    assert details["status"] == "completed" and details["result"]["new_version"] == 2
+    assert details["participants"]["missing"]["status"] == "unknown"
+    assert [summary["job_id"] for summary in other.job_summaries("m1")] == [job.job_id]
+    assert other.job_details("unknown") is None and not other.cancel(job.job_id)
+
+def test_memory_backend_is_the_default_and_lists_participants(monkeypatch, register_clinics):
+    monkeypatch.delenv("FEDERATED_REGISTRY_PATH", raising=False)
+    monkeypatch.delenv("FEDERATED_STATE_BACKEND", raising=False)
+    service = FederatedLearningService()
+    register_clinics(service, ["clinic_0"])
+
+    assert type(service.state) is StateBackend and service.registry is None
+    participant = service.list_participants()[0]
+    assert participant["patient_count"] == 100 and participant["privacy_level"] == "high"
+
+    monkeypatch.setenv("FEDERATED_STATE_BACKEND", "file")
+    with pytest.raises(ValueError):
+        create_state_backend()
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from services.federated_health_learning import HomomorphicEncryption
+from services.federated_wire import ALIGNMENT, Quantization, decode_payload, decode_tensors, encode_tensors, read_metadata
+
+def _weights(seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        "layer1": rng.normal(0, 0.1, (100, 50)),
+        "output": rng.normal(0, 0.1, (50, 1)).astype(np.float32),
+        "indices": np.arange(7, dtype=np.uint32),
+        "empty": np.zeros((0, 3))
+    }
+
+def test_round_trip_is_exact_and_zero_copy():
+    weights = _weights()
+    payload = encode_tensors(weights, metadata={"model_id": "m1", "version": 3})
+    decoded = decode_payload(payload)
+
+    assert decoded.metadata == {"model_id": "m1", "version": 3}
+    assert read_metadata(payload) == decoded.metadata
+    for name, array in weights.items():
+        assert decoded.tensors[name].dtype == array.dtype
+        assert np.array_equal(decoded.tensors[name], array)
+    layer = decoded.tensors["layer1"]
+    assert not layer.flags.writeable
+    base = np.frombuffer(payload, np.uint8).__array_interface__["data"][0]
+    assert (layer.__array_interface__["data"][0] - base) % ALIGNMENT == 0
+
+def test_binary_payload_is_far_smaller_than_text():
+    weights = {"layer1": _weights()["layer1"]}
+    assert len(encode_tensors(weights)) < weights["layer1"].nbytes + 512
+    assert len(encode_tensors(weights, Quantization.INT8)) < weights["layer1"].nbytes // 7
+
+@pytest.mark.parametrize("quantization,tolerance", [(Quantization.FLOAT16, 1e-3), (Quantization.INT8, 0.5 / 127)])
+def test_quantization_error_is_bounded(quantization, tolerance):
+    weights = _weights()
+    decoded = decode_tensors(encode_tensors(weights, quantization))
+
+    layer = weights["layer1"]
+    assert decoded["layer1"].dtype == layer.dtype
+    assert np.abs(decoded["layer1"] - layer).max() <= tolerance * np.abs(layer).max() + 1e-12
+    assert np.array_equal(decoded["indices"], weights["indices"])
+    raw = decode_tensors(encode_tensors(weights, quantization), dequantize=False)
+    assert raw["layer1"].dtype == (np.float16 if quantization == Quantization.FLOAT16 else np.int8)
+
+def test_rejects_foreign_payloads():
+    with pytest.raises(ValueError):
+        decode_tensors(b"{'weights': array([1.0])}")
+
+def test_services_use_the_wire_format():
+    encryption = HomomorphicEncryption(quantization=Quantization.NONE)
+    encryption.noise_scale = 0.0
+    flat = np.linspace(-1, 1, 1000)
+    assert np.array_equal(encryption.decrypt(encryption.encrypt(flat)), flat)
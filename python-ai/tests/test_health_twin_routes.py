@@ -0,0 +1,30 @@
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import health_twins
+
+class _TwinService:
+    """Just enough of HealthTwinService for the similar-twins route"""
+
+    async def get_health_twin(self, twin_id):
+        return object() if twin_id == "abc" else None
+
+    async def find_similar_twins(self, twin_id, k):
+        return [{"twin_id": f"t{i}", "similarity": 1.0 / (i + 1)} for i in range(k)]
+
+def _client():
+    app = FastAPI()
+    app.include_router(health_twins.router, prefix="/api/v1/health-twins")
+    app.state.health_twins = _TwinService()
+    return TestClient(app)
+
+def test_similar_twins_route_reads_the_service_from_app_state():
+    client = _client()
+
+    response = client.get("/api/v1/health-twins/abc/similar?k=3")
+    assert response.status_code == 200
+    body = response.json()
+    assert body["count"] == 3 and [twin["twin_id"] for twin in body["similar_twins"]] == ["t0", "t1", "t2"]
+
+    assert client.get("/api/v1/health-twins/missing/similar").status_code == 404
+    assert client.get("/api/v1/health-twins/abc/similar?k=0").status_code == 422
@@ -0,0 +1,168 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+from PIL import Image, ImageEnhance
+
+from services.image_tiling import TiledImageProcessor
+from services.medical_vision_ai import DenoiseMode, ImagePreprocessor, ImagePyramid, ImagingModality, MedicalVisionAI
+
+@pytest.fixture
+def preprocessor():
+    return ImagePreprocessor()
+
+def _image(shape, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, shape, dtype=np.uint8)
+
+@pytest.mark.parametrize("shape", [(64, 80), (64, 80, 3)])
+def test_contrast_and_brightness_luts_match_pil(preprocessor, shape):
+    image = _image(shape)
+
+    expected = np.array(ImageEnhance.Contrast(Image.fromarray(image)).enhance(1.4))
+    assert np.array_equal(preprocessor._adjust_contrast(image.copy(), 1.4), expected)
+
+    expected = np.array(ImageEnhance.Brightness(Image.fromarray(image)).enhance(1.1))
+    assert np.array_equal(preprocessor._brightness_lut(1.1)[image], expected)
+
+@pytest.mark.parametrize("shape", [(64, 80), (64, 80, 3)])
+def test_fused_sharpen_matches_pil_within_rounding(preprocessor, shape):
+    image = _image(shape, seed=1)
+
+    expected = np.array(ImageEnhance.Sharpness(Image.fromarray(image)).enhance(1.3)).astype(np.int16)
+    actual = preprocessor._sharpen(image, 1.3).astype(np.int16)
+
+    assert np.abs(actual - expected).max() <= 1
+
+@pytest.mark.parametrize("modality", list(ImagingModality))
+def test_preprocess_keeps_caller_array_untouched(preprocessor, modality):
+    preprocessor.enhancement_params['noise_reduction'] = False
+    image = _image((48, 48, 3) if modality == ImagingModality.DERMATOLOGY else (48, 48))
+    original = image.copy()
+
+    result = asyncio.run(preprocessor.preprocess_image(image, modality))
+
+    assert result.dtype == np.uint8
+    assert result.shape[:2] == image.shape[:2]
+    assert np.array_equal(image, original)
+
+def _noisy_gradient(size, sigma, seed=2):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    clean = 110 + 60 * np.sin(6 * x) * np.cos(4 * y)
+    noisy = np.clip(clean + rng.normal(0, sigma, clean.shape), 0, 255).astype(np.uint8)
+    return clean, noisy
+
+def test_auto_denoise_tier_follows_input_noise_and_modality(preprocessor):
+    _, clean = _noisy_gradient(256, 0)
+    _, small = _noisy_gradient(256, 12)
+    _, large = _noisy_gradient(1100, 12)
+    clean_noise, small_noise, large_noise = (preprocessor.estimate_input_noise(image) for image in (clean, small, large))
+
+    assert preprocessor._select_denoise_mode(clean_noise, ImagingModality.XRAY, None) == DenoiseMode.OFF
+    # Full-resolution NLM only runs when asked for, whatever the image size
+    assert preprocessor._select_denoise_mode(small_noise, ImagingModality.XRAY, None) == DenoiseMode.PYRAMID
+    assert preprocessor._select_denoise_mode(large_noise, ImagingModality.XRAY, None) == DenoiseMode.PYRAMID
+    assert preprocessor._select_denoise_mode(small_noise, ImagingModality.ULTRASOUND, None) == DenoiseMode.FAST
+    assert preprocessor._select_denoise_mode(clean_noise, ImagingModality.XRAY, DenoiseMode.FULL) == DenoiseMode.FULL
+
+def test_low_noise_skip_uses_the_input_estimate_not_the_sharpened_buffer(preprocessor, monkeypatch):
+    _, clean = _noisy_gradient(256, 0)
+    reduced = []
+    monkeypatch.setattr(preprocessor, "_reduce_noise", lambda image, modality, mode, noise: reduced.append(noise) or image)
+
+    asyncio.run(preprocessor.preprocess_image(clean, ImagingModality.XRAY))
+
+    assert reduced == [preprocessor.estimate_input_noise(clean)]
+    assert preprocessor._select_denoise_mode(reduced[0], ImagingModality.XRAY, None) == DenoiseMode.OFF
+
+def test_tiled_images_estimate_noise_on_a_sampled_tile_only(preprocessor, monkeypatch):
+    preprocessor.tiler = TiledImageProcessor(tile_size=64)
+    preprocessor.enhancement_params['tile_threshold_pixels'] = 10_000
+    _, noisy = _noisy_gradient(300, 12)
+    estimated = []
+    estimate = preprocessor.estimate_input_noise
+    monkeypatch.setattr(preprocessor, "estimate_input_noise", lambda image: estimated.append(image.shape) or estimate(image))
+
+    asyncio.run(preprocessor.preprocess_image(noisy, ImagingModality.MAMMOGRAPHY))
+
+    assert estimated == [(64, 64)]
+
+def test_pyramid_denoise_never_runs_nlm_at_full_resolution(preprocessor, monkeypatch):
+    _, noisy = _noisy_gradient(200, 12)
+    sizes = []
+    nlm = preprocessor._nlm_denoise
+    monkeypatch.setattr(preprocessor, "_nlm_denoise", lambda image, strength: sizes.append(image.shape) or nlm(image, strength))
+
+    assert preprocessor._pyramid_denoise(noisy).shape == noisy.shape
+    assert sizes == [(100, 100)]
+
+@pytest.mark.parametrize("channels", [None, 3])
+def test_pyramid_denoise_removes_noise_at_full_size(preprocessor, channels):
+    preprocessor.enhancement_params['pyramid_max_side'] = 128
+    clean, noisy = _noisy_gradient(301, 12)
+    if channels:
+        clean = np.dstack([clean] * channels)
+        noisy = np.dstack([noisy] * channels)
+
+    denoised = preprocessor._pyramid_denoise(noisy)
+
+    assert denoised.shape == noisy.shape
+    error_before = np.abs(noisy - clean).mean()
+    error_after = np.abs(denoised - clean).mean()
+    assert error_after < 0.5 * error_before
+
+def test_pyramid_levels_are_built_once_and_reused():
+    pyramid = ImagePyramid(_image((1000, 600, 3)))
+
+    coarse = pyramid.level_for(300)
+    assert max(coarse.shape[:2]) <= 300
+    assert pyramid.level_for(300) is coarse
+    assert pyramid.gray(300) is pyramid.gray(300)
+    assert pyramid.gray(300).shape == coarse.shape[:2]
+    assert ImagePyramid.of(pyramid) is pyramid
+
+    # Requests below the minimum side stop at the coarsest level
+    assert pyramid.level_for(1) is pyramid.levels[-1]
+    assert min(pyramid.levels[-1].shape[:2]) >= pyramid.min_side
+
+def _full_resolution_quality(image):
+    """The quality metrics as originally computed on the whole image"""
+    gray = cv2.cvtColor(image, cv2.COLOR_RGB2GRAY) if image.ndim == 3 else image
+    return {
+        'sharpness': min(cv2.Laplacian(gray, cv2.CV_64F).var() / 1000, 1.0),
+        'contrast': np.std(gray) / 255.0,
+        'brightness': np.mean(gray) / 255.0,
+        'noise_level': 1.0 - (np.std(cv2.GaussianBlur(gray, (5, 5), 0)) / np.std(gray))
+    }
+
+@pytest.mark.parametrize("shape", [(256, 256), (1500, 1300), (1200, 1400, 3)])
+def test_quality_metrics_match_full_resolution(shape):
+    vision_ai = MedicalVisionAI()
+    _, image = _noisy_gradient(max(shape[:2]), 4)
+    image = image[:shape[0], :shape[1]]
+    if len(shape) == 3:
+        image = np.dstack([image, np.roll(image, 7, axis=1), image // 2])
+
+    expected = _full_resolution_quality(image)
+    for metrics in (asyncio.run(vision_ai._assess_image_quality(image)),
+                    asyncio.run(vision_ai._assess_image_quality(ImagePyramid(image)))):
+        assert metrics == pytest.approx(expected, rel=1e-9)
+
+    vision_ai.quality_max_side = 1024
+    coarse = asyncio.run(vision_ai._assess_image_quality(ImagePyramid(image)))
+    if max(shape[:2]) <= 1024:
+        assert coarse == pytest.approx(expected, rel=1e-9)
+    else:
+        # A downsampled level is smoother, so it reads as less sharp and less noisy
+        assert coarse['sharpness'] < expected['sharpness'] and coarse['noise_level'] < expected['noise_level']
+        assert coarse['brightness'] == pytest.approx(expected['brightness'], abs=0.01)
+
+def test_cached_pyramids_report_the_same_quality_as_fresh_ones():
+    vision_ai = MedicalVisionAI()
+    image = _image((256, 256))
+
+    # A fresh pyramid and one rebuilt from the cached preprocessed array agree
+    fresh = asyncio.run(vision_ai.preprocessor.preprocess_pyramid(image, ImagingModality.XRAY))
+    cached = ImagePyramid(fresh.full.copy())
+    assert asyncio.run(vision_ai._assess_image_quality(fresh)) == asyncio.run(vision_ai._assess_image_quality(cached))
@@ -0,0 +1,60 @@
+import asyncio
+
+import cv2
+import numpy as np
+import pytest
+
+from services.image_tiling import TiledImageProcessor, TiledStage
+from services.medical_vision_ai import DenoiseMode, ImagePreprocessor, ImagingModality
+
+def _image(shape=(300, 340), seed=0):
+    rng = np.random.default_rng(seed)
+    smooth = cv2.GaussianBlur(rng.random(shape).astype(np.float32), (0, 0), 6)
+    smooth = (smooth - smooth.min()) / (smooth.max() - smooth.min())
+    return np.clip(smooth * 180 + 30 + rng.normal(0, 8, shape), 0, 255).astype(np.uint8)
+
+def test_tiles_cover_image_once_with_clipped_halo():
+    tiler = TiledImageProcessor(tile_size=64)
+    coverage = np.zeros((150, 130), dtype=np.int32)
+    for tile in tiler.tiles(coverage.shape, halo=5):
+        coverage[tile.y0:tile.y1, tile.x0:tile.x1] += 1
+        assert tile.read_y0 == max(0, tile.y0 - 5) and tile.read_x1 == min(130, tile.x1 + 5)
+    assert (coverage == 1).all()
+
+def test_local_stage_matches_whole_image_filter():
+    image = _image()
+    blur = lambda tile: cv2.GaussianBlur(tile, (0, 0), 2.0)
+    tiled = TiledImageProcessor(tile_size=50, max_workers=4).run(image, [TiledStage(blur, halo=6)])
+    assert np.array_equal(tiled, blur(image))
+
+@pytest.mark.parametrize("modality,denoise_mode,shape", [
+    (ImagingModality.MAMMOGRAPHY, DenoiseMode.OFF, (300, 340)),
+    (ImagingModality.MAMMOGRAPHY, DenoiseMode.FAST, (300, 340)),
+    (ImagingModality.MAMMOGRAPHY, DenoiseMode.FULL, (300, 340)),
+    (ImagingModality.PATHOLOGY, DenoiseMode.FAST, (300, 340, 3)),
+])
+def test_tiled_preprocessing_is_seamless(modality, denoise_mode, shape):
+    preprocessor = ImagePreprocessor()
+    preprocessor.tiler = TiledImageProcessor(tile_size=64, max_workers=4)
+    image = _image(shape)
+
+    expected = asyncio.run(preprocessor._preprocess_array(image, modality, denoise_mode))
+    tiled = asyncio.run(preprocessor.preprocess_tiled(image, modality, denoise_mode))
+
+    assert np.array_equal(tiled, expected)
+
+def test_large_images_are_tiled_into_memory_mapped_output(tmp_path):
+    preprocessor = ImagePreprocessor()
+    preprocessor.tiler = TiledImageProcessor(tile_size=64, memmap_dir=str(tmp_path))
+    preprocessor.enhancement_params['tile_threshold_pixels'] = 10_000
+    image = _image()
+    np.save(tmp_path / "slide.npy", image)
+    slide = np.load(tmp_path / "slide.npy", mmap_mode="r")
+
+    expected = asyncio.run(preprocessor.preprocess_tiled(image, ImagingModality.MAMMOGRAPHY, DenoiseMode.FAST))
+    result = asyncio.run(preprocessor._preprocess_array(slide, ImagingModality.MAMMOGRAPHY, DenoiseMode.FAST))
+
+    assert isinstance(result, np.memmap)
+    assert np.array_equal(result, expected)
+    with pytest.raises(ValueError):
+        asyncio.run(preprocessor.preprocess_tiled(image, ImagingModality.XRAY))
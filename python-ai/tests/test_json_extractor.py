@@ -0,0 +1,27 @@
+from services.json_extractor import IncrementalJSONExtractor, extract_json
+
+
+def test_skips_think_preamble_split_across_chunks():
+    extractor = IncrementalJSONExtractor(expect="object")
+    chunks = ["<thi", "nk>maybe {\"not\": json", "}</th", "ink>Here you go:\n```json\n{\"risk_level\": ", "\"low\", \"notes\": \"a } b\"}", " trailing"]
+
+    results = [extractor.feed(chunk) for chunk in chunks]
+
+    assert results[:4] == [None, None, None, None]
+    assert results[4] == {"risk_level": "low", "notes": "a } b"}
+    assert extractor.done
+
+
+def test_skips_invalid_brackets_and_tolerates_trailing_commas():
+    assert extract_json("See [ref 1] below: [\"rest\", \"water\",]", expect="array") == ["rest", "water"]
+
+
+def test_finds_array_nested_in_json_mode_object():
+    assert extract_json('{"recommendations": ["sleep", "hydrate"]}', expect="array") == ["sleep", "hydrate"]
+
+
+def test_incomplete_json_returns_none():
+    extractor = IncrementalJSONExtractor()
+    extractor.feed('{"risk_level": "high"')
+
+    assert extractor.finish() is None
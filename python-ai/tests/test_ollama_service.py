@@ -0,0 +1,167 @@
+import json
+
+import httpx
+import pytest
+
+from services.ollama_service import OllamaService, SessionContextCache
+
+
+def test_session_context_cache_evicts_least_recently_used():
+    cache = SessionContextCache(max_sessions=2, ttl_seconds=60)
+    cache.put("a", [1])
+    cache.put("b", [2])
+    cache.get("a")
+    cache.put("c", [3])
+
+    assert cache.get("a") == [1]
+    assert cache.get("b") is None
+    assert cache.get("c") == [3]
+
+
+def test_session_context_cache_expires_entries():
+    cache = SessionContextCache(max_sessions=2, ttl_seconds=0)
+    cache.put("a", [1])
+
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+@pytest.mark.asyncio
+async def test_luma_chat_reuses_session_context():
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        sent.append(json.loads(request.read()))
+        return httpx.Response(200, json={"model": "test", "response": "hi", "done": True, "context": [len(sent)]})
+
+    service = OllamaService()
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    first = await service.luma_chat("I have a headache", session_id="s1")
+    second = await service.luma_chat("It started yesterday", session_id="s1")
+
+    assert first["context_reused"] is False
+    assert second["context_reused"] is True
+    assert "context" not in sent[0]
+    assert sent[1]["context"] == [1]
+    assert "You are Luma" not in sent[1]["prompt"]
+    assert service.chat_sessions.get("s1") == [2]
+
+
+@pytest.mark.asyncio
+async def test_generate_embeddings_batch_deduplicates_and_caches(tmp_path):
+    sent = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read())
+        sent.append(body)
+        return httpx.Response(200, json={"embeddings": [[float(len(text)), 1.0] for text in body["input"]]})
+
+    service = OllamaService()
+    service.embedding_cache_path = str(tmp_path)
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    first = await service.generate_embeddings_batch(["fever", "cough", "fever"])
+    second = await service.generate_embeddings_batch(["cough"])
+
+    assert first == [[5.0, 1.0], [5.0, 1.0], [5.0, 1.0]]
+    assert second == [[5.0, 1.0]]
+    assert len(sent) == 1
+    assert sent[0]["input"] == ["fever", "cough"]
+
+    restarted = OllamaService()
+    restarted.embedding_cache_path = str(tmp_path)
+    assert await restarted.generate_embeddings("fever") == [5.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_batch_embeddings_are_retried_after_a_404(tmp_path):
+    paths = []
+    batch_available = False
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        paths.append(request.url.path)
+        body = json.loads(request.read())
+        if request.url.path == "/api/embed":
+            if not batch_available:
+                return httpx.Response(404)
+            return httpx.Response(200, json={"embeddings": [[1.0, 0.0] for _ in body["input"]]})
+        return httpx.Response(200, json={"embedding": [0.0, 1.0]})
+
+    service = OllamaService()
+    service.embedding_cache_path = str(tmp_path)
+    service.embedding_batch_retry = 60
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    assert await service.generate_embeddings_batch(["fever"]) == [[0.0, 1.0]]
+    assert await service.generate_embeddings_batch(["cough"]) == [[0.0, 1.0]]
+    assert paths == ["/api/embed", "/api/embeddings", "/api/embeddings"]
+
+    batch_available = True
+    service._batch_embed_retry_at = 0.0
+    assert await service.generate_embeddings_batch(["rash"]) == [[1.0, 0.0]]
+    assert paths[-1] == "/api/embed"
+
+
+@pytest.mark.asyncio
+async def test_generate_health_analysis_parses_streamed_json_after_think_block():
+    tokens = ["<think>", "patient looks fine", "</think>", '{"risk_level": "low",', ' "risk_score": 12}', "ignored"]
+    body = "".join(json.dumps({"response": token, "done": False}) + "\n" for token in tokens)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.read())["format"] == "json"
+        return httpx.Response(200, content=body)
+
+    service = OllamaService()
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    analysis = await service.generate_health_analysis({"vitals": {}})
+
+    assert analysis == {"risk_level": "low", "risk_score": 12}
+
+
+@pytest.mark.asyncio
+async def test_health_recommendations_are_unwrapped_from_a_json_object():
+    tokens = ['{"recommendations": ["Walk daily",', ' "Drink water"]}']
+    body = "".join(json.dumps({"response": token, "done": False}) + "\n" for token in tokens)
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.read()))
+        return httpx.Response(200, content=body)
+
+    service = OllamaService()
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    assert await service.generate_health_recommendations({"age": 40}) == ["Walk daily", "Drink water"]
+    assert requests[0]["format"] == "json"
+
+    await service.generate_json("list three foods", expect="array")
+    assert "format" not in requests[1]
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_fails_fast_to_luma_fallback():
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        raise httpx.ConnectError("connection refused", request=request)
+
+    service = OllamaService()
+    service.client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    service.is_available = True
+
+    for _ in range(service.circuit_breaker.failure_threshold):
+        await service.luma_chat("hello")
+
+    reply = await service.luma_chat("hello")
+
+    assert service.circuit_breaker.state == "open"
+    assert reply["model_used"] == "fallback"
+    assert len(calls) == service.circuit_breaker.failure_threshold
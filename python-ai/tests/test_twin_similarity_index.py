@@ -0,0 +1,27 @@
+import numpy as np
+
+from services.twin_similarity_index import TwinSimilarityIndex
+
+
+def test_query_matches_brute_force_after_incremental_updates():
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(300, 12))
+    index = TwinSimilarityIndex(dim=12, min_rebuild_size=50)
+    for i, row in enumerate(features):
+        index.upsert(f"t{i}", row)
+
+    # Replace and remove some twins after the tree has been built
+    features[10] = rng.normal(size=12)
+    index.upsert("t10", features[10])
+    index.remove("t20")
+
+    query = features[0]
+    results = index.query(query, k=5, exclude_id="t0")
+
+    scaled = (features - index._mean) / index._scale
+    distances = np.linalg.norm(scaled - (query - index._mean) / index._scale, axis=1)
+    distances[[0, 20]] = np.inf
+    expected = [f"t{i}" for i in np.argsort(distances)[:5]]
+
+    assert [twin_id for twin_id, _ in results] == expected
+    assert len(index) == 299
@@ -0,0 +1,84 @@
+import asyncio
+import time
+
+import numpy as np
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from middleware import metrics
+from middleware.upload_limit import UploadLimitMiddleware
+
+def _client():
+    app = FastAPI()
+    received = []
+
+    @app.post("/upload")
+    async def upload(image: UploadFile = File(...)):
+        received.append(image.filename)
+        return {"size": len(await image.read())}
+
+    app.add_middleware(UploadLimitMiddleware, limits={"/upload": 4096})
+    return TestClient(app), received
+
+def test_body_within_the_limit_reaches_the_route():
+    client, received = _client()
+    response = client.post("/upload", files={"image": ("scan.png", b"x" * 1000)})
+    assert response.status_code == 200 and response.json() == {"size": 1000}
+    assert received == ["scan.png"]
+
+def test_declared_oversized_body_is_rejected_before_parsing():
+    client, received = _client()
+    response = client.post("/upload", files={"image": ("scan.png", b"x" * 10_000)})
+    assert response.status_code == 413 and received == []
+
+def test_streamed_body_is_cut_off_once_it_passes_the_limit():
+    pulled = []
+    sent = []
+
+    async def app(scope, receive, send):
+        while (await receive())["type"] == "http.request":
+            pass
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    async def receive():
+        pulled.append(1)
+        return {"type": "http.request", "body": b"x" * 1024, "more_body": True}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "path": "/upload", "headers": [(b"transfer-encoding", b"chunked")]}
+    asyncio.run(UploadLimitMiddleware(app, {"/upload": 4096})(scope, receive, send))
+
+    assert len(pulled) == 5
+    assert [message["status"] for message in sent if message["type"] == "http.response.start"] == [413]
+
+def _observed(modality, overlapped="false"):
+    histogram = metrics.VISION_RSS_GROWTH.labels(modality=modality, overlapped=overlapped)
+    return histogram._sum.get()
+
+@pytest.mark.parametrize("resettable", [True, False])
+def test_vision_memory_records_the_peak_of_memory_freed_before_the_end(monkeypatch, resettable):
+    if not resettable:
+        monkeypatch.setattr(metrics, "reset_high_water_rss", lambda: False)
+    modality = f"peak-{resettable}"
+    sample = metrics.start_vision_memory_sample()
+    block = np.ones(100 * 1024 * 1024 // 8)
+    # Let the fallback sampler see the allocation before it is freed
+    time.sleep(0.05)
+    del block
+    metrics.record_vision_memory(modality, sample)
+
+    assert _observed(modality) > 80 * 1024 * 1024
+    assert metrics.PROCESS_PEAK_RSS._value.get() >= metrics.current_rss_bytes()
+
+def test_vision_memory_samples_flag_overlapping_requests():
+    outer = metrics.start_vision_memory_sample()
+    inner = metrics.start_vision_memory_sample()
+    assert inner.overlapped is True
+    metrics.record_vision_memory("ct", inner)
+    metrics.record_vision_memory("ct", outer)
+    assert metrics._vision_in_flight == 0
+    assert _observed("ct", "true") >= 0 and _observed("ct") == 0
+    assert metrics.current_rss_bytes() > 0
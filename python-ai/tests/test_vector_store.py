@@ -0,0 +1,41 @@
+import numpy as np
+
+from services.vector_store import VectorStore
+
+
+def test_search_returns_most_similar_first():
+    store = VectorStore(dim=3)
+    store.add(["x", "y", "z"], np.eye(3))
+
+    results = store.search(np.array([0.1, 0.9, 0.0]), k=2)
+
+    assert [vector_id for vector_id, _ in results] == ["y", "x"]
+
+
+def test_store_persists_and_grows(tmp_path):
+    store = VectorStore(str(tmp_path), initial_capacity=2)
+    vectors = np.random.default_rng(0).normal(size=(5, 4)).astype(np.float32)
+    store.add([f"v{i}" for i in range(5)], vectors)
+
+    reloaded = VectorStore(str(tmp_path))
+
+    assert len(reloaded) == 5
+    np.testing.assert_allclose(reloaded.get("v3"), vectors[3])
+
+
+def test_ivf_search_matches_exact_search_with_all_lists_probed():
+    rng = np.random.default_rng(1)
+    store = VectorStore()
+    store.add([str(i) for i in range(500)], rng.normal(size=(500, 8)))
+    store.build_ivf_index(n_lists=8)
+    query = rng.normal(size=8)
+
+    assert store.search(query, k=5, nprobe=8) == store.search(query, k=5)
+
+
+def test_repeated_id_in_one_add_keeps_the_last_vector():
+    store = VectorStore(dim=2)
+    store.add(["a", "b", "a"], np.array([[1.0, 0.0], [0.0, 1.0], [0.5, 0.5]]))
+
+    assert len(store) == 2 and store.ids == ["a", "b"]
+    np.testing.assert_allclose(store.get("a"), [0.5, 0.5])
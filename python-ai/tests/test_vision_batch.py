@@ -0,0 +1,125 @@
+import asyncio
+import io
+import json
+import zipfile
+
+import cv2
+import numpy as np
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import vision
+from services.medical_vision_ai import ImagingModality
+from services.vision_batch import VisionBatchProcessor
+
+def _png(seed):
+    image = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+def _spool(directory, name, data):
+    path = directory / name
+    path.write_bytes(data)
+    return (name, str(path))
+
+def test_batch_streams_every_result_with_timing(tmp_path):
+    images = [_spool(tmp_path, "a.png", _png(0)), _spool(tmp_path, "b.png", _png(1)),
+              _spool(tmp_path, "broken.png", b"not an image")]
+
+    async def run():
+        processor = VisionBatchProcessor(max_workers=2)
+        try:
+            job = processor.submit(images, ImagingModality.OPHTHALMOLOGY, {"diabetes_history": True})
+
+            results = [entry async for entry in processor.stream_results(job.job_id)]
+            return job, results
+        finally:
+            processor.shutdown()
+
+    job, results = asyncio.run(run())
+
+    assert job.status == "completed"
+    assert (job.completed, job.failed) == (2, 1)
+    by_name = {entry["name"]: entry for entry in results}
+    assert set(by_name) == {"a.png", "b.png", "broken.png"}
+    assert by_name["broken.png"]["status"] == "failed"
+
+    completed = by_name["a.png"]
+    assert completed["result"]["modality"] == "ophthalmology"
+    assert completed["cached"] is False
+    assert set(completed["timing_ms"]) == {"queued", "preprocess", "analysis", "total"}
+
+    # The processor deletes the spooled images once they are analyzed
+    assert list(tmp_path.iterdir()) == []
+
+def test_finished_jobs_are_evicted_beyond_capacity(tmp_path):
+    async def run():
+        processor = VisionBatchProcessor(max_workers=1, max_jobs=2)
+        try:
+            jobs = []
+            for seed in range(3):
+                job = processor.submit([_spool(tmp_path, f"{seed}.png", _png(seed))], ImagingModality.DERMATOLOGY)
+                [entry async for entry in processor.stream_results(job.job_id)]
+                jobs.append(job)
+            return processor, jobs
+        finally:
+            processor.shutdown()
+
+    processor, jobs = asyncio.run(run())
+
+    assert list(processor.jobs) == [jobs[1].job_id, jobs[2].job_id]
+
+def test_another_worker_reads_jobs_from_the_shared_state_directory(tmp_path):
+    spool = tmp_path / "spool"
+    spool.mkdir()
+    state_path = str(tmp_path / "state")
+
+    async def run():
+        owner = VisionBatchProcessor(max_workers=1, state_path=state_path)
+        other = VisionBatchProcessor(max_workers=1, state_path=state_path, poll_interval=0.01)
+        try:
+            job = owner.submit([_spool(spool, "a.png", _png(0)), _spool(spool, "b.png", _png(1))],
+                               ImagingModality.DERMATOLOGY)
+            # Follows the result file while the owner is still analyzing
+            streamed = [entry async for entry in other.stream_results(job.job_id)]
+            return job, streamed, other.job_summary(job.job_id), other.cancel(job.job_id)
+        finally:
+            owner.shutdown()
+
+    job, streamed, summary, cancelled = asyncio.run(run())
+
+    assert sorted(entry["name"] for entry in streamed) == ["a.png", "b.png"]
+    assert summary == job.summary() and summary["status"] == "completed"
+    assert cancelled is False
+    assert VisionBatchProcessor(state_path=state_path).job_summary("missing") is None
+
+def test_batch_route_spools_zip_members_and_serves_status_from_any_worker(tmp_path):
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w") as zf:
+        zf.writestr("scans/a.png", _png(0))
+        zf.writestr("scans/.hidden", b"skipped")
+
+    def _app():
+        app = FastAPI()
+        app.include_router(vision.router, prefix="/api/v1/vision")
+        app.state.vision_batch = VisionBatchProcessor(max_workers=1, state_path=str(tmp_path), poll_interval=0.01)
+        return app
+
+    owner_app, other_app = _app(), _app()
+    try:
+        with TestClient(owner_app) as owner, TestClient(other_app) as other:
+            response = owner.post(
+                "/api/v1/vision/analyze/batch",
+                data={"modality": "dermatology"},
+                files=[("images", ("scans.zip", archive.getvalue(), "application/zip")),
+                       ("images", ("b.png", _png(1), "image/png"))]
+            )
+            assert response.status_code == 200
+            job_id = response.json()["job_id"]
+            assert response.json()["total"] == 2
+
+            lines = other.get(f"/api/v1/vision/analyze/batch/{job_id}/results").text.splitlines()
+            assert sorted(json.loads(line)["name"] for line in lines) == ["b.png", "scans/a.png"]
+            assert other.get(f"/api/v1/vision/analyze/batch/{job_id}").json()["completed"] == 2
+            assert other.get("/api/v1/vision/analyze/batch/missing").status_code == 404
+    finally:
+        owner_app.state.vision_batch.shutdown()
@@ -0,0 +1,46 @@
+import threading
+
+import cv2
+import numpy as np
+
+from services.medical_vision_ai import ImagePreprocessor
+from services.vision_kernels import KernelRegistry
+
+def test_entries_are_built_once_and_read_only():
+    registry = KernelRegistry()
+    builds = []
+    build = lambda: builds.append(1) or np.arange(256, dtype=np.uint8)
+
+    first = registry.get(("lut", "identity"), build)
+    assert registry.get(("lut", "identity"), build) is first
+    assert len(builds) == 1 and not first.flags.writeable
+    assert registry.structuring_element(cv2.MORPH_RECT, (17, 17)) is registry.structuring_element(cv2.MORPH_RECT, (17, 17))
+    assert registry.stats()["hits"] == 2
+
+def test_least_recently_used_entries_are_evicted():
+    registry = KernelRegistry(max_entries=2)
+    for value in range(3):
+        registry.lut("normalize", (value, 255), ImagePreprocessor._build_normalize_lut)
+    assert registry.stats()["entries"] == 2
+    assert ("lut", "normalize", 0, 255) not in registry._entries
+
+def test_clahe_instances_are_per_thread():
+    registry = KernelRegistry()
+    instances = []
+    thread = threading.Thread(target=lambda: instances.append(registry.clahe(2.0, (8, 8))))
+    thread.start()
+    thread.join()
+
+    assert registry.clahe(2.0, (8, 8)) is registry.clahe(2.0, (8, 8))
+    assert instances[0] is not registry.clahe(2.0, (8, 8))
+
+def test_cached_luts_match_fresh_builds():
+    preprocessor = ImagePreprocessor()
+    image = np.random.default_rng(0).integers(0, 256, (64, 64), dtype=np.uint8)
+
+    expected = ImagePreprocessor._build_blend_lut(int(cv2.mean(image)[0] + 0.5), 1.5)
+    assert np.array_equal(preprocessor._contrast_lut(image, 1.5), expected)
+    assert np.array_equal(
+        preprocessor._enhancement_lut(cv2.mean(image), 2),
+        ImagePreprocessor._build_blend_lut(0, 1.1)[ImagePreprocessor._build_blend_lut(int(cv2.mean(image)[0] + 0.5), 1.2)]
+    )
@@ -0,0 +1,82 @@
+import asyncio
+import os
+
+import cv2
+import numpy as np
+
+from services.medical_vision_ai import ImagingModality, MedicalVisionAI
+from services.vision_result_cache import VisionResultCache
+
+def _png(seed=0, size=64):
+    image = np.random.default_rng(seed).integers(0, 256, (size, size, 3), dtype=np.uint8)
+    return cv2.imencode(".png", image)[1].tobytes()
+
+def test_key_covers_bytes_modality_and_context():
+    data = _png()
+    key = VisionResultCache.image_key(data, "xray")
+
+    assert key == VisionResultCache.image_key(np.frombuffer(data, dtype=np.uint8), "xray")
+    assert key != VisionResultCache.image_key(data, "mri")
+    assert key != VisionResultCache.image_key(_png(seed=1), "xray")
+    assert VisionResultCache.result_key(key, {"a": 1, "b": 2}) == VisionResultCache.result_key(key, {"b": 2, "a": 1})
+    assert VisionResultCache.result_key(key, {"body_part": "chest"}) != VisionResultCache.result_key(key, {})
+
+def test_results_survive_restart_and_old_entries_are_evicted(tmp_path):
+    cache = VisionResultCache(str(tmp_path), max_bytes=3000)
+    cache.put_result("first", {"payload": "x" * 1000})
+    os.utime(tmp_path / "first.json", (1, 1))
+    cache.put_result("second", {"payload": "y" * 1000})
+
+    assert VisionResultCache(str(tmp_path)).get_result("second") == {"payload": "y" * 1000}
+
+    cache.put_result("third", {"payload": "z" * 1000})
+    assert not (tmp_path / "first.json").exists()
+    assert cache.get_result("first") is None
+    assert cache.get_result("third") is not None
+
+def test_overwriting_an_entry_does_not_inflate_the_disk_size(tmp_path):
+    cache = VisionResultCache(str(tmp_path))
+    for _ in range(5):
+        cache.put_result("same", {"payload": "x" * 1000, "score": np.float32(0.5)})
+
+    assert cache.stats()["disk_bytes"] == (tmp_path / "same.json").stat().st_size
+    assert cache.get_result("same")["score"] == 0.5
+
+def test_memory_only_cache_hands_out_copies(tmp_path):
+    cache = VisionResultCache()
+    cache.put_result("key", {"findings": ["a"]})
+    cache.get_result("key")["findings"].append("b")
+
+    assert cache.get_result("key") == {"findings": ["a"]}
+    assert cache.get_array("key") is None and list(tmp_path.iterdir()) == []
+
+def test_disk_tier_is_off_unless_a_path_is_set(monkeypatch):
+    monkeypatch.delenv("VISION_CACHE_PATH", raising=False)
+    vision_ai = MedicalVisionAI()
+    assert vision_ai.result_cache is not None and vision_ai.result_cache.path is None
+
+    monkeypatch.setenv("VISION_CACHE_ENABLED", "false")
+    assert MedicalVisionAI().result_cache is None
+
+def test_reupload_is_served_from_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("VISION_CACHE_PATH", str(tmp_path))
+    monkeypatch.setenv("VISION_CACHE_STORE_ARRAYS", "true")
+    vision_ai = MedicalVisionAI()
+    data = _png()
+
+    first_timings, second_timings = {}, {}
+    first = asyncio.run(vision_ai.analyze_medical_image(data, ImagingModality.DERMATOLOGY, {}, first_timings))
+    second = asyncio.run(vision_ai.analyze_medical_image(data, ImagingModality.DERMATOLOGY, {}, second_timings))
+
+    assert second == first and second is not first
+    assert set(first_timings) == {"preprocess", "analysis"}
+    assert second_timings == {}
+
+    # Results are stored as JSON and decode back to the same analysis after a restart
+    restarted = MedicalVisionAI()
+    assert asyncio.run(restarted.analyze_medical_image(data, ImagingModality.DERMATOLOGY, {})) == first
+
+    # A new context reuses the preprocessed array but reruns the analysis
+    restarted.preprocessor.preprocess_pyramid = None
+    result = asyncio.run(restarted.analyze_medical_image(data, ImagingModality.DERMATOLOGY, {"age": 40}))
+    assert result.modality == ImagingModality.DERMATOLOGY
@@ -0,0 +1,45 @@
+import asyncio
+
+import numpy as np
+import pytest
+from scipy.ndimage import gaussian_filter
+
+from services.medical_vision_ai import DenoiseMode, ImagePreprocessor, ImagingModality
+from services.volume_processing import VolumeProcessor
+
+def _volume(shape=(20, 24, 28), seed=0):
+    return (np.random.default_rng(seed).random(shape) * 200).astype(np.float32)
+
+@pytest.mark.parametrize("chunk_slices", [1, 4, 64])
+def test_chunked_gaussian_matches_whole_volume_filter(chunk_slices):
+    volume = _volume()
+    expected = gaussian_filter(volume, (2.0, 1.5, 1.5), mode=("nearest", "reflect", "reflect"), truncate=4.0)
+
+    processor = VolumeProcessor(chunk_slices=chunk_slices)
+    in_place = volume.copy()
+    processor.gaussian_filter(in_place, 1.5, 2.0, out=in_place)
+
+    assert np.allclose(processor.gaussian_filter(volume, 1.5, 2.0), expected, atol=1e-3)
+    assert np.allclose(in_place, expected, atol=1e-3)
+
+def test_bias_correction_flattens_a_smooth_gain():
+    z, y, x = np.ogrid[0:16, 0:64, 0:64]
+    volume = (np.full((16, 64, 64), 100.0) * (0.6 + 0.8 * x / 64)).astype(np.float32)
+
+    corrected = VolumeProcessor(chunk_slices=4).bias_field_correction(volume, sigma_xy=4.0, sigma_z=1.0)
+
+    before = volume[:, :, -8:].mean() / volume[:, :, :8].mean()
+    after = corrected[:, 8:-8, -16:-8].mean() / corrected[:, 8:-8, 8:16].mean()
+    assert before > 2.0
+    assert abs(after - 1.0) < 0.1
+
+def test_preprocess_volume_memory_mapped(tmp_path):
+    preprocessor = ImagePreprocessor()
+    preprocessor.volume_processor = VolumeProcessor(chunk_slices=4, memmap_dir=str(tmp_path))
+    slices = _volume((10, 32, 32)).astype(np.uint8)
+
+    volume = asyncio.run(preprocessor.preprocess_volume(slices, ImagingModality.MRI, DenoiseMode.OFF, memmap=True))
+
+    assert isinstance(volume, np.memmap)
+    assert volume.shape == (10, 32, 32) and volume.dtype == np.uint8
+    assert list(tmp_path.iterdir()) == []